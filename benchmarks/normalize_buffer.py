@@ -0,0 +1,32 @@
+"""Throughput of the output normalization.
+
+python -m benchmarks.normalize_buffer [size in MB] [chunk size in bytes]
+"""
+import sys
+import time
+
+from cloudshell.cli.session.helper.normalize_buffer import (
+    BufferNormalizer,
+    normalize_buffer,
+)
+
+LINE = "\x1b[0;32mGi0/1\x1b[0m   10.0.0.1   YES manual up   up\r\n"
+
+
+def _measure(name: str, func, data: list[str], size: int) -> None:
+    start = time.perf_counter()
+    for chunk in data:
+        func(chunk)
+    duration = time.perf_counter() - start
+    print(f"{name}: {size / duration / 1024 / 1024:.1f} MB/s")  # noqa: T201
+
+
+def main(size_mb: int = 64, chunk_size: int = 4096) -> None:
+    text = LINE * (size_mb * 1024 * 1024 // len(LINE))
+    chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+    _measure("normalize_buffer", normalize_buffer, chunks, len(text))
+    _measure("BufferNormalizer", BufferNormalizer().normalize, chunks, len(text))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
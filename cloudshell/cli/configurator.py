@@ -83,6 +83,14 @@ class CLIServiceConfigurator:
             registered_sessions=registered_sessions,
         )
 
+    @property
+    def host(self) -> str:
+        return self._host
+
+    @property
+    def port(self) -> int:
+        return self._port
+
     def _on_session_start(self, session: T_SESSION, logger: Logger) -> None:
         pass
 
@@ -111,15 +119,40 @@ class CLIServiceConfigurator:
     def _defined_sessions(self) -> list[T_SESSION]:
         return [self.initialize_session(sess) for sess in self._supported_sessions]
 
-    def get_cli_service(self, command_mode: CommandMode) -> SessionPoolContextManager:
+    def get_cli_service(
+        self,
+        command_mode: CommandMode,
+        lazy_mode_change: bool = False,
+        batch_mode_change: bool = False,
+    ) -> SessionPoolContextManager:
         """Use cli.get_session to open CLI connection and switch into required mode.
 
         :param command_mode: operation mode, can be
             default_mode/enable_mode/config_mode/etc.
+        :param lazy_mode_change: defer leaving modes till the next command
+        :param batch_mode_change: send commands of the route in one write
         :return: created session in provided mode
         """
         return self._cli.get_session(
-            self._defined_sessions(), command_mode, self._logger
+            self._defined_sessions(),
+            command_mode,
+            self._logger,
+            lazy_mode_change=lazy_mode_change,
+            batch_mode_change=batch_mode_change,
+        )
+
+    def warm_up(
+        self, command_mode: CommandMode, count: int = 1, enter_mode: bool = True
+    ) -> int:
+        """Open sessions to the device in parallel and put them to the pool.
+
+        :param command_mode: mode the sessions are switched to
+        :param count: count of sessions, limited by the pool size for the device
+        :param enter_mode: switch sessions to the command mode
+        :return: count of opened sessions
+        """
+        return self._cli.warm_up(
+            self._defined_sessions, command_mode, count, self._logger, enter_mode
         )
 
 
@@ -1,36 +1,140 @@
 from __future__ import annotations
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from typing import TYPE_CHECKING
 
+from cloudshell.cli.service.cli_service_impl import CliServiceImpl
+from cloudshell.cli.service.command_mode_graph import CommandModeGraph
 from cloudshell.cli.service.session_pool_context_manager import (
     SessionPoolContextManager,
 )
-from cloudshell.cli.service.session_pool_manager import SessionPoolManager
+from cloudshell.cli.service.session_pool_registry import (
+    DEFAULT_POOL_NAME,
+    session_pool_registry,
+)
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
     from logging import Logger
 
     from cloudshell.cli.service.command_mode import CommandMode
+    from cloudshell.cli.service.prompt_cache import PromptCache
+    from cloudshell.cli.service.session_pool import SessionPool
     from cloudshell.cli.types import T_SESSION
 
 
 class CLI:
-    def __init__(self, session_pool: SessionPoolManager = SessionPoolManager()):
+    def __init__(
+        self,
+        session_pool: SessionPool | None = None,
+        pool_name: str = DEFAULT_POOL_NAME,
+        prompt_cache: PromptCache | None = None,
+    ):
+        """CLI.
+
+        :param session_pool: session pool, by default the pool with the name
+            pool_name from the session pool registry is used
+        :param pool_name: name of the pool in the registry, use LEGACY_POOL_NAME
+            for one session per process as in the previous versions
+        :param prompt_cache: prompts and modes of devices used by new sessions
+        """
+        if session_pool is None:
+            session_pool = session_pool_registry.get_pool(pool_name)
         self._session_pool = session_pool
+        self._prompt_cache = prompt_cache
 
     def get_session(
         self,
         defined_sessions: list[T_SESSION],
         command_mode: CommandMode,
         logger: Logger | None = None,
+        lazy_mode_change: bool = False,
+        batch_mode_change: bool = False,
     ) -> SessionPoolContextManager:
-        """Get session from the pool or create new."""
+        """Get session from the pool or create new.
+
+        :param lazy_mode_change: defer leaving modes, see CliServiceImpl
+        :param batch_mode_change: send steps of routes in one write
+        """
         if not isinstance(defined_sessions, list):
             defined_sessions = [defined_sessions]
 
         if not logger:
             logger = logging.getLogger("cloudshell_cli")
         return SessionPoolContextManager(
-            self._session_pool, defined_sessions, command_mode, logger
+            self._session_pool,
+            defined_sessions,
+            command_mode,
+            logger,
+            lazy_mode_change=lazy_mode_change,
+            batch_mode_change=batch_mode_change,
+            prompt_cache=self._prompt_cache,
         )
+
+    def warm_up(
+        self,
+        sessions_factory: Callable[[], list[T_SESSION]],
+        command_mode: CommandMode,
+        count: int = 1,
+        logger: Logger | None = None,
+        enter_mode: bool = True,
+    ) -> int:
+        """Open new sessions in parallel and put them to the pool.
+
+        Sessions are created only while the pool has free slots, existing
+        sessions are not evicted. Errors are logged.
+        :param sessions_factory: return new defined sessions for every connection
+        :param count: count of sessions to open
+        :param enter_mode: switch sessions to the command mode
+        :return: count of opened sessions
+        """
+        if count <= 0:
+            return 0
+        if not logger:
+            logger = logging.getLogger("cloudshell_cli")
+        prompts_re = CommandModeGraph.get(command_mode).prompts_re
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [
+                executor.submit(
+                    self._warm_up_session,
+                    sessions_factory(),
+                    command_mode,
+                    prompts_re,
+                    logger,
+                    enter_mode,
+                )
+                for _ in range(count)
+            ]
+        return sum(future.result() for future in futures)
+
+    def _warm_up_session(
+        self,
+        defined_sessions: list[T_SESSION],
+        command_mode: CommandMode,
+        prompt: str,
+        logger: Logger,
+        enter_mode: bool,
+    ) -> bool:
+        if self._prompt_cache is not None:
+            defined_sessions = self._prompt_cache.order_sessions(defined_sessions)
+        try:
+            session = self._session_pool.new_session(defined_sessions, prompt, logger)
+        except Exception:
+            logger.exception("Failed to warm up session:")
+            return False
+        if session is None:
+            logger.debug("Session pool is full, session is not created")
+            return False
+        try:
+            if enter_mode:
+                cli_service = CliServiceImpl(
+                    session, command_mode, logger, prompt_cache=self._prompt_cache
+                )
+                session.last_command_mode = cli_service.command_mode
+        except Exception:
+            logger.exception("Failed to enter command mode on warm up:")
+            self._session_pool.remove_session(session, logger)
+            return False
+        self._session_pool.return_session(session, logger)
+        return True
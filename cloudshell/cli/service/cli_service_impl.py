@@ -4,12 +4,16 @@ import re
 from typing import TYPE_CHECKING
 
 from cloudshell.cli.service.cli_service import CliService
+from cloudshell.cli.service.command_mode_graph import CommandModeGraph
 from cloudshell.cli.service.command_mode_helper import CommandModeHelper
+from cloudshell.cli.service.spooled_output import SpooledOutput
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
     from logging import Logger
 
     from cloudshell.cli.service.command_mode import CommandMode
+    from cloudshell.cli.service.prompt_cache import PromptCache
     from cloudshell.cli.types import (
         T_ACTION_MAP,
         T_COMMAND_MODE_CONTEXT_MANAGER,
@@ -31,7 +35,7 @@ class EnterCommandModeContextManager:
         self._cli_service = cli_service
         self._command_mode = command_mode
         self._logger = logger
-        self._previous_mode = cli_service.command_mode
+        self._previous_mode = cli_service.active_command_mode
 
     def __enter__(self) -> CliServiceImpl:
         self._cli_service._change_mode(self._command_mode)
@@ -41,7 +45,7 @@ class EnterCommandModeContextManager:
         if exc_type:  # if we catch an error throw it upper
             return False
 
-        self._cli_service._change_mode(self._previous_mode)
+        self._cli_service._leave_mode(self._previous_mode)
 
 
 class EnterDetachCommandModeContextManager(EnterCommandModeContextManager):
@@ -59,6 +63,7 @@ class EnterDetachCommandModeContextManager(EnterCommandModeContextManager):
             command_mode.parent_node = self._previous_mode
 
     def __enter__(self) -> CliServiceImpl:
+        self._cli_service._settle_mode()
         self._command_mode.step_up(self._cli_service, self._logger)
         return self._cli_service
 
@@ -73,21 +78,75 @@ CommandModeContextManager = EnterDetachCommandModeContextManager  # Deprecated
 
 
 class CliServiceImpl(CliService):
-    """Session wrapper, used to keep session mode and enter any child mode."""
+    """Session wrapper, used to keep session mode and enter any child mode.
+
+    With lazy_mode_change leaving a mode on exit from enter_mode is deferred
+    till a command is sent or the session is returned to the pool, so the exit
+    and the next enter of the same mode are coalesced, e.g. when
+    enter_mode(config_mode) is used in a loop.
+    With batch_mode_change commands of several steps of the route are sent
+    in one write, the output is split by the command echoes.
+    The prompt cache gives exact prompts and the mode of new sessions without
+    probing and learns them from the session.
+    """
 
     def __init__(
-        self, session: T_SESSION, requested_command_mode: CommandMode, logger: Logger
+        self,
+        session: T_SESSION,
+        requested_command_mode: CommandMode,
+        logger: Logger,
+        lazy_mode_change: bool = False,
+        batch_mode_change: bool = False,
+        prompt_cache: PromptCache | None = None,
     ):
         super().__init__(session, logger)
+        self.lazy_mode_change = lazy_mode_change
+        self.batch_mode_change = batch_mode_change
+        self._prompt_cache = prompt_cache
+        self._pending_mode: CommandMode | None = None
         self._initialize(requested_command_mode)
 
+    @property
+    def active_command_mode(self) -> CommandMode:
+        """Mode commands are sent in, command_mode is the mode of the device.
+
+        They differ while leaving the mode is deferred.
+        """
+        return self._pending_mode or self.command_mode
+
     def _initialize(self, requested_command_mode: CommandMode) -> None:
-        self.command_mode = CommandModeHelper.determine_current_mode(
+        command_mode = CommandModeHelper.get_last_command_mode(
             self.session, requested_command_mode, self._logger
         )
-        self.command_mode.enter_actions(self)
+        if command_mode is None:
+            command_mode = self._get_cached_command_mode(requested_command_mode)
+            if command_mode is None:
+                command_mode = CommandModeHelper.determine_current_mode(
+                    self.session, requested_command_mode, self._logger
+                )
+            self.command_mode = command_mode
+            self.command_mode.enter_actions(self)
+        else:
+            # pooled session, enter actions were done when it was created
+            self._logger.debug("Session is in the last known mode, skip probing")
+            self.command_mode = command_mode
         self.command_mode.prompt_actions(self, self._logger)
         self._change_mode(requested_command_mode)
+        if self._prompt_cache is not None:
+            self._prompt_cache.remember(self.session, self.command_mode)
+
+    def _get_cached_command_mode(
+        self, requested_command_mode: CommandMode
+    ) -> CommandMode | None:
+        if self._prompt_cache is None:
+            return None
+        last_mode = self._prompt_cache.restore(self.session, requested_command_mode)
+        command_mode = CommandModeHelper.match_output_tail(
+            self.session, requested_command_mode, last_mode
+        )
+        if command_mode is not None:
+            self._logger.debug("Session is in the cached mode, skip probing")
+        return command_mode
 
     def enter_mode(self, command_mode: CommandMode) -> T_COMMAND_MODE_CONTEXT_MANAGER:
         """Enter specified command mode."""
@@ -107,11 +166,33 @@ class CliServiceImpl(CliService):
         logger: Logger | None = None,
         remove_prompt: bool = False,
         *args,
+        spool_threshold: int | None = None,
         **kwargs,
-    ) -> str:
+    ) -> str | SpooledOutput:
+        """Send command and return the output.
+
+        :param spool_threshold: return the output as SpooledOutput, it's written
+            to a temporary file when it's bigger than the threshold in bytes;
+            the output has to be closed, remove_prompt and positional arguments
+            of hardware_expect are not supported with it
+        """
+        if spool_threshold is not None and (remove_prompt or args):
+            raise ValueError(
+                "remove_prompt and positional arguments are not supported "
+                "with spool_threshold"
+            )
+        self._settle_mode()
         if not expected_string:
             expected_string = self.command_mode.prompt
 
+        if spool_threshold is not None:
+            return SpooledOutput.from_chunks(
+                self.send_command_stream(
+                    command, expected_string, action_map, error_map, logger, **kwargs
+                ),
+                spool_threshold,
+            )
+
         if not logger:
             logger = self._logger
         self.session.logger = logger
@@ -128,18 +209,106 @@ class CliServiceImpl(CliService):
             output = re.sub(rf"^.*{expected_string}.*$", "", output, flags=re.MULTILINE)
         return output
 
+    def send_command_stream(
+        self,
+        command: str | None,
+        expected_string: str | None = None,
+        action_map: T_ACTION_MAP | None = None,
+        error_map: T_ERROR_MAP | None = None,
+        logger: Logger | None = None,
+        lines: bool = False,
+        **kwargs,
+    ) -> Iterator[str]:
+        """Send command and yield the output while it is received.
+
+        See ExpectSession.stream_expect.
+        :param lines: yield complete lines instead of chunks
+        """
+        self._settle_mode()
+        if not expected_string:
+            expected_string = self.command_mode.prompt
+
+        if not logger:
+            logger = self._logger
+        self.session.logger = logger
+        chunks = self.session.stream_expect(
+            command,
+            expected_string=expected_string,
+            action_map=action_map,
+            error_map=error_map,
+            logger=logger,
+            **kwargs,
+        )
+        return _iter_lines(chunks) if lines else chunks
+
+    def send_commands(
+        self,
+        commands: list[str],
+        expected_string: str | None = None,
+        action_map: T_ACTION_MAP | None = None,
+        error_map: T_ERROR_MAP | None = None,
+        logger: Logger | None = None,
+        **kwargs,
+    ) -> list[str]:
+        """Send several commands without waiting for the prompt after each one.
+
+        See ExpectSession.send_commands, return output of every command.
+        """
+        self._settle_mode()
+        if not expected_string:
+            expected_string = self.command_mode.prompt
+
+        if not logger:
+            logger = self._logger
+        self.session.logger = logger
+        return self.session.send_commands(
+            commands,
+            expected_string=expected_string,
+            action_map=action_map,
+            error_map=error_map,
+            logger=logger,
+            **kwargs,
+        )
+
     def _change_mode(self, requested_command_mode: CommandMode) -> None:
+        # the route is calculated from the mode of the device
+        self._pending_mode = None
         if requested_command_mode:
             steps = CommandModeHelper.calculate_route_steps(
                 self.command_mode, requested_command_mode
             )
+            if self.batch_mode_change:
+                steps = CommandModeHelper.batch_route_steps(steps)
             for s in steps:
                 s(self, self._logger)
 
+    def _leave_mode(self, command_mode: CommandMode) -> None:
+        """Return to the mode, deferred till the next command if lazy."""
+        if not self.lazy_mode_change:
+            self._change_mode(command_mode)
+        elif command_mode is self.command_mode:
+            self._pending_mode = None
+        else:
+            self._pending_mode = command_mode
+
+    def _settle_mode(self) -> None:
+        """Do the deferred mode change."""
+        if self._pending_mode is not None:
+            self._change_mode(self._pending_mode)
+
     def reconnect(self, timeout: T_TIMEOUT | None = None) -> None:
         """Reconnect session, keep current command mode."""
-        prompts_re = r"|".join(
-            CommandModeHelper.defined_modes_by_prompt(self.command_mode).keys()
-        )
+        prompts_re = CommandModeGraph.get(self.command_mode).prompts_re
         self.session.reconnect(prompts_re, self._logger, timeout)
-        self._initialize(self.command_mode)
+        self._initialize(self.active_command_mode)
+
+
+def _iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """Join chunks and split them into lines, line ends are kept."""
+    line = ""
+    for chunk in chunks:
+        lines = (line + chunk).split("\n")
+        line = lines.pop()
+        yield from (f"{complete_line}\n" for complete_line in lines)
+    if line:
+        yield line
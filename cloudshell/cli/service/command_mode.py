@@ -78,16 +78,65 @@ class CommandMode(Node):
     def prompt(self, value: str) -> None:
         self._prompt = value
 
+    @property
+    def prompt_pattern(self) -> str:
+        """Prompt of the mode without the exact prompt."""
+        return self._prompt
+
+    @property
+    def use_exact_prompt(self) -> bool:
+        return self._use_exact_prompt
+
+    @property
+    def exact_prompt(self) -> str | None:
+        return self._exact_prompt
+
+    @exact_prompt.setter
+    def exact_prompt(self, value: str | None) -> None:
+        self._exact_prompt = value
+
     def add_parent_mode(self, mode: CommandMode | None) -> None:
         if mode:
             mode.add_child_node(self)
 
-    def step_up(self, cli_service: CliService, logger: Logger) -> None:
+    @property
+    def enter_commands(self) -> list[str | None]:
         if not isinstance(self._enter_command, (list, tuple)):
-            enter_command_list = [self._enter_command]
-        else:
-            enter_command_list = self._enter_command
-        for enter_command in enter_command_list:
+            return [self._enter_command]
+        return list(self._enter_command)
+
+    @property
+    def exit_commands(self) -> list[str | None]:
+        if not isinstance(self._exit_command, (list, tuple)):
+            return [self._exit_command]
+        return list(self._exit_command)
+
+    @property
+    def enter_error_map(self) -> T_ERROR_MAP:
+        return self._enter_error_map
+
+    @property
+    def exit_error_map(self) -> T_ERROR_MAP:
+        return self._exit_error_map
+
+    def can_batch_step_up(self) -> bool:
+        """Enter commands can be sent with other commands in one write.
+
+        Nothing has to be answered or sent after the enter commands.
+        """
+        return (
+            None not in self.enter_commands
+            and not self._enter_action_map
+            and not self._enter_actions
+            and not (self._use_exact_prompt and not self._exact_prompt)
+        )
+
+    def can_batch_step_down(self) -> bool:
+        """Exit commands can be sent with other commands in one write."""
+        return None not in self.exit_commands and not self._exit_action_map
+
+    def step_up(self, cli_service: CliService, logger: Logger) -> None:
+        for enter_command in self.enter_commands:
             cli_service.send_command(
                 enter_command,
                 expected_string=self.prompt,
@@ -99,11 +148,7 @@ class CommandMode(Node):
         self.prompt_actions(cli_service, logger)
 
     def step_down(self, cli_service: CliService, logger: Logger) -> None:
-        if not isinstance(self._exit_command, (list, tuple)):
-            exit_command_list = [self._exit_command]
-        else:
-            exit_command_list = self._exit_command
-        for exit_command in exit_command_list:
+        for exit_command in self.exit_commands:
             cli_service.send_command(
                 exit_command,
                 expected_string=self.parent_node.prompt,
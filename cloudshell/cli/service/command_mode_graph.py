@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from weakref import WeakKeyDictionary
+
+from cloudshell.cli.service.node import NodeOperations
+from cloudshell.cli.session.helper.expect_program import _NOT_COMBINABLE_RE
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from cloudshell.cli.service.command_mode import CommandMode
+
+_graphs: WeakKeyDictionary[CommandMode, CommandModeGraph] = WeakKeyDictionary()
+
+
+@lru_cache(maxsize=256)
+def _compile_modes_regex(prompts: tuple[str, ...]) -> re.Pattern | None:
+    """One regex with a named group per prompt.
+
+    Every alternative looks ahead through the whole output, so the first
+    prompt in order that matches anywhere wins as with separate searches.
+    Return None if prompts cannot be combined, e.g. named groups shift numbers
+    of backreferences.
+    """
+    if any(_NOT_COMBINABLE_RE.search(prompt) for prompt in prompts):
+        return None
+    alternatives = (
+        f"(?=.*?(?P<mode_{index}>{prompt}))" for index, prompt in enumerate(prompts)
+    )
+    try:
+        return re.compile(rf"\A(?:{'|'.join(alternatives)})", re.DOTALL)
+    except re.error:
+        # e.g. the same group names in several prompts
+        return None
+
+
+def match_mode(
+    modes_by_prompt: dict[str, CommandMode], output: str
+) -> tuple[CommandMode, str] | None:
+    """Return the first mode which prompt matches the output and matched prompt."""
+    prompts = tuple(modes_by_prompt)
+    regex = _compile_modes_regex(prompts)
+    if regex is None:
+        for prompt, mode in modes_by_prompt.items():
+            match = re.search(prompt, output, re.DOTALL)
+            if match:
+                return mode, match.group()
+        return None
+
+    match = regex.match(output)
+    if not match:
+        return None
+    for index, prompt in enumerate(prompts):
+        matched_prompt = match.group(f"mode_{index}")
+        if matched_prompt is not None:
+            return modes_by_prompt[prompt], matched_prompt
+
+
+class CommandModeGraph:
+    """Command modes of one tree with the prompt index and cached routes.
+
+    The graph is built once per tree and rebuilt only when nodes are added to
+    the tree or prompts of the modes are changed, e.g. exact prompts are set.
+    Don't modify modes_by_prompt, it's shared.
+    """
+
+    def __init__(self, root: CommandMode):
+        self.root = root
+        self.modes: tuple[CommandMode, ...] = (root, *self._get_child_modes(root))
+        self.prompts = tuple(mode.prompt for mode in self.modes)
+        self.modes_by_prompt: dict[str, CommandMode] = OrderedDict(
+            zip(self.prompts, self.modes)
+        )
+        self.prompts_re = r"|".join(self.modes_by_prompt)
+        self._version = root.tree_version
+        self._modes_set = frozenset(self.modes)
+        self._routes: dict[tuple[CommandMode, CommandMode], list[Callable]] = {}
+
+    @classmethod
+    def get(cls, command_mode: CommandMode) -> CommandModeGraph:
+        """Return the graph of the tree the command mode belongs to."""
+        root = command_mode
+        while root.parent_node:
+            root = root.parent_node
+        graph = _graphs.get(root)
+        if graph is None or not graph.is_valid():
+            graph = _graphs[root] = cls(root)
+        return graph
+
+    @staticmethod
+    def _get_child_modes(mode: CommandMode) -> list[CommandMode]:
+        modes = list(mode.child_nodes)
+        for child in mode.child_nodes:
+            modes.extend(CommandModeGraph._get_child_modes(child))
+        return modes
+
+    def is_valid(self) -> bool:
+        return self._version == self.root.tree_version and self.prompts == tuple(
+            mode.prompt for mode in self.modes
+        )
+
+    def route_steps(self, source: CommandMode, dest: CommandMode) -> list[Callable]:
+        """Steps from the source to the dest mode, cached for modes of the tree."""
+        if source not in self._modes_set or dest not in self._modes_set:
+            return NodeOperations.calculate_route_steps(source, dest)
+        try:
+            steps = self._routes[source, dest]
+        except KeyError:
+            steps = self._routes[source, dest] = NodeOperations.calculate_route_steps(
+                source, dest
+            )
+        return list(steps)
@@ -1,16 +1,70 @@
 from __future__ import annotations
 
 from collections import OrderedDict
-from functools import reduce
 from typing import TYPE_CHECKING
 
 from cloudshell.cli.service.command_mode import CommandMode, CommandModeException
+from cloudshell.cli.service.command_mode_graph import CommandModeGraph, match_mode
 from cloudshell.cli.service.node import NodeOperations
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
     from logging import Logger
 
-    from cloudshell.cli.types import T_COMMAND_MODE_RELATIONS, T_SESSION
+    from cloudshell.cli.service.cli_service import CliService
+    from cloudshell.cli.types import T_COMMAND_MODE_RELATIONS, T_ERROR_MAP, T_SESSION
+
+
+class RouteBurst:
+    """Steps of the route which commands are sent in one write.
+
+    The prompt after every command is waited, any prompt of the tree,
+    so a prompt of the last mode matching an intermediate one doesn't end
+    the wait early.
+    """
+
+    def __init__(self):
+        self.steps: list[Callable] = []
+        self.commands: list[str] = []
+        self.error_map: T_ERROR_MAP = OrderedDict()
+        self._entered_modes: list[CommandMode] = []
+        self._mode: CommandMode | None = None
+
+    def add(self, step: Callable) -> bool:
+        """Add the step, False if it cannot be batched.
+
+        Steps of modes with their own step_up or step_down aren't batched.
+        """
+        mode = getattr(step, "__self__", None)
+        func = getattr(step, "__func__", None)
+        if not isinstance(mode, CommandMode):
+            return False
+        if func is CommandMode.step_up and mode.can_batch_step_up():
+            self.commands.extend(mode.enter_commands)
+            self.error_map.update(mode.enter_error_map)
+            self._entered_modes.append(mode)
+            self._mode = mode
+        elif func is CommandMode.step_down and mode.can_batch_step_down():
+            self.commands.extend(mode.exit_commands)
+            self.error_map.update(mode.exit_error_map)
+            self._mode = mode.parent_node
+        else:
+            return False
+        self.steps.append(step)
+        return True
+
+    def __call__(self, cli_service: CliService, logger: Logger) -> None:
+        logger.debug(f"Send route commands in one write: {self.commands}")
+        cli_service.session.send_burst(
+            self.commands,
+            expected_string=self._mode.prompt,
+            logger=logger,
+            error_map=self.error_map,
+            prompts_re=CommandModeGraph.get(self._mode).prompts_re,
+        )
+        cli_service.command_mode = self._mode
+        for mode in self._entered_modes:
+            mode.prompt_actions(cli_service, logger)
 
 
 class CommandModeHelper(NodeOperations):
@@ -18,41 +72,91 @@ class CommandModeHelper(NodeOperations):
     def determine_current_mode(
         session: T_SESSION, command_mode: CommandMode, logger: Logger
     ) -> CommandMode:
-        defined_modes = CommandModeHelper.defined_modes_by_prompt(command_mode)
-        prompts_re = r"|".join(defined_modes.keys())
+        return CommandModeHelper.probe_current_mode(session, command_mode, logger)[0]
+
+    @staticmethod
+    def probe_current_mode(
+        session: T_SESSION, command_mode: CommandMode, logger: Logger
+    ) -> tuple[CommandMode | None, str | None]:
+        """Probe the prompt, return the current mode and the matched prompt."""
+        graph = CommandModeGraph.get(command_mode)
         try:
-            result = session.probe_for_prompt(expected_string=prompts_re, logger=logger)
+            result = session.probe_for_prompt(
+                expected_string=graph.prompts_re, logger=logger
+            )
         except Exception:
             logger.exception("Cannot determine current command mode:")
             raise CommandModeException(
                 "Cannot determine current command mode, see logs for more details"
             )
 
-        for prompt, mode in defined_modes.items():
-            if session.match_prompt(prompt, result, logger):
-                return mode
+        return match_mode(graph.modes_by_prompt, result) or (None, None)
+
+    @staticmethod
+    def get_last_command_mode(
+        session: T_SESSION, command_mode: CommandMode, logger: Logger
+    ) -> CommandMode | None:
+        """Return the mode the session was returned to the pool in.
+
+        The mode is trusted only if the last line of the last received output
+        is its prompt, it's checked without a device round trip.
+        """
+        return CommandModeHelper.match_output_tail(
+            session, command_mode, session.last_command_mode
+        )
+
+    @staticmethod
+    def match_output_tail(
+        session: T_SESSION, command_mode: CommandMode, last_mode: CommandMode | None
+    ) -> CommandMode | None:
+        """Return the mode if the last line of the last output is its prompt."""
+        if not isinstance(last_mode, CommandMode):
+            return None
+        last_line = session.get_output_tail().rsplit("\n", 1)[-1]
+        if not last_line:
+            return None
+        matched = match_mode(
+            CommandModeHelper.defined_modes_by_prompt(command_mode), last_line
+        )
+        if matched and type(matched[0]) is type(last_mode):
+            return matched[0]
+        return None
 
     @staticmethod
     def defined_modes_by_prompt(command_mode: CommandMode) -> dict[str, CommandMode]:
-        """Find all modes by relations and generate dict."""
+        """Return all modes of the tree by prompts, don't modify the result."""
+        return CommandModeGraph.get(command_mode).modes_by_prompt
 
-        def _get_child_nodes(command_node):
-            return reduce(
-                lambda x, y: x + _get_child_nodes(y),
-                [command_node.child_nodes] + command_node.child_nodes,
-            )
+    @staticmethod
+    def calculate_route_steps(
+        source_node: CommandMode, dest_node: CommandMode
+    ) -> list[callable]:
+        """Calculate route between two modes, cached for modes of one tree."""
+        return CommandModeGraph.get(dest_node).route_steps(source_node, dest_node)
 
-        node = command_mode
-        while node.parent_node:
-            node = node.parent_node
-        root_node = node
+    @staticmethod
+    def batch_route_steps(steps: list[Callable]) -> list[Callable]:
+        """Join following steps that can be sent in one write to RouteBurst.
 
-        node_list = [root_node] + _get_child_nodes(root_node)
+        Steps that need answers to enter action maps, enter actions or probing
+        the exact prompt are left as they are and done step by step.
+        """
+        batched = []
+        burst = RouteBurst()
+        for step in steps:
+            if burst.add(step):
+                continue
+            batched.extend(CommandModeHelper._complete_burst(burst))
+            burst = RouteBurst()
+            batched.append(step)
+        batched.extend(CommandModeHelper._complete_burst(burst))
+        return batched
 
-        modes_dict = OrderedDict()
-        for mode in node_list:
-            modes_dict[mode.prompt] = mode
-        return modes_dict
+    @staticmethod
+    def _complete_burst(burst: RouteBurst) -> list[Callable]:
+        if len(burst.commands) > 1:
+            return [burst]
+        return burst.steps
 
     @staticmethod
     def create_command_mode(*args, **kwargs) -> T_COMMAND_MODE_RELATIONS:
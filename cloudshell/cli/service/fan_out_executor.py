@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any
+
+from attrs import define
+
+from cloudshell.cli.command_template.command_template_executor import (
+    CommandTemplateExecutor,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Iterable, Iterator
+
+    from cloudshell.cli.command_template.command_template import CommandTemplate
+    from cloudshell.cli.configurator import CLIServiceConfigurator
+    from cloudshell.cli.service.cli_service_impl import CliServiceImpl
+    from cloudshell.cli.service.command_mode import CommandMode
+    from cloudshell.cli.types import T_ACTION_MAP, T_ERROR_MAP
+
+
+@define
+class FanOutResult:
+    """Result of the command on one device.
+
+    :param index: position of the configurator in the input
+    :param started: time when the command was started
+    :param duration: time of getting the session and running the command
+    """
+
+    index: int
+    configurator: CLIServiceConfigurator
+    started: float
+    duration: float
+    output: Any = None
+    error: Exception | None = None
+
+    @property
+    def success(self) -> bool:
+        return self.error is None
+
+
+class FanOutExecutor:
+    """Run a command on many devices in parallel.
+
+    Sessions are taken from the configurators' session pools, so the pool has
+    to allow max_per_device sessions to one device.
+    Command modes keep the state of the device, e.g. the exact prompt, so the
+    mode factory has to return a new modes tree for every call.
+    """
+
+    """Max count of commands running at the same time"""
+    MAX_WORKERS = 32
+    """Max count of commands running on one device at the same time"""
+    MAX_PER_DEVICE = 1
+
+    def __init__(
+        self, max_workers: int = MAX_WORKERS, max_per_device: int = MAX_PER_DEVICE
+    ):
+        self._max_workers = max_workers
+        self._max_per_device = max_per_device
+
+    def run(
+        self,
+        configurators: Iterable[CLIServiceConfigurator],
+        command_mode_factory: Callable[[CLIServiceConfigurator], CommandMode],
+        action: Callable[[CliServiceImpl], Any],
+    ) -> Iterator[FanOutResult]:
+        """Run action with the cli service of every configurator.
+
+        Results are yielded as they are completed, errors are returned in results.
+        :param command_mode_factory: return the command mode for the configurator
+        """
+        pending: dict[Hashable, deque[tuple[int, CLIServiceConfigurator]]] = {}
+        for index, configurator in enumerate(configurators):
+            pending.setdefault(self._device_key(configurator), deque()).append(
+                (index, configurator)
+            )
+        running: dict = {}
+        running_per_device: Counter[Hashable] = Counter()
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while pending or running:
+                for key in list(pending):
+                    if len(running) >= self._max_workers:
+                        break
+                    tasks = pending[key]
+                    while tasks and running_per_device[key] < self._max_per_device:
+                        index, configurator = tasks.popleft()
+                        future = executor.submit(
+                            self._execute,
+                            index,
+                            configurator,
+                            command_mode_factory,
+                            action,
+                        )
+                        running[future] = key
+                        running_per_device[key] += 1
+                        if len(running) >= self._max_workers:
+                            break
+                    if not tasks:
+                        del pending[key]
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running_per_device[running.pop(future)] -= 1
+                    yield future.result()
+
+    def run_command(
+        self,
+        configurators: Iterable[CLIServiceConfigurator],
+        command_mode_factory: Callable[[CLIServiceConfigurator], CommandMode],
+        command: str,
+        **kwargs,
+    ) -> Iterator[FanOutResult]:
+        """Send the command to every device, kwargs are passed to send_command."""
+        return self.run(
+            configurators,
+            command_mode_factory,
+            lambda cli_service: cli_service.send_command(command, **kwargs),
+        )
+
+    def run_template(
+        self,
+        configurators: Iterable[CLIServiceConfigurator],
+        command_mode_factory: Callable[[CLIServiceConfigurator], CommandMode],
+        command_template: CommandTemplate,
+        action_map: T_ACTION_MAP | None = None,
+        error_map: T_ERROR_MAP | None = None,
+        **command_kwargs,
+    ) -> Iterator[FanOutResult]:
+        """Execute the command template on every device."""
+        return self.run(
+            configurators,
+            command_mode_factory,
+            lambda cli_service: CommandTemplateExecutor(
+                cli_service, command_template, action_map, error_map
+            ).execute_command(**command_kwargs),
+        )
+
+    @staticmethod
+    def _device_key(configurator: CLIServiceConfigurator) -> Hashable:
+        return configurator.host, configurator.port
+
+    @staticmethod
+    def _execute(
+        index: int,
+        configurator: CLIServiceConfigurator,
+        command_mode_factory: Callable[[CLIServiceConfigurator], CommandMode],
+        action: Callable[[CliServiceImpl], Any],
+    ) -> FanOutResult:
+        started = time.time()
+        try:
+            command_mode = command_mode_factory(configurator)
+            with configurator.get_cli_service(command_mode) as cli_service:
+                output = action(cli_service)
+        except Exception as e:
+            return FanOutResult(
+                index, configurator, started, time.time() - started, error=e
+            )
+        return FanOutResult(index, configurator, started, time.time() - started, output)
@@ -9,10 +9,14 @@ class Node(ABC):
     def __init__(self):
         self.parent_node: Self | None = None
         self.child_nodes: list[Self] = []
+        # incremented on the root when a node is added to the tree,
+        # invalidates the cached tree
+        self.tree_version = 0
 
     def add_child_node(self, node: Node) -> None:
         self.child_nodes.append(node)
         node.parent_node = self
+        NodeOperations.path_to_the_root(self)[-1].tree_version += 1
 
     @abstractmethod
     def step_up(self, *args, **kwargs) -> None:
@@ -53,12 +57,10 @@ class NodeOperations:
                 steps.append(node.step_up)
             return steps
 
-        index = 0
-        while True:
-            if source_node_root_path[index] in dest_node_root_path:
-                dest_index = len(source_node_root_path) - index
+        dest_indexes = {node: index for index, node in enumerate(dest_node_root_path)}
+        for index, node in enumerate(source_node_root_path):
+            if node in dest_indexes:
                 return down_steps(source_node_root_path[:index]) + up_steps(
-                    dest_node_root_path[::-1][dest_index:]
+                    dest_node_root_path[: dest_indexes[node]][::-1]
                 )
-            else:
-                index += 1
+        raise ValueError("Nodes don't have a common root")
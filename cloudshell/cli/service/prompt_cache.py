@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from attrs import asdict, define, field
+
+from cloudshell.cli.service.command_mode_graph import CommandModeGraph
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from cloudshell.cli.service.command_mode import CommandMode
+    from cloudshell.cli.types import T_SESSION
+
+_HOSTNAME_RE = re.compile(r"[\w.-]+@([\w.-]+)|[\w.-]+")
+
+
+@define
+class DevicePrompts:
+    """What is known about the device prompts.
+
+    :param exact_prompts: exact prompts by prompt patterns of the modes
+    :param last_mode: prompt pattern of the last seen mode
+    """
+
+    exact_prompts: dict[str, str] = field(factory=dict)
+    hostname: str | None = None
+    session_type: str | None = None
+    last_mode: str | None = None
+
+
+class PromptCache:
+    """Prompts and modes of devices shared by sessions.
+
+    Devices are identified by the host, console sessions by the host and port.
+    When the path is set, the cache is loaded from the JSON file and merged into
+    it after changes, so it's shared by processes; credentials are not saved.
+    The file is locked while it's merged, without fcntl (Windows) processes can
+    overwrite changes of each other.
+    Changes are saved in the background save_delay seconds after the first one,
+    so changes made meanwhile are merged into the file at once; flush saves
+    them immediately, it's called at exit.
+    Exact prompts are restored only if the prompt after the login starts with
+    the same hostname.
+    """
+
+    """Delay of saving changes to the file, None - save on every change"""
+    SAVE_DELAY = 5.0
+
+    def __init__(self, path: str | None = None, save_delay: float | None = SAVE_DELAY):
+        self._path = path
+        self._save_delay = save_delay
+        self._devices: dict[str, DevicePrompts] = {}
+        self._changed_keys: set[str] = set()
+        self._save_timer: threading.Timer | None = None
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger("cloudshell_cli")
+        if path:
+            self.load()
+            if save_delay:
+                atexit.register(self.flush)
+
+    @staticmethod
+    def get_key(session: T_SESSION) -> str | None:
+        host = getattr(session, "host", None)
+        if not host:
+            return None
+        if session.session_type.upper().startswith("CONSOLE"):
+            return f"{host}:{session.port}"
+        return host
+
+    @staticmethod
+    def get_hostname(prompt_line: str) -> str | None:
+        """Hostname at the start of the prompt, user@hostname is supported."""
+        match = _HOSTNAME_RE.match(prompt_line.strip())
+        if not match:
+            return None
+        return match.group(1) or match.group()
+
+    def get(self, session: T_SESSION) -> DevicePrompts | None:
+        key = self.get_key(session)
+        with self._lock:
+            return self._devices.get(key)
+
+    def order_sessions(self, defined_sessions: list[T_SESSION]) -> list[T_SESSION]:
+        """Move sessions of the types that worked before to the start."""
+
+        def worked(session: T_SESSION) -> bool:
+            device = self.get(session)
+            return device is not None and device.session_type == session.session_type
+
+        return sorted(defined_sessions, key=lambda session: not worked(session))
+
+    def restore(
+        self, session: T_SESSION, command_mode: CommandMode
+    ) -> CommandMode | None:
+        """Set cached exact prompts of the modes, return the last seen mode.
+
+        The last seen mode is returned from the modes tree of the command mode.
+        """
+        device = self.get(session)
+        if device is None:
+            return None
+        last_line = session.get_output_tail().rsplit("\n", 1)[-1]
+        if not device.hostname or self.get_hostname(last_line) != device.hostname:
+            return None
+
+        last_mode = None
+        for mode in CommandModeGraph.get(command_mode).modes:
+            exact_prompt = device.exact_prompts.get(mode.prompt_pattern)
+            if exact_prompt and mode.use_exact_prompt:
+                mode.exact_prompt = exact_prompt
+            if mode.prompt_pattern == device.last_mode:
+                last_mode = mode
+        return last_mode
+
+    def remember(self, session: T_SESSION, command_mode: CommandMode) -> None:
+        """Save prompts of the device the session is connected to."""
+        key = self.get_key(session)
+        if key is None:
+            return
+        last_line = session.get_output_tail().rsplit("\n", 1)[-1]
+        device = DevicePrompts(
+            exact_prompts={
+                mode.prompt_pattern: mode.exact_prompt
+                for mode in CommandModeGraph.get(command_mode).modes
+                if mode.use_exact_prompt and mode.exact_prompt
+            },
+            hostname=self.get_hostname(last_line),
+            session_type=session.session_type,
+            last_mode=command_mode.prompt_pattern,
+        )
+        with self._lock:
+            if self._devices.get(key) == device:
+                return
+            self._devices[key] = device
+            self._changed_keys.add(key)
+        if self._path:
+            self._schedule_save()
+
+    def clear(self) -> None:
+        """Clear the cache, the file is cleared for all processes."""
+        with self._lock:
+            self._devices.clear()
+            self._changed_keys.clear()
+        if self._path:
+            try:
+                with self._file_lock():
+                    self._write({})
+            except OSError:
+                self._logger.warning(f"Cannot save the prompt cache {self._path}")
+
+    def flush(self) -> None:
+        """Save changes that wait for the delayed save."""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+            changed = bool(self._changed_keys)
+        if timer is not None:
+            timer.cancel()
+        if changed and self._path:
+            self.save()
+
+    def _schedule_save(self) -> None:
+        if not self._save_delay:
+            self.save()
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self._save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def load(self) -> None:
+        devices = self._read()
+        with self._lock:
+            self._devices.update(devices)
+
+    def save(self) -> None:
+        """Merge changed devices into the file, the file is replaced at once.
+
+        Devices saved by other processes are kept and loaded.
+        """
+        try:
+            with self._file_lock():
+                devices = self._read()
+                with self._lock:
+                    devices.update(
+                        (key, self._devices[key])
+                        for key in self._changed_keys
+                        if key in self._devices
+                    )
+                    self._devices = devices
+                    self._changed_keys.clear()
+                    data = {key: asdict(device) for key, device in devices.items()}
+                self._write(data)
+        except OSError:
+            self._logger.warning(f"Cannot save the prompt cache {self._path}")
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Lock the file for other processes, does nothing without fcntl."""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self._path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> dict[str, DevicePrompts]:
+        try:
+            with open(self._path) as file:
+                data = json.load(file)
+            return {key: DevicePrompts(**value) for key, value in data.items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError):
+            self._logger.warning(f"Cannot load the prompt cache {self._path}")
+            return {}
+
+    def _write(self, data: dict[str, dict]) -> None:
+        directory = os.path.dirname(os.path.abspath(self._path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except OSError:
+            self._logger.warning(f"Cannot save the prompt cache {self._path}")
+            return
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(data, file)
+            os.replace(tmp_path, self._path)
+        except OSError:
+            self._logger.warning(f"Cannot save the prompt cache {self._path}")
+            os.remove(tmp_path)
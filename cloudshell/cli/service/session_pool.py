@@ -26,3 +26,9 @@ class SessionPool(ABC):
     def remove_session(self, session: T_SESSION, logger: Logger) -> None:
         """Remove session from pool."""
         pass
+
+    def new_session(
+        self, new_sessions: list[T_SESSION], prompt: str, logger: Logger
+    ) -> T_SESSION | None:
+        """Create new session if pool isn't full, None if it's not supported."""
+        return None
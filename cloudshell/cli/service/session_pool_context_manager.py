@@ -3,13 +3,14 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from cloudshell.cli.service.cli_service_impl import CliServiceImpl as CliService
-from cloudshell.cli.service.command_mode_helper import CommandModeHelper
+from cloudshell.cli.service.command_mode_graph import CommandModeGraph
 from cloudshell.cli.session.expect_session import CommandExecutionException
 
 if TYPE_CHECKING:
     from logging import Logger
 
     from cloudshell.cli.service.command_mode import CommandMode
+    from cloudshell.cli.service.prompt_cache import PromptCache
     from cloudshell.cli.service.session_pool import SessionPool
     from cloudshell.cli.types import T_SESSION
 
@@ -25,34 +26,59 @@ class SessionPoolContextManager:
         defined_sessions: list[T_SESSION],
         command_mode: CommandMode,
         logger: Logger,
+        lazy_mode_change: bool = False,
+        batch_mode_change: bool = False,
+        prompt_cache: PromptCache | None = None,
     ):
         self._session_pool = session_pool
         self._command_mode = command_mode
         self._logger = logger
+        self._lazy_mode_change = lazy_mode_change
+        self._batch_mode_change = batch_mode_change
+        self._prompt_cache = prompt_cache
 
         self._defined_sessions = defined_sessions
 
         self._active_session = None
+        self._cli_service = None
 
     def _initialize_cli_service(self, session: T_SESSION, prompt: str) -> CliService:
         try:
-            return CliService(session, self._command_mode, self._logger)
+            return CliService(
+                session,
+                self._command_mode,
+                self._logger,
+                lazy_mode_change=self._lazy_mode_change,
+                batch_mode_change=self._batch_mode_change,
+                prompt_cache=self._prompt_cache,
+            )
         except Exception:
             session.reconnect(prompt, self._logger)
-            return CliService(session, self._command_mode, self._logger)
+            return CliService(
+                session,
+                self._command_mode,
+                self._logger,
+                lazy_mode_change=self._lazy_mode_change,
+                batch_mode_change=self._batch_mode_change,
+                prompt_cache=self._prompt_cache,
+            )
 
     def __enter__(self) -> CliService:
-        prompts_re = r"|".join(
-            CommandModeHelper.defined_modes_by_prompt(self._command_mode).keys()
-        )
+        prompts_re = CommandModeGraph.get(self._command_mode).prompts_re
+        defined_sessions = self._defined_sessions
+        if self._prompt_cache is not None:
+            defined_sessions = self._prompt_cache.order_sessions(defined_sessions)
         self._active_session = self._session_pool.get_session(
-            self._defined_sessions, prompts_re, self._logger
+            defined_sessions, prompts_re, self._logger
         )
         try:
-            return self._initialize_cli_service(self._active_session, prompts_re)
+            self._cli_service = self._initialize_cli_service(
+                self._active_session, prompts_re
+            )
         except Exception:
             self._session_pool.remove_session(self._active_session, self._logger)
             raise
+        return self._cli_service
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self._active_session:
@@ -63,4 +89,19 @@ class SessionPoolContextManager:
             ):
                 self._session_pool.remove_session(self._active_session, self._logger)
             else:
+                # a deferred exit from a mode is done before the session is
+                # returned, so a pooled session doesn't stay in e.g. config mode
+                try:
+                    self._cli_service._settle_mode()
+                except Exception:
+                    self._logger.exception("Failed to leave the mode")
+                    self._session_pool.remove_session(
+                        self._active_session, self._logger
+                    )
+                    return
+                self._active_session.last_command_mode = self._cli_service.command_mode
+                if self._prompt_cache is not None:
+                    self._prompt_cache.remember(
+                        self._active_session, self._cli_service.command_mode
+                    )
                 self._session_pool.return_session(self._active_session, self._logger)
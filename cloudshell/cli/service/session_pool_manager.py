@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import logging
 import time
-from queue import Queue
-from threading import Condition
+from collections import Counter, deque
+from threading import Condition, Event, Thread
 from typing import TYPE_CHECKING
 
+from attrs import define, field
+
 from cloudshell.cli.service.cli_exception import CliException
 from cloudshell.cli.service.session_manager_impl import SessionManagerImpl
 from cloudshell.cli.service.session_pool import SessionPool
 
 if TYPE_CHECKING:
+    from collections.abc import Hashable
     from logging import Logger
 
     from cloudshell.cli.service.session_manager import SessionManager
@@ -20,67 +24,182 @@ class SessionPoolException(CliException):
     """Session pool exception."""
 
 
+@define
+class _SessionInfo:
+    prompt: str
+    logger: Logger
+    created: float = field(factory=time.time)
+
+
 class SessionPoolManager(SessionPool):
-    """Implementation of session pool."""
+    """Implementation of session pool.
 
-    """Max count of sessions can be created"""
+    Sessions are kept per connection key (session class, host, port and
+    credentials), so getting a session for one device never disconnects an idle
+    session of another device while the total limit is not reached.
+    Idle sessions that are closed by the device, idle for too long or too old
+    are dropped on get; the optional reaper thread does it in the background and
+    reconnects dead and old sessions before they are needed.
+    """
+
+    """Max count of sessions can be created for one connection key"""
     MAX_POOL_SIZE = 1
+    """Max count of sessions can be created for all keys, None - unlimited"""
+    MAX_TOTAL_SIZE = None
     """Waiting session timeout"""
     POOL_TIMEOUT = 100
+    """Drop sessions idle longer than this time, None - never"""
+    IDLE_TIMEOUT = None
+    """Reconnect sessions connected longer than this time ago, None - never"""
+    MAX_LIFETIME = None
+    """Period of the background check of idle sessions, None - check only on get"""
+    REAPER_INTERVAL = None
 
     def __init__(
         self,
-        session_manager: SessionManager = SessionManagerImpl(),
+        session_manager: SessionManager | None = None,
         max_pool_size: int = MAX_POOL_SIZE,
         pool_timeout: int = POOL_TIMEOUT,
-        pool: Queue | None = None,
+        max_total_size: int | None = MAX_TOTAL_SIZE,
+        idle_timeout: float | None = IDLE_TIMEOUT,
+        max_lifetime: float | None = MAX_LIFETIME,
+        reaper_interval: float | None = REAPER_INTERVAL,
     ):
         self._session_condition = Condition()
-        self._session_manager = session_manager
+        self._session_manager = session_manager or SessionManagerImpl()
         self._max_pool_size = max_pool_size
+        self._max_total_size = max_total_size
         self._pool_timeout = pool_timeout
+        self._idle_timeout = idle_timeout
+        self._max_lifetime = max_lifetime
+        self._reaper_interval = reaper_interval
+
+        # idle sessions per key, the oldest returned session is the first one
+        self._idle_sessions: dict[Hashable, deque[tuple[float, T_SESSION]]] = {}
+        # created sessions and sessions being connected per key,
+        # waiters of all keys share the condition, so they are notified all
+        self._sessions_count: Counter[Hashable] = Counter()
+        self._sessions_info: dict[int, _SessionInfo] = {}
+        # discarded sessions, disconnected without holding the lock
+        self._discarded: list[tuple[T_SESSION, Logger]] = []
+        self._reaper: Thread | None = None
+        self._closed = Event()
 
-        self._pool = pool or Queue(self._max_pool_size)
+    @staticmethod
+    def get_key(session: T_SESSION) -> Hashable:
+        """Connection key of the session, sessions without it use the class."""
+        return getattr(session, "connection_key", None) or session.__class__
 
     def get_session(
         self, defined_sessions: list[T_SESSION], prompt: str, logger: Logger
     ) -> T_SESSION:
         """Return session object, takes it from pool or create new session."""
         call_time = time.time()
-        with self._session_condition:
-            session_obj = None
-            while session_obj is None:
-                if not self._pool.empty():
-                    session_obj = self._get_from_pool(defined_sessions, prompt, logger)
-                elif (
-                    self._session_manager.existing_sessions_count() < self._pool.maxsize
-                ):
-                    session_obj = self._new_session(defined_sessions, prompt, logger)
-                else:
-                    self._session_condition.wait(self._pool_timeout)
-                    if (time.time() - call_time) >= self._pool_timeout:
+        if not isinstance(defined_sessions, list):
+            defined_sessions = [defined_sessions]
+        keys = list(dict.fromkeys(map(self.get_key, defined_sessions)))
+        try:
+            with self._session_condition:
+                while True:
+                    session_obj = self._get_from_pool(keys, defined_sessions, logger)
+                    if session_obj is not None:
+                        return session_obj
+                    if self._has_free_slot(keys) or self._evict_idle_session(
+                        keys, logger
+                    ):
+                        break
+                    # the pool is checked again after the last wait
+                    remaining = self._pool_timeout - (time.time() - call_time)
+                    if remaining <= 0:
                         raise SessionPoolException(
                             self.__class__.__name__,
                             "Cannot get session instance during {} sec.".format(
                                 self._pool_timeout
                             ),
                         )
-            return session_obj
+                    self._session_condition.wait(remaining)
+                # reserve the slot, connect without holding the lock
+                self._sessions_count[keys[0]] += 1
+        finally:
+            self._disconnect_discarded()
+        return self._connect_reserved(keys, defined_sessions, prompt, logger)
+
+    def new_session(
+        self, defined_sessions: list[T_SESSION], prompt: str, logger: Logger
+    ) -> T_SESSION | None:
+        """Create new session if there is a free slot, used to warm up the pool.
+
+        Doesn't wait and doesn't evict idle sessions, return None if the pool is
+        full. The session has to be returned to the pool.
+        """
+        if not isinstance(defined_sessions, list):
+            defined_sessions = [defined_sessions]
+        keys = list(dict.fromkeys(map(self.get_key, defined_sessions)))
+        with self._session_condition:
+            if not self._has_free_slot(keys):
+                return None
+            self._sessions_count[keys[0]] += 1
+        return self._connect_reserved(keys, defined_sessions, prompt, logger)
+
+    def _connect_reserved(
+        self,
+        keys: list[Hashable],
+        defined_sessions: list[T_SESSION],
+        prompt: str,
+        logger: Logger,
+    ) -> T_SESSION:
+        """Create new session for the slot reserved for the first key."""
+        try:
+            session_obj = self._new_session(defined_sessions, prompt, logger)
+        except Exception:
+            with self._session_condition:
+                self._release(keys[0])
+                self._session_condition.notify_all()
+            raise
+
+        key = self.get_key(session_obj)
+        with self._session_condition:
+            if key != keys[0]:
+                self._release(keys[0])
+                self._sessions_count[key] += 1
+            self._sessions_info[id(session_obj)] = _SessionInfo(prompt, logger)
+        return session_obj
 
     def remove_session(self, session: T_SESSION, logger: Logger) -> None:
         """Remove session from the pool."""
         logger.debug("Removing session")
         with self._session_condition:
             self._session_manager.remove_session(session, logger)
-            self._session_condition.notify()
+            self._release(self.get_key(session))
+            self._sessions_info.pop(id(session), None)
+            self._session_condition.notify_all()
 
     def return_session(self, session: T_SESSION, logger: Logger) -> None:
         """Return session back to the pool."""
         logger.debug("Return session to the pool")
         with self._session_condition:
             session.new_session = False
-            self._pool.put(session)
-            self._session_condition.notify()
+            self._idle_sessions.setdefault(self.get_key(session), deque()).append(
+                (time.time(), session)
+            )
+            self._session_condition.notify_all()
+            if self._reaper_interval and self._reaper is None:
+                self._reaper = Thread(
+                    target=self._run_reaper, name="SessionPoolReaper", daemon=True
+                )
+                self._reaper.start()
+
+    def close(self) -> None:
+        """Stop the reaper thread and disconnect idle sessions."""
+        self._closed.set()
+        if self._reaper is not None and self._reaper.is_alive():
+            self._reaper.join()
+        with self._session_condition:
+            for key, idle_sessions in list(self._idle_sessions.items()):
+                for _, session in idle_sessions:
+                    self._discard(key, session, self._get_logger(session))
+            self._idle_sessions.clear()
+        self._disconnect_discarded()
 
     def _new_session(
         self, new_sessions: list[T_SESSION], prompt: str, logger: Logger
@@ -92,14 +211,168 @@ class SessionPoolManager(SessionPool):
         return session
 
     def _get_from_pool(
-        self, new_sessions: list[T_SESSION], prompt: str, logger: Logger
-    ) -> T_SESSION:
-        """Get session from the pool."""
-        logger.debug("getting session from the pool")
-        session = self._pool.get(False)
-
-        if not self._session_manager.is_compatible(session, new_sessions, logger):
-            logger.debug("Session args was changed, creating session with new args")
-            self.remove_session(session, logger)
-            session = self._new_session(new_sessions, prompt, logger)
-        return session
+        self, keys: list[Hashable], new_sessions: list[T_SESSION], logger: Logger
+    ) -> T_SESSION | None:
+        """Get the most recently used idle session for one of the keys."""
+        now = time.time()
+        for key in keys:
+            idle_sessions = self._idle_sessions.get(key)
+            while idle_sessions:
+                returned, session = idle_sessions.pop()
+                if not idle_sessions:
+                    del self._idle_sessions[key]
+                logger.debug("getting session from the pool")
+                if not self._session_manager.is_compatible(
+                    session, new_sessions, logger
+                ):
+                    logger.debug("Session args was changed, removing session")
+                    self._discard(key, session, logger, disconnect=False)
+                elif self._is_idle_expired(returned, now):
+                    logger.debug("Session was idle too long, removing session")
+                    self._discard(key, session, logger)
+                elif self._is_lifetime_expired(session, now):
+                    logger.debug("Session max lifetime exceeded, removing session")
+                    self._discard(key, session, logger)
+                elif not session.is_alive():
+                    logger.debug("Session is closed by the device, removing session")
+                    self._discard(key, session, logger)
+                else:
+                    return session
+                idle_sessions = self._idle_sessions.get(key)
+        return None
+
+    def _has_free_slot(self, keys: list[Hashable]) -> bool:
+        if sum(self._sessions_count[key] for key in keys) >= self._max_pool_size:
+            return False
+        return (
+            self._max_total_size is None
+            or sum(self._sessions_count.values()) < self._max_total_size
+        )
+
+    def _evict_idle_session(self, keys: list[Hashable], logger: Logger) -> bool:
+        """Disconnect the least recently used idle session of another key.
+
+        Used only when the total limit is reached and the keys have free slots.
+        """
+        if sum(self._sessions_count[key] for key in keys) >= self._max_pool_size:
+            return False
+        candidates = [
+            (idle_sessions[0][0], key)
+            for key, idle_sessions in self._idle_sessions.items()
+            if key not in keys
+        ]
+        if not candidates:
+            return False
+        _, key = min(candidates, key=lambda candidate: candidate[0])
+        idle_sessions = self._idle_sessions[key]
+        _, session = idle_sessions.popleft()
+        if not idle_sessions:
+            del self._idle_sessions[key]
+        logger.debug("Total sessions limit reached, disconnecting idle session")
+        self._discard(key, session, logger)
+        return True
+
+    def _is_idle_expired(self, returned: float, now: float) -> bool:
+        return self._idle_timeout is not None and now - returned >= self._idle_timeout
+
+    def _is_lifetime_expired(self, session: T_SESSION, now: float) -> bool:
+        info = self._sessions_info.get(id(session))
+        return (
+            self._max_lifetime is not None
+            and info is not None
+            and now - info.created >= self._max_lifetime
+        )
+
+    def _get_logger(self, session: T_SESSION) -> Logger:
+        info = self._sessions_info.get(id(session))
+        return info.logger if info else logging.getLogger("cloudshell_cli")
+
+    def _run_reaper(self) -> None:
+        while not self._closed.wait(self._reaper_interval):
+            try:
+                self._reap()
+            except Exception:
+                logging.getLogger("cloudshell_cli").exception("Session reaper failed")
+
+    def _reap(self) -> None:
+        """Drop idle expired sessions, reconnect dead and old ones."""
+        now = time.time()
+        to_reconnect = []
+        with self._session_condition:
+            for key, idle_sessions in list(self._idle_sessions.items()):
+                for item in list(idle_sessions):
+                    returned, session = item
+                    logger = self._get_logger(session)
+                    if self._is_idle_expired(returned, now):
+                        logger.debug("Session was idle too long, removing session")
+                        idle_sessions.remove(item)
+                        self._discard(key, session, logger)
+                    elif self._is_lifetime_expired(session, now) or (
+                        not session.is_alive()
+                    ):
+                        idle_sessions.remove(item)
+                        if id(session) in self._sessions_info:
+                            to_reconnect.append((key, session))
+                        else:
+                            self._discard(key, session, logger)
+                if not idle_sessions:
+                    del self._idle_sessions[key]
+        self._disconnect_discarded()
+
+        for key, session in to_reconnect:
+            # the session is still counted, so it cannot be replaced meanwhile
+            info = self._sessions_info[id(session)]
+            info.logger.debug("Reconnecting dead or old idle session")
+            try:
+                session.reconnect(info.prompt, info.logger)
+            except Exception as e:
+                info.logger.debug(f"Failed to reconnect idle session: {e}")
+                with self._session_condition:
+                    self._discard(key, session, info.logger)
+                    self._session_condition.notify_all()
+            else:
+                with self._session_condition:
+                    if self._closed.is_set():
+                        self._discard(key, session, info.logger)
+                        continue
+                    info.created = time.time()
+                    session.new_session = True
+                    self._idle_sessions.setdefault(key, deque()).append(
+                        (time.time(), session)
+                    )
+                    self._session_condition.notify_all()
+        self._disconnect_discarded()
+
+    def _discard(
+        self,
+        key: Hashable,
+        session: T_SESSION,
+        logger: Logger,
+        disconnect: bool = True,
+    ) -> None:
+        """Forget the session that is not in the idle sessions anymore.
+
+        The session is disconnected by _disconnect_discarded after the lock is
+        released.
+        """
+        self._session_manager.remove_session(session, logger)
+        self._release(key)
+        self._sessions_info.pop(id(session), None)
+        if disconnect:
+            self._discarded.append((session, logger))
+
+    def _disconnect_discarded(self) -> None:
+        """Disconnect discarded sessions, called without holding the lock."""
+        with self._session_condition:
+            discarded, self._discarded = self._discarded, []
+        for session, logger in discarded:
+            try:
+                session.disconnect()
+            except Exception as e:
+                logger.debug(f"Failed to disconnect idle session: {e}")
+
+    def _release(self, key: Hashable) -> None:
+        if self._sessions_count[key] > 1:
+            self._sessions_count[key] -= 1
+        else:
+            self._sessions_count.pop(key, None)
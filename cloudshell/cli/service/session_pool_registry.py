@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from threading import Lock
+
+from attrs import define
+
+from cloudshell.cli.service.session_manager_impl import SessionManagerImpl
+from cloudshell.cli.service.session_pool_manager import (
+    SessionPoolException,
+    SessionPoolManager,
+)
+
+DEFAULT_POOL_NAME = "default"
+# one session for the whole process, the behavior of the previous versions
+LEGACY_POOL_NAME = "legacy"
+
+
+@define(frozen=True)
+class SessionPoolConfig:
+    """Limits of the session pool.
+
+    :param max_pool_size: max count of sessions to one device
+    :param max_total_size: max count of sessions to all devices, None - unlimited
+    :param pool_timeout: waiting session timeout
+    :param idle_timeout: drop sessions idle longer than this time, None - never
+    :param max_lifetime: reconnect sessions older than this time, None - never
+    :param reaper_interval: period of the background check of idle sessions,
+        None - check only on get
+    """
+
+    max_pool_size: int = 5
+    max_total_size: int | None = 100
+    pool_timeout: int = SessionPoolManager.POOL_TIMEOUT
+    idle_timeout: float | None = 300
+    max_lifetime: float | None = None
+    reaper_interval: float | None = 30
+
+
+LEGACY_POOL_CONFIG = SessionPoolConfig(
+    max_pool_size=1, max_total_size=1, idle_timeout=None, reaper_interval=None
+)
+
+
+class SessionPoolRegistry:
+    """Named session pools, every pool is created on the first request.
+
+    CLI instances with the same pool name share sessions and limits.
+    """
+
+    def __init__(self, default_config: SessionPoolConfig = SessionPoolConfig()):
+        self._lock = Lock()
+        self._default_config = default_config
+        self._configs: dict[str, SessionPoolConfig] = {
+            LEGACY_POOL_NAME: LEGACY_POOL_CONFIG
+        }
+        self._pools: dict[str, SessionPoolManager] = {}
+
+    def configure(self, name: str, config: SessionPoolConfig) -> None:
+        """Set limits of the pool, it has to be done before the pool is used."""
+        with self._lock:
+            if name in self._pools:
+                raise SessionPoolException(
+                    self.__class__.__name__, f"Session pool {name} is already created"
+                )
+            self._configs[name] = config
+
+    def get_pool(self, name: str = DEFAULT_POOL_NAME) -> SessionPoolManager:
+        with self._lock:
+            try:
+                return self._pools[name]
+            except KeyError:
+                config = self._configs.get(name, self._default_config)
+                pool = SessionPoolManager(
+                    session_manager=SessionManagerImpl(),
+                    max_pool_size=config.max_pool_size,
+                    pool_timeout=config.pool_timeout,
+                    max_total_size=config.max_total_size,
+                    idle_timeout=config.idle_timeout,
+                    max_lifetime=config.max_lifetime,
+                    reaper_interval=config.reaper_interval,
+                )
+                self._pools[name] = pool
+                return pool
+
+
+session_pool_registry = SessionPoolRegistry()
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import mmap
+import re
+import tempfile
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from typing import BinaryIO
+
+
+class SpooledOutput:
+    """Command output kept in memory till the threshold, then in a temporary file.
+
+    The file is memory-mapped when the output is completed, so searching and
+    iterating lines don't load the whole output. Search works on the UTF-8
+    encoded output, positions of matches are in bytes.
+    """
+
+    """Size of the output in bytes kept in memory"""
+    SPOOL_THRESHOLD = 16 * 1024 * 1024
+
+    def __init__(self, threshold: int = SPOOL_THRESHOLD, directory: str | None = None):
+        self._threshold = threshold
+        self._directory = directory
+        self._buffer = bytearray()
+        self._file: BinaryIO | None = None
+        self._mmap: mmap.mmap | None = None
+        self._size = 0
+
+    @classmethod
+    def from_chunks(
+        cls,
+        chunks: Iterable[str],
+        threshold: int = SPOOL_THRESHOLD,
+        directory: str | None = None,
+    ) -> SpooledOutput:
+        output = cls(threshold, directory)
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        except Exception:
+            output.close()
+            raise
+        output.finish()
+        return output
+
+    @property
+    def spilled(self) -> bool:
+        """The output is in the file."""
+        return self._file is not None
+
+    def write(self, chunk: str) -> None:
+        data = chunk.encode()
+        self._size += len(data)
+        if self._file is None:
+            self._buffer += data
+            if len(self._buffer) > self._threshold:
+                self._file = tempfile.TemporaryFile(dir=self._directory)
+                self._file.write(self._buffer)
+                self._buffer = bytearray()
+        else:
+            self._file.write(data)
+
+    def finish(self) -> None:
+        """Map the file, the output cannot be changed after that."""
+        if self._file is not None and self._mmap is None:
+            self._file.flush()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def _data(self) -> bytes | bytearray | mmap.mmap:
+        return self._buffer if self._mmap is None else self._mmap
+
+    def search(self, pattern: str, flags: int = 0) -> re.Match | None:
+        """Search the pattern, the match contains bytes."""
+        return re.compile(pattern.encode(), flags).search(self._data)
+
+    def finditer(self, pattern: str, flags: int = 0) -> Iterator[re.Match]:
+        return re.compile(pattern.encode(), flags).finditer(self._data)
+
+    def findall(self, pattern: str, flags: int = 0) -> list[str]:
+        """Return all matched strings."""
+        return [
+            match.group().decode(errors="replace")
+            for match in self.finditer(pattern, flags)
+        ]
+
+    def iter_lines(self) -> Iterator[str]:
+        """Iterate lines, line ends are kept."""
+        data = self._data
+        pos = 0
+        while pos < self._size:
+            end = data.find(b"\n", pos)
+            end = self._size if end == -1 else end + 1
+            yield data[pos:end].decode(errors="replace")
+            pos = end
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_lines()
+
+    def __contains__(self, item: str) -> bool:
+        return self._data.find(item.encode()) != -1
+
+    def __len__(self) -> int:
+        """Size of the output in bytes."""
+        return self._size
+
+    def __str__(self) -> str:
+        """Whole output, loads it to the memory."""
+        return self._data[: self._size].decode(errors="replace")
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = bytearray()
+        self._size = 0
+
+    def __enter__(self) -> SpooledOutput:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self) -> None:
+        self.close()
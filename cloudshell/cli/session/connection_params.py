@@ -40,6 +40,11 @@ class ConnectionParams(ABC):
         if self.on_session_start and callable(self.on_session_start):
             self.on_session_start(self, logger)
 
+    @property
+    def connection_key(self) -> tuple:
+        """Connection identity, sessions with equal keys are interchangeable."""
+        return self.__class__, self.host, self.port, self.pkey
+
     def __eq__(self, other) -> bool:
         return (
             self.__class__ == other.__class__
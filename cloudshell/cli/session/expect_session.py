@@ -1,13 +1,22 @@
 from __future__ import annotations
 
+import codecs
 import re
 import socket
 import time
 from abc import ABC, abstractmethod
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from typing import TYPE_CHECKING
 
-from cloudshell.cli.session.helper.normalize_buffer import normalize_buffer
+from attrs import define
+
+from cloudshell.cli.session.helper.expect_program import ExpectProgram
+from cloudshell.cli.session.helper.incremental_matcher import IncrementalMatcher
+from cloudshell.cli.session.helper.normalize_buffer import (
+    BufferNormalizer,
+    normalize_buffer,
+)
+from cloudshell.cli.session.helper.readiness import ReadinessWaiter, is_socket_alive
 from cloudshell.cli.session.session import Session
 from cloudshell.cli.session.session_exceptions import (
     CommandExecutionException,
@@ -19,6 +28,7 @@ from cloudshell.cli.session.session_exceptions import (
 )
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
     from logging import Logger
 
     from cloudshell.cli.types import T_ACTION_MAP, T_ERROR_MAP, T_TIMEOUT
@@ -33,9 +43,21 @@ class ExpectSession(Session, ABC):
     READ_TIMEOUT = 30
     EMPTY_LOOP_TIMEOUT = 0.5
     CLEAR_BUFFER_TIMEOUT = 0.1
+    READ_POLL_TIMEOUT = 0.1
     LOOP_DETECTOR_MAX_ACTION_LOOPS = 3
     LOOP_DETECTOR_MAX_COMBINATION_LENGTH = 4
     RECONNECT_TIMEOUT = 30
+    PIPELINE_WINDOW = 16
+    MATCH_WINDOW = IncrementalMatcher.MATCH_WINDOW
+    ENCODING = "utf-8"
+    """Initial and min size of one read"""
+    BUFFER_SIZE = 1024
+    """Max size of one read, it grows while reads fill it; None - fixed size"""
+    MAX_BUFFER_SIZE = 64 * 1024
+    """Count of reads much smaller than the read size before it's decreased"""
+    BUFFER_SHRINK_READS = 8
+    """Size of the end of the received output kept to check the prompt"""
+    OUTPUT_TAIL_SIZE = 256
 
     def __init__(
         self,
@@ -47,7 +69,26 @@ class ExpectSession(Session, ABC):
         loop_detector_max_combination_length: int = LOOP_DETECTOR_MAX_COMBINATION_LENGTH,  # noqa: E501
         clear_buffer_timeout: T_TIMEOUT = CLEAR_BUFFER_TIMEOUT,
         reconnect_timeout: T_TIMEOUT = RECONNECT_TIMEOUT,
+        match_window: int | None = MATCH_WINDOW,
+        pattern_match_windows: dict[str, int | None] | None = None,
+        nonblocking_clear_buffer: bool = False,
+        trust_prompt_is_last: bool = False,
+        encoding: str = ENCODING,
     ):
+        """Initialize Expect Session.
+
+        :param match_window: size of the already scanned output that is searched
+            again with newly received data, should be bigger than the longest
+            possible match of the prompt or action patterns. None - always search
+            the whole output
+        :param pattern_match_windows: match windows for specific patterns
+        :param nonblocking_clear_buffer: clear buffer reads only data already
+            received instead of waiting clear_buffer_timeout for the new data
+        :param trust_prompt_is_last: the prompt is the last output of the command,
+            skip reading the buffer after the prompt matched
+        :param encoding: encoding of the device output and of sent commands,
+            undecodable bytes are replaced
+        """
         self._new_line = new_line
         self._timeout = timeout
         self._max_loop_retries = max_loop_retries
@@ -59,9 +100,26 @@ class ExpectSession(Session, ABC):
         )
         self._clear_buffer_timeout = clear_buffer_timeout
         self._reconnect_timeout = reconnect_timeout
+        self._match_window = match_window
+        self._pattern_match_windows = pattern_match_windows or {}
+        self.nonblocking_clear_buffer = nonblocking_clear_buffer
+        self.trust_prompt_is_last = trust_prompt_is_last
+        self.clear_buffer_stats = ClearBufferStats()
 
         self._active = False
         self._command_patterns: dict[str, str] = {}
+        self._readiness_waiter = ReadinessWaiter()
+        self._read_timeout = None
+        self._normalizer = BufferNormalizer()
+        self._encoding = encoding
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._decode = self._get_decode(encoding)
+        self._buffer_size = self.BUFFER_SIZE
+        self._small_reads = 0
+        # sessions that override _read_into read into the preallocated buffer
+        self._use_read_into = type(self)._read_into is not ExpectSession._read_into
+        self._receive_buffer = bytearray()
+        self._output_tail = ""
 
     @property
     def session_type(self) -> str:
@@ -83,7 +141,30 @@ class ExpectSession(Session, ABC):
     def active(self) -> bool:
         return self._active
 
+    def is_alive(self) -> bool:
+        """Check without a device round trip that the connection is not closed.
+
+        EOF is detected by peeking the socket, pending data is left in the buffer.
+        """
+        if not self.active():
+            return False
+        selectable = self._get_selectable()
+        if isinstance(selectable, socket.socket):
+            return is_socket_alive(selectable)
+        return True
+
     def _clear_buffer(self, timeout: T_TIMEOUT, logger: Logger) -> str:
+        start_time = time.time()
+        if self.nonblocking_clear_buffer and self._get_selectable() is not None:
+            out = self._drain_buffer(logger)
+            duration = time.time() - start_time
+            self.clear_buffer_stats.add_call(duration, max(timeout - duration, 0))
+        else:
+            out = self._read_buffer_till_timeout(timeout, logger)
+            self.clear_buffer_stats.add_call(time.time() - start_time)
+        return out
+
+    def _read_buffer_till_timeout(self, timeout: T_TIMEOUT, logger: Logger) -> str:
         out = ""
         while True:
             try:
@@ -96,7 +177,22 @@ class ExpectSession(Session, ABC):
                 break
         return out
 
+    def _drain_buffer(self, logger: Logger) -> str:
+        """Read only data that is already received, don't wait for the new one."""
+        out = ""
+        while self._wait_readable(0):
+            try:
+                out += self._receive(self.READ_POLL_TIMEOUT, logger)
+            except (SessionReadTimeout, SessionReadEmptyData):
+                break
+        return out
+
     def connect(self, prompt: str, logger: Logger) -> None:
+        self._read_timeout = None
+        self._decoder.reset()
+        self._output_tail = ""
+        # the mode is unknown after reconnect, enter actions have to be repeated
+        self.last_command_mode = None
         try:
             self._initialize_session(prompt, logger)
             self._connect_actions(prompt, logger)
@@ -109,15 +205,59 @@ class ExpectSession(Session, ABC):
         """Add new line to the end of command string and send."""
         self._send(command + self._new_line, logger)
 
+    def _get_selectable(self):
+        """Object with fileno() used to wait for incoming data.
+
+        None - readiness isn't supported, session polls with read timeouts.
+        """
+        return None
+
+    def _has_buffered_data(self) -> bool:
+        """Data already read from the socket and buffered by the handler."""
+        return False
+
+    def _wait_readable(self, timeout: T_TIMEOUT) -> bool:
+        if self._has_buffered_data():
+            return True
+        return self._readiness_waiter.wait(self._get_selectable(), timeout)
+
     def _receive_all(self, timeout: T_TIMEOUT, logger: Logger) -> str:
         """Read as much as possible before catch SessionTimeoutException."""
         if not timeout:
             timeout = self._timeout
+        if self._get_selectable() is None:
+            return self._poll_all(timeout, logger)
+
+        start_time = time.time()
+        read_buffer = ""
+        while True:
+            # wait for the first data, then read only data that is already received
+            wait_timeout = 0
+            if not read_buffer:
+                wait_timeout = max(timeout - (time.time() - start_time), 0)
+            if self._wait_readable(wait_timeout):
+                try:
+                    read_buffer += self._receive(self.READ_POLL_TIMEOUT, logger)
+                    continue
+                except SessionReadTimeout:
+                    pass
+                except SessionReadEmptyData:
+                    # connection is closed, avoid busy loop till the timeout
+                    if not read_buffer:
+                        time.sleep(self.READ_POLL_TIMEOUT)
+            if read_buffer:
+                return read_buffer
+            elif time.time() - start_time > timeout:
+                raise ExpectedSessionException(
+                    self.__class__.__name__, "Socket closed by timeout"
+                )
+
+    def _poll_all(self, timeout: T_TIMEOUT, logger: Logger) -> str:
         start_time = time.time()
         read_buffer = ""
         while True:
             try:
-                read_buffer += self._receive(0.1, logger)
+                read_buffer += self._receive(self.READ_POLL_TIMEOUT, logger)
             except (SessionReadTimeout, SessionReadEmptyData):
                 if read_buffer:
                     return read_buffer
@@ -129,43 +269,78 @@ class ExpectSession(Session, ABC):
     def _receive(self, timeout: T_TIMEOUT, logger: Logger) -> str:
         """Read session's buffer."""
         timeout = timeout or self._timeout
-        self._set_timeout(timeout)
+        if timeout != self._read_timeout:
+            self._set_timeout(timeout)
+            self._read_timeout = timeout
         try:
             data = self._read_str_data()
         except socket.timeout:
             raise SessionReadTimeout
         if not data:
             raise SessionReadEmptyData
+        if len(data) >= self.OUTPUT_TAIL_SIZE:
+            self._output_tail = data[-self.OUTPUT_TAIL_SIZE :]
+        else:
+            self._output_tail = (self._output_tail + data)[-self.OUTPUT_TAIL_SIZE :]
         return data
 
+    def get_output_tail(self) -> str:
+        return normalize_buffer(self._output_tail)
+
     @abstractmethod
     def _set_timeout(self, timeout: T_TIMEOUT) -> None:
         pass
 
-    def _read_str_data(self) -> str:
-        byte_data = b""
-        for _ in range(5):
-            new_data = self._read_byte_data()
+    def _get_decode(self, encoding: str) -> Callable[[bytes | memoryview], str]:
+        """Single byte encodings don't need to keep split characters."""
+        if codecs.lookup(encoding).name in ("ascii", "iso8859-1"):
+            return lambda data: str(data, encoding, "replace")
+        return self._decoder.decode
 
-            if not new_data:
-                str_data = byte_data.decode()
-                break
+    def _read_str_data(self) -> str:
+        """Decode received data, the end of a split character is kept."""
+        if self._use_read_into:
+            if len(self._receive_buffer) < self._buffer_size:
+                self._receive_buffer = bytearray(self._buffer_size)
+            with memoryview(self._receive_buffer) as view:
+                size = self._read_into(view[: self._buffer_size])
+                data = self._decode(view[:size])
+        else:
+            byte_data = self._read_byte_data()
+            size = len(byte_data)
+            data = self._decode(byte_data)
+        self._adapt_buffer_size(size)
+        return data
 
-            byte_data += new_data
-            try:
-                str_data = byte_data.decode()
-            except UnicodeDecodeError:
-                continue  # byte data can end with a wrong utf8 symbol, read more
-            else:
-                break
+    def _adapt_buffer_size(self, received: int) -> None:
+        """Double the read size when reads fill it, halve it after small reads."""
+        if not self.MAX_BUFFER_SIZE:
+            return
+        if received >= self._buffer_size:
+            self._buffer_size = min(self._buffer_size * 2, self.MAX_BUFFER_SIZE)
+            self._small_reads = 0
+        elif received * 4 < self._buffer_size and self._buffer_size > self.BUFFER_SIZE:
+            self._small_reads += 1
+            if self._small_reads >= self.BUFFER_SHRINK_READS:
+                self._buffer_size = max(self._buffer_size // 2, self.BUFFER_SIZE)
+                self._small_reads = 0
         else:
-            str_data = byte_data.decode()
-        return str_data
+            self._small_reads = 0
 
     @abstractmethod
     def _read_byte_data(self) -> bytes:
         pass
 
+    def _read_into(self, buffer: memoryview) -> int:
+        """Read into the buffer, return the size of the read data.
+
+        Sessions that can read without a copy override it, then it's used
+        instead of _read_byte_data.
+        """
+        data = self._read_byte_data()
+        buffer[: len(data)] = data
+        return len(data)
+
     def _generate_command_pattern(self, command: str) -> str:
         if command not in self._command_patterns:
             self._command_patterns[command] = (
@@ -232,6 +407,7 @@ class ExpectSession(Session, ABC):
         # nothing is expected (usually used for exit)
         output_list = []
         output_str = ""
+        self._normalizer.reset()
         retries_count = 0
         is_correct_exit = False
 
@@ -239,48 +415,58 @@ class ExpectSession(Session, ABC):
             self._loop_detector_max_action_loops,
             self._loop_detector_max_combination_length,
         )
+        matcher = IncrementalMatcher(self._match_window, self._pattern_match_windows)
+        program = ExpectProgram(expected_string, action_map, error_map, matcher)
         while retries == 0 or retries_count < retries:
             read_buffer = self._receive_all(timeout, logger)
 
             if read_buffer:
-                read_buffer = normalize_buffer(read_buffer)
+                read_buffer = self._normalizer.normalize(read_buffer)
                 logger.debug(read_buffer)
                 output_str += read_buffer
                 # if option remove_command_from_output is set to True, look for command
                 # in output buffer, remove it in case of found
                 if command and remove_command_from_output:
                     command_pattern = self._generate_command_pattern(command)
-                    if re.search(command_pattern, output_str, flags=re.MULTILINE):
+                    if matcher.search(command_pattern, output_str, re.MULTILINE):
                         output_str = re.sub(
                             command_pattern, "", output_str, count=1, flags=re.MULTILINE
                         )
                         remove_command_from_output = False
+                        program.reset(keep_errors=False)
+                    elif len(output_str) > (self._match_window or self.MATCH_WINDOW):
+                        # the echo is not found in the beginning of the output
+                        remove_command_from_output = False
                 retries_count = 0
             else:
                 retries_count += 1
-                time.sleep(empty_loop_timeout)
+                if self._get_selectable() is None:
+                    time.sleep(empty_loop_timeout)
+                else:
+                    self._wait_readable(empty_loop_timeout)
                 continue
 
-            if self.match_prompt(expected_string, output_str, logger):
+            prompt_matched, action_key = program.scan(output_str)
+            if prompt_matched:
                 output_list.append(output_str)
                 is_correct_exit = True
 
-            for action_key in action_map:
-                result_match = re.search(action_key, output_str, re.DOTALL)
-                if result_match:
-                    output_list.append(output_str)
-
-                    if check_action_loop_detector:
-                        if action_loop_detector.loops_detected(action_key):
-                            logger.error("Loops detected")
-                            raise SessionLoopDetectorException(
-                                self.__class__.__name__,
-                                "Expected actions loops detected",
-                            )
-                    logger.debug(f"Action key: {action_key}")
-                    action_map[action_key](self, logger)
-                    output_str = ""
-                    break
+            if action_key is not None:
+                output_list.append(output_str)
+
+                if check_action_loop_detector:
+                    if action_loop_detector.loops_detected(action_key):
+                        logger.error("Loops detected")
+                        raise SessionLoopDetectorException(
+                            self.__class__.__name__,
+                            "Expected actions loops detected",
+                        )
+                logger.debug(f"Action key: {action_key}")
+                action_map[action_key](self, logger)
+                output_str = ""
+                program.reset()
+                # action can change the action map
+                program.action_keys = action_map
 
             if is_correct_exit:
                 break
@@ -291,21 +477,316 @@ class ExpectSession(Session, ABC):
                 f"Session Loop limit exceeded, {retries_count} loops",
             )
 
-        result_output = "".join(output_list)
+        result_output = "".join(output_list) + self._normalizer.flush()
 
-        for error_pattern, error in error_map.items():
-            result_match = re.search(error_pattern, result_output, re.DOTALL)
-
-            if result_match:
-                if isinstance(error, CommandExecutionException):
-                    raise error
-                else:
-                    raise CommandExecutionException(f"Session returned '{error}'")
+        for error_pattern in program.found_errors:
+            self._raise_command_error(error_map[error_pattern])
 
         # Read buffer to the end. Useful when expected_string isn't last in buffer
-        result_output += self._clear_buffer(self._clear_buffer_timeout, logger)
+        if self.trust_prompt_is_last:
+            self.clear_buffer_stats.add_skipped(self._clear_buffer_timeout)
+        else:
+            result_output += self._clear_buffer(self._clear_buffer_timeout, logger)
         return result_output
 
+    @staticmethod
+    def _raise_command_error(error: CommandExecutionException | str) -> None:
+        if isinstance(error, CommandExecutionException):
+            raise error
+        else:
+            raise CommandExecutionException(f"Session returned '{error}'")
+
+    def stream_expect(
+        self,
+        command: str | None,
+        expected_string: str,
+        logger: Logger,
+        action_map: T_ACTION_MAP | None = None,
+        error_map: T_ERROR_MAP | None = None,
+        timeout: T_TIMEOUT | None = None,
+        retries: int | None = None,
+        check_action_loop_detector: bool = True,
+        empty_loop_timeout: T_TIMEOUT | None = None,
+        remove_command_from_output: bool = True,
+        tail_window: int | None = None,
+        **optional_args,
+    ) -> Iterator[str]:
+        """Same as hardware_expect, but yield the output while it is received.
+
+        Only the last tail_window characters are kept to match the prompt,
+        actions and errors, so patterns anchored to the beginning of the output
+        see only the tail. The device is read only when the next chunk is
+        requested, a slow consumer slows down reading.
+        Errors from the error map are raised after the whole output is yielded.
+
+        :param tail_window: size of the kept output, by default match_window
+        """
+        if not action_map:
+            action_map = OrderedDict()
+
+        if not error_map:
+            error_map = OrderedDict()
+
+        retries = retries or self._max_loop_retries
+        empty_loop_timeout = empty_loop_timeout or self._empty_loop_timeout
+        tail_window = tail_window or self._match_window or self.MATCH_WINDOW
+
+        if command is not None:
+            self._clear_buffer(self._clear_buffer_timeout, logger)
+
+            logger.debug(f"Command: {command}")
+            self.send_line(command, logger)
+
+        if not expected_string:
+            raise ExpectedSessionException(
+                self.__class__.__name__, "List of expected messages can't be empty!"
+            )
+
+        remove_command = bool(command) and remove_command_from_output
+        output_str = ""
+        self._normalizer.reset()
+        retries_count = 0
+        action_loop_detector = ActionLoopDetector(
+            self._loop_detector_max_action_loops,
+            self._loop_detector_max_combination_length,
+        )
+        matcher = IncrementalMatcher(self._match_window, self._pattern_match_windows)
+        program = ExpectProgram(expected_string, action_map, error_map, matcher)
+        while True:
+            if retries and retries_count >= retries:
+                raise SessionLoopLimitException(
+                    self.__class__.__name__,
+                    f"Session Loop limit exceeded, {retries_count} loops",
+                )
+            read_buffer = self._receive_all(timeout, logger)
+            if not read_buffer:
+                retries_count += 1
+                if self._get_selectable() is None:
+                    time.sleep(empty_loop_timeout)
+                else:
+                    self._wait_readable(empty_loop_timeout)
+                continue
+
+            retries_count = 0
+            read_buffer = self._normalizer.normalize(read_buffer)
+            logger.debug(read_buffer)
+            output_str += read_buffer
+            if remove_command:
+                command_pattern = self._generate_command_pattern(command)
+                if re.search(command_pattern, output_str, re.MULTILINE):
+                    output_str = re.sub(
+                        command_pattern, "", output_str, count=1, flags=re.MULTILINE
+                    )
+                    remove_command = False
+                    program.reset(keep_errors=False)
+                elif len(output_str) > tail_window:
+                    # the echo is not found in the beginning of the output
+                    remove_command = False
+
+            # the prompt is matched even if the device doesn't echo the command
+            prompt_matched, action_key = program.scan(output_str)
+            if prompt_matched:
+                yield output_str
+                break
+
+            if action_key is not None:
+                remove_command = False
+                if check_action_loop_detector:
+                    if action_loop_detector.loops_detected(action_key):
+                        logger.error("Loops detected")
+                        raise SessionLoopDetectorException(
+                            self.__class__.__name__,
+                            "Expected actions loops detected",
+                        )
+                yield output_str
+                logger.debug(f"Action key: {action_key}")
+                action_map[action_key](self, logger)
+                output_str = ""
+                program.reset()
+                program.action_keys = action_map
+            elif remove_command:
+                # the output isn't yielded till the echo is removed
+                continue
+            elif len(output_str) > tail_window:
+                yield output_str[:-tail_window]
+                output_str = output_str[-tail_window:]
+                program.reset()
+
+        tail = self._normalizer.flush()
+        if tail:
+            yield tail
+
+        for error_pattern in program.found_errors:
+            self._raise_command_error(error_map[error_pattern])
+
+        if self.trust_prompt_is_last:
+            self.clear_buffer_stats.add_skipped(self._clear_buffer_timeout)
+        else:
+            tail = self._clear_buffer(self._clear_buffer_timeout, logger)
+            if tail:
+                yield tail
+
+    def send_commands(
+        self,
+        commands: list[str],
+        expected_string: str,
+        logger: Logger,
+        action_map: T_ACTION_MAP | None = None,
+        error_map: T_ERROR_MAP | None = None,
+        timeout: T_TIMEOUT | None = None,
+        retries: int | None = None,
+        check_action_loop_detector: bool = True,
+        window: int = PIPELINE_WINDOW,
+        **optional_args,
+    ) -> list[str]:
+        """Send commands without waiting for the prompt after every command.
+
+        Up to window commands are sent in one write. The output is split by the
+        command echoes, the output of every command has to end with the prompt.
+        The device has to echo a command only when it starts to execute it.
+        After an action is triggered the rest commands are sent one by one,
+        commands that were already sent can be taken by the device as the answer,
+        so commands with actions are better sent with window=1.
+        If errors from the error map are found, no more commands are sent and
+        the error is raised after the sent commands are completed.
+
+        :param window: max count of commands sent without waiting for the prompt
+        :return: output of every command
+        """
+        if not action_map:
+            action_map = OrderedDict()
+
+        if not error_map:
+            error_map = OrderedDict()
+
+        retries = retries or self._max_loop_retries
+        window = max(window, 1)
+        pending = deque(commands)
+        in_flight: deque[str] = deque()
+        outputs = []
+        error = None
+        output_str = ""
+        self._normalizer.reset()
+        action_pos = 0
+        retries_count = 0
+        prompt_seen = False
+        action_loop_detector = ActionLoopDetector(
+            self._loop_detector_max_action_loops,
+            self._loop_detector_max_combination_length,
+        )
+        matcher = IncrementalMatcher(self._match_window, self._pattern_match_windows)
+        program = ExpectProgram(expected_string, action_map, (), matcher)
+
+        self._clear_buffer(self._clear_buffer_timeout, logger)
+        while pending or in_flight:
+            if error is None and pending and len(in_flight) < window:
+                batch = [
+                    pending.popleft()
+                    for _ in range(min(window - len(in_flight), len(pending)))
+                ]
+                logger.debug(f"Commands: {batch}")
+                self._send("".join(cmd + self._new_line for cmd in batch), logger)
+                in_flight.extend(batch)
+
+            prompt_matched, action_key = program.scan(output_str, start=action_pos)
+            # the output is split only if the prompt was received since the split
+            prompt_seen = prompt_seen or prompt_matched
+            split = None
+            if prompt_seen:
+                split = self._split_command_output(
+                    output_str, in_flight, expected_string
+                )
+            if split is not None:
+                command_output, output_str = split
+                in_flight.popleft()
+                outputs.append(command_output)
+                action_pos = 0
+                prompt_seen = False
+                program.reset()
+                action_loop_detector = ActionLoopDetector(
+                    self._loop_detector_max_action_loops,
+                    self._loop_detector_max_combination_length,
+                )
+                if error is None:
+                    for error_pattern in error_map:
+                        if re.search(error_pattern, command_output, re.DOTALL):
+                            error = error_map[error_pattern]
+                            pending.clear()
+                            break
+                continue
+
+            if action_key is not None:
+                if check_action_loop_detector:
+                    if action_loop_detector.loops_detected(action_key):
+                        logger.error("Loops detected")
+                        raise SessionLoopDetectorException(
+                            self.__class__.__name__,
+                            "Expected actions loops detected",
+                        )
+                logger.debug(f"Action key: {action_key}")
+                action_map[action_key](self, logger)
+                action_pos = len(output_str)
+                # action can change the action map
+                program.action_keys = action_map
+                # the action can take next commands as the answer
+                window = 1
+
+            read_buffer = self._receive_all(timeout, logger)
+            if read_buffer:
+                read_buffer = self._normalizer.normalize(read_buffer)
+                logger.debug(read_buffer)
+                output_str += read_buffer
+                retries_count = 0
+            else:
+                retries_count += 1
+                if retries_count >= retries:
+                    raise SessionLoopLimitException(
+                        self.__class__.__name__,
+                        f"Session Loop limit exceeded, {retries_count} loops",
+                    )
+                if self._get_selectable() is None:
+                    time.sleep(self._empty_loop_timeout)
+                else:
+                    self._wait_readable(self._empty_loop_timeout)
+
+        if outputs:
+            outputs[-1] += self._normalizer.flush()
+
+        if error is not None:
+            self._raise_command_error(error)
+
+        if outputs:
+            if self.trust_prompt_is_last:
+                self.clear_buffer_stats.add_skipped(self._clear_buffer_timeout)
+            else:
+                outputs[-1] += self._clear_buffer(self._clear_buffer_timeout, logger)
+        return outputs
+
+    def _split_command_output(
+        self, output: str, in_flight: deque[str], prompt: str
+    ) -> tuple[str, str] | None:
+        """Split the output of the first command in flight.
+
+        :return: the command output without the echo, the rest output or None
+            if the command is not completed yet
+        """
+        if not in_flight:
+            return None
+        echo = re.search(self._generate_command_pattern(in_flight[0]), output)
+        if len(in_flight) == 1:
+            command_output = output[echo.end() :] if echo else output
+            if re.search(prompt, command_output, re.DOTALL):
+                return command_output, ""
+            return None
+        if not echo:
+            return None
+        next_echo_re = re.compile(self._generate_command_pattern(in_flight[1]))
+        for next_echo in next_echo_re.finditer(output, echo.end()):
+            command_output = output[echo.end() : next_echo.start()]
+            if re.search(prompt, command_output, re.DOTALL):
+                return command_output, output[next_echo.start() :]
+        return None
+
     def reconnect(
         self, prompt: str, logger: Logger, timeout: T_TIMEOUT | None = None
     ) -> None:
@@ -365,3 +846,26 @@ class ActionLoopDetector:
                 is_loops_exist = False
                 break
         return is_loops_exist
+
+
+@define
+class ClearBufferStats:
+    """Time spent and saved by reading the buffer around commands.
+
+    Saved time is compared with the clear buffer timeout that each read waits
+    in the blocking mode.
+    """
+
+    calls: int = 0
+    skipped: int = 0
+    time_spent: float = 0.0
+    time_saved: float = 0.0
+
+    def add_call(self, duration: float, saved: float = 0.0) -> None:
+        self.calls += 1
+        self.time_spent += duration
+        self.time_saved += saved
+
+    def add_skipped(self, timeout: T_TIMEOUT) -> None:
+        self.skipped += 1
+        self.time_saved += timeout
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from cloudshell.cli.session.helper.incremental_matcher import IncrementalMatcher
+
+# backreferences and global inline flags change their meaning inside of alternation
+_NOT_COMBINABLE_RE = re.compile(r"\\[1-9]|\(\?P=|\(\?[aiLmsux]+\)")
+
+
+@lru_cache(maxsize=256)
+def compile_alternation(patterns: tuple[str, ...]) -> re.Pattern | None:
+    """Compile patterns into one alternation, pattern N is in the group _N.
+
+    Return None if patterns cannot be combined.
+    """
+    if not patterns or any(_NOT_COMBINABLE_RE.search(p) for p in patterns):
+        return None
+    try:
+        return re.compile(
+            "|".join(f"(?P<_{i}>{pattern})" for i, pattern in enumerate(patterns)),
+            re.DOTALL,
+        )
+    except re.error:
+        return None
+
+
+class ExpectProgram:
+    """Prompt, action and error patterns merged into one alternation.
+
+    New data is scanned once by the alternation. Only when it matches, patterns
+    are checked separately starting from the matched position, so the priority
+    of the prompt and the order of action and error maps are kept.
+    Error patterns are checked only until they match.
+    """
+
+    def __init__(
+        self,
+        prompt: str,
+        action_keys: Sequence[str],
+        error_keys: Sequence[str],
+        matcher: IncrementalMatcher,
+    ):
+        self._prompt = prompt
+        self._action_keys = tuple(action_keys)
+        self._error_keys = tuple(error_keys)
+        self._matcher = matcher
+        self._found_errors: set[str] = set()
+        self._output_errors: set[str] = set()
+        self._build()
+
+    @property
+    def action_keys(self) -> tuple[str, ...]:
+        return self._action_keys
+
+    @action_keys.setter
+    def action_keys(self, value: Sequence[str]) -> None:
+        self._action_keys = tuple(value)
+        self._build()
+
+    @property
+    def found_errors(self) -> list[str]:
+        """Matched error patterns in the error map order."""
+        found_errors = self._found_errors | self._output_errors
+        return [key for key in self._error_keys if key in found_errors]
+
+    def reset(self, keep_errors: bool = True) -> None:
+        """Scan the output from the beginning.
+
+        :param keep_errors: keep errors found in the current output, False if
+            the output was changed and errors have to be searched again
+        """
+        self._matcher.reset()
+        if keep_errors:
+            self._found_errors.update(self._output_errors)
+        self._output_errors.clear()
+        self._build()
+
+    def _build(self) -> None:
+        self._patterns = (
+            (self._prompt,)
+            + self._action_keys
+            + tuple(
+                key
+                for key in self._error_keys
+                if key not in self._found_errors and key not in self._output_errors
+            )
+        )
+        self._alternation = compile_alternation(self._patterns)
+        if self._alternation is not None:
+            # one pass over the full buffer is still cheaper than a pass per pattern
+            windows = [self._matcher.get_window(pattern) for pattern in self._patterns]
+            window = None if None in windows else max(windows)
+            self._matcher.set_window(self._alternation.pattern, window)
+
+    def scan(self, buffer: str, start: int = 0) -> tuple[bool, str | None]:
+        """Scan the buffer.
+
+        :param start: patterns are searched from this position
+        :return: is prompt matched, first matched action key
+        """
+        group = None
+        if self._alternation is not None:
+            match = self._matcher.search(self._alternation.pattern, buffer, start=start)
+            if not match:
+                return False, None
+            start = match.start()
+            group = match.lastgroup
+
+        matched = self._patterns[int(group[1:])] if group else None
+        prompt_matched = matched == self._prompt or bool(
+            self._matcher.search(self._prompt, buffer, start=start)
+        )
+        action_key = None
+        for key in self._action_keys:
+            if key == matched or self._matcher.search(key, buffer, start=start):
+                action_key = key
+                break
+        new_errors = {
+            key
+            for key in self._patterns[1 + len(self._action_keys) :]
+            if key == matched or self._matcher.search(key, buffer, start=start)
+        }
+        if new_errors:
+            self._output_errors.update(new_errors)
+            self._build()
+            if self._alternation is not None and not prompt_matched and not action_key:
+                # the rest patterns were checked till the end of the buffer
+                self._matcher.mark_scanned(self._alternation.pattern, buffer)
+        return prompt_matched, action_key
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+# patterns anchored to the beginning of the string need the whole buffer
+_ANCHORED_PATTERN_RE = re.compile(r"^(?:\(\?[a-zA-Z]*\)|\(\?:|\()*(?:\^|\\A)")
+
+
+@lru_cache(maxsize=256)
+def _get_max_width(pattern: str) -> int | None:
+    """Max length of the match, None if it's unbounded, e.g. with * or +."""
+    try:
+        width = sre_parse.parse(pattern).getwidth()[1]
+    except Exception:
+        return None
+    return None if width >= sre_parse.MAXREPEAT else width
+
+
+def _ends_at_tail(items: sre_parse.SubPattern, multiline: bool) -> bool:
+    if not len(items):
+        return False
+    op, av = items[-1]
+    if op is sre_parse.AT:
+        return av is sre_parse.AT_END_STRING or (
+            av is sre_parse.AT_END and not multiline
+        )
+    if op is sre_parse.BRANCH:
+        return all(_ends_at_tail(branch, multiline) for branch in av[1])
+    if op is sre_parse.SUBPATTERN:
+        return _ends_at_tail(av[-1], multiline or bool(av[1] & re.MULTILINE))
+    return False
+
+
+@lru_cache(maxsize=256)
+def _is_tail_pattern(pattern: str, flags: int) -> bool:
+    """Whether the match ends at the end of the string, e.g. with $."""
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        return False
+    return _ends_at_tail(parsed, bool(parsed.state.flags & re.MULTILINE))
+
+
+class IncrementalMatcher:
+    """Search patterns in a growing buffer.
+
+    Every pattern remembers the position where the previous unsuccessful search
+    stopped, so next search scans only newly appended data plus an overlap window
+    that covers matches started in the old data.
+    A window of None means that the pattern needs the full context and the whole
+    buffer is scanned every time, it's used for anchored patterns and patterns
+    which match can be longer than the window, e.g. with * or +.
+    Patterns which match ends at the end of the buffer, e.g. prompts with $,
+    are searched only in the last window of the buffer, as with searchwindowsize
+    of pexpect; their matches longer than the window are not found.
+    """
+
+    MATCH_WINDOW = 4096
+
+    def __init__(
+        self,
+        window: int | None = MATCH_WINDOW,
+        pattern_windows: dict[str, int | None] | None = None,
+    ):
+        self._window = window
+        self._pattern_windows = dict(pattern_windows or {})
+        self._windows: dict[tuple[str, int], int | None] = {}
+        self._positions: dict[tuple[str, int], int] = {}
+
+    def get_window(self, pattern: str, flags: int = re.DOTALL) -> int | None:
+        """Overlap window for the pattern, None means the full context."""
+        try:
+            return self._pattern_windows[pattern]
+        except KeyError:
+            pass
+        try:
+            return self._windows[(pattern, flags)]
+        except KeyError:
+            window = self._window
+            max_width = _get_max_width(pattern)
+            if window is not None and (
+                _ANCHORED_PATTERN_RE.match(pattern)
+                or not _is_tail_pattern(pattern, flags)
+                and (max_width is None or max_width > window)
+            ):
+                window = None
+            self._windows[(pattern, flags)] = window
+            return window
+
+    def set_window(self, pattern: str, window: int | None) -> None:
+        self._pattern_windows[pattern] = window
+
+    def mark_scanned(self, pattern: str, buffer: str, flags: int = re.DOTALL) -> None:
+        """Mark the buffer as scanned, the pattern is known not to match it."""
+        window = self.get_window(pattern, flags)
+        if window is not None:
+            key = (pattern, flags)
+            self._positions[key] = max(
+                self._positions.get(key, 0), len(buffer) - window
+            )
+
+    def search(
+        self, pattern: str, buffer: str, flags: int = re.DOTALL, start: int = 0
+    ) -> re.Match | None:
+        """Search the pattern in the part of the buffer that wasn't scanned yet.
+
+        :param start: the search never starts before this position
+        """
+        key = (pattern, flags)
+        window = self.get_window(pattern, flags)
+        if window is not None and _is_tail_pattern(pattern, flags):
+            pos = max(len(buffer) - window, start)
+        else:
+            pos = max(self._positions.get(key, 0), start)
+        match = re.compile(pattern, flags).search(buffer, pos)
+        if not match and window is not None:
+            self._positions[key] = max(pos, len(buffer) - window)
+        return match
+
+    def reset(self) -> None:
+        """Scan buffer from the beginning, used when the buffer was changed."""
+        self._positions.clear()
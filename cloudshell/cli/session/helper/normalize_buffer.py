@@ -1,24 +1,52 @@
+from __future__ import annotations
+
 import re
 
+_COLOR_RE = re.compile(r"\[[0-9]+(?:;?[0-9]+)?m")
+# end of the chunk that can be a part of \r\n or of a color sequence,
+# 27 - ESC character
+_TAIL_RE = re.compile(
+    r"(?:\r(?:\[[0-9]+(?:;?[0-9]+)?m|\x1b)*)?(?:\x1b(?:\[[0-9]*(?:;[0-9]*)?)?)?\Z"
+)
+_TAIL_WINDOW = 64
+_CONTROL_CHARS = dict.fromkeys(
+    [*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), *range(0x7F, 0xA0)]
+)
+
 
 def normalize_buffer(input_buffer: str) -> str:
     """Method for clear color fro input_buffer and special characters."""
-    color_pattern = re.compile(
-        r"\[[0-9]+;{0,1}[0-9]+m|\[[0-9]+m|\b|" + chr(27)
-    )  # 27 - ESC character
-
-    result_buffer = ""
-
-    match_iter = color_pattern.finditer(input_buffer)
-
-    current_index = 0
-    for match_color in match_iter:
-        match_range = match_color.span()
-        result_buffer += input_buffer[current_index : match_range[0]]
-        current_index = match_range[1]
-
-    result_buffer += input_buffer[current_index:]
-
-    result_buffer = result_buffer.replace("\r\n", "\n")
-
-    return re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f-\xff]", "", result_buffer)
+    # every step runs in C, colors and ESC are removed before replacing \r\n
+    if "[" in input_buffer:
+        input_buffer = _COLOR_RE.sub("", input_buffer)
+    if "\x1b" in input_buffer:
+        input_buffer = input_buffer.replace("\x1b", "")
+    return input_buffer.replace("\r\n", "\n").translate(_CONTROL_CHARS)
+
+
+class BufferNormalizer:
+    """Normalize the output that is received by chunks.
+
+    The end of the chunk that can be a part of an escape sequence or of CRLF
+    is kept till the next chunk, flush returns it when the output is completed.
+    """
+
+    def __init__(self):
+        self._pending = ""
+
+    def normalize(self, chunk: str) -> str:
+        if self._pending:
+            chunk = self._pending + chunk
+            self._pending = ""
+        tail = _TAIL_RE.search(chunk, max(len(chunk) - _TAIL_WINDOW, 0))
+        if tail and tail.start() < len(chunk):
+            self._pending = tail.group()
+            chunk = chunk[: tail.start()]
+        return normalize_buffer(chunk)
+
+    def flush(self) -> str:
+        pending, self._pending = self._pending, ""
+        return normalize_buffer(pending)
+
+    def reset(self) -> None:
+        self._pending = ""
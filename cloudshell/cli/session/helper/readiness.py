@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import selectors
+import socket
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cloudshell.cli.types import T_TIMEOUT
+
+
+class ReadinessWaiter:
+    """Wait until a socket, a channel or any object with fileno() is readable.
+
+    The selector is created once and re-registered only when the object changes,
+    e.g. after reconnect.
+    """
+
+    def __init__(self):
+        self._selector: selectors.BaseSelector | None = None
+        self._fileobj = None
+
+    def wait(self, fileobj, timeout: T_TIMEOUT | None) -> bool:
+        """Return True when the object is readable, False by timeout.
+
+        If the object cannot be registered (e.g. closed socket), return True
+        so that the following read raises the actual error.
+        """
+        try:
+            if fileobj is not self._fileobj:
+                self.close()
+                self._selector = selectors.DefaultSelector()
+                self._selector.register(fileobj, selectors.EVENT_READ)
+                self._fileobj = fileobj
+            return bool(self._selector.select(timeout))
+        except (OSError, ValueError):
+            self.close()
+            return True
+
+    def close(self) -> None:
+        if self._selector is not None:
+            self._selector.close()
+        self._selector = None
+        self._fileobj = None
+
+
+def is_socket_alive(sock: socket.socket) -> bool:
+    """Check that the peer didn't close the socket, pending data is not read."""
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(sock, selectors.EVENT_READ)
+            if not selector.select(0):
+                return True
+        return sock.recv(1, socket.MSG_PEEK) != b""
+    except (OSError, ValueError):
+        return False
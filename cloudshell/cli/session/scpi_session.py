@@ -4,10 +4,12 @@ import re
 import socket
 from typing import TYPE_CHECKING
 
+from cloudshell.cli.session.session_exceptions import ExpectedSessionException
 from cloudshell.cli.session.tcp_session import TCPSession
 
 if TYPE_CHECKING:
     from logging import Logger
+    from typing import BinaryIO
 
     from cloudshell.cli.types import (
         T_ACTION_MAP,
@@ -17,9 +19,21 @@ if TYPE_CHECKING:
     )
 
 
+_STATUS_RE = r'([-0-9]+),\s*"([^"]*)"[\r\n]*$'
+_ERROR_QUERY = ":system:error?"
+# response message units separated by ";" outside of quoted strings
+_RESPONSE_UNIT_RE = re.compile(r'(?:"[^"]*"|\'[^\']*\'|[^;"\'])+')
+# query header ends with "?", e.g. "MEAS:VOLT? 10"
+_QUERY_RE = re.compile(r"\s*[^\s;]*\?")
+
+
 class SCPISession(TCPSession):
     SESSION_TYPE = "SCPI"
     BUFFER_SIZE = 1024
+    """Size of the chunk used to write binary blocks to a file"""
+    BINARY_CHUNK_SIZE = 1024 * 1024
+    """Max count of errors read from the error queue after a failed command"""
+    MAX_QUEUED_ERRORS = 32
 
     def __init__(
         self,
@@ -58,17 +72,15 @@ class SCPISession(TCPSession):
         remove_command_from_output: bool = True,
         **optional_args,
     ) -> str:
-        if ";:system:error?" not in command.lower():
-            command += ";:system:error?"
-
-        statusre = r'([-0-9]+), "(.*)"[\r\n]*$'
+        if f";{_ERROR_QUERY}" not in command.lower():
+            command += f";{_ERROR_QUERY}"
 
         # avoid 'multiple repeat' error from '?' in the command - bug in expect_session
         remove_command_from_output = False
 
         rv = super().hardware_expect(
             command,
-            statusre,
+            _STATUS_RE,
             logger,
             action_map,
             error_map,
@@ -80,12 +92,180 @@ class SCPISession(TCPSession):
             **optional_args,
         )
 
-        m = re.search(statusre, rv)
+        self._check_status(rv, logger, timeout)
+        return rv
+
+    def _check_status(
+        self, output: str, logger: Logger, timeout: T_TIMEOUT | None = None
+    ) -> str:
+        """Raise errors from the error query, return the output before it.
+
+        After an error the queue is read till "No error", so the rest errors
+        are raised together and not by the next command.
+        """
+        m = re.search(_STATUS_RE, output)
         if not m:
-            raise Exception("SCPI status code not found in output: %s" % rv)
+            raise Exception("SCPI status code not found in output: %s" % output)
 
+        errors = []
         code, message = m.groups()
-        if code < 0:
-            raise Exception("SCPI error: %d: %s" % (code, message))
+        while int(code) != 0 and len(errors) < self.MAX_QUEUED_ERRORS:
+            errors.append("%d: %s" % (int(code), message))
+            rv = super().hardware_expect(
+                _ERROR_QUERY,
+                _STATUS_RE,
+                logger,
+                timeout=timeout,
+                remove_command_from_output=False,
+            )
+            status = re.search(_STATUS_RE, rv)
+            if not status:
+                raise Exception("SCPI status code not found in output: %s" % rv)
+            code, message = status.groups()
+        if errors:
+            raise Exception("SCPI error: %s" % "; ".join(errors))
+        return output[: m.start()]
 
-        return rv
+    def send_batch(
+        self,
+        commands: list[str],
+        logger: Logger,
+        checkpoint: int | None = None,
+        timeout: T_TIMEOUT | None = None,
+    ) -> list[str | None]:
+        """Send commands joined with ";" into one message per checkpoint.
+
+        The error queue is checked at the end of every message. Commands
+        are sent from the root of the command tree, common commands (*IDN?)
+        are sent as is.
+
+        :param checkpoint: max count of commands in one message, None - all
+            commands are sent in one message
+        :return: response of every query, None for commands without response
+        """
+        checkpoint = checkpoint or len(commands)
+        results: list[str | None] = []
+        for pos in range(0, len(commands), checkpoint):
+            chunk = commands[pos : pos + checkpoint]
+            message = ";".join(
+                cmd if cmd.startswith(("*", ":")) else f":{cmd}" for cmd in chunk
+            )
+            rv = super().hardware_expect(
+                f"{message};{_ERROR_QUERY}",
+                _STATUS_RE,
+                logger,
+                timeout=timeout,
+                remove_command_from_output=False,
+            )
+            responses = _RESPONSE_UNIT_RE.findall(
+                self._check_status(rv, logger, timeout).strip()
+            )
+            responses = [response.strip() for response in responses]
+            responses = [response for response in responses if response]
+            queries = [cmd for cmd in chunk if _QUERY_RE.match(cmd)]
+            if len(responses) != len(queries):
+                raise Exception(
+                    "SCPI batch returned %d responses for %d queries: %s"
+                    % (len(responses), len(queries), rv)
+                )
+            responses.reverse()
+            results.extend(
+                responses.pop() if _QUERY_RE.match(cmd) else None for cmd in chunk
+            )
+        return results
+
+    def read_binary_block(
+        self,
+        command: str | None,
+        logger: Logger,
+        out: bytearray | memoryview | BinaryIO | None = None,
+        timeout: T_TIMEOUT | None = None,
+        check_error: bool = False,
+    ) -> bytearray | int:
+        """Read IEEE 488.2 definite length block "#<n><length><data>".
+
+        The data is read from the socket directly into the buffer, it isn't
+        decoded and matched.
+
+        :param command: query that returns the block, None - the query is sent
+        :param out: writable buffer or binary file for the data, None - new
+            bytearray is returned
+        :param check_error: query the error queue after the block
+        :return: the data if out is None, otherwise the data length
+        """
+        if command is not None:
+            logger.debug(f"Command: {command}")
+            self.send_line(command, logger)
+        timeout = timeout or self._timeout
+        self._set_timeout(timeout)
+        self._read_timeout = timeout
+
+        header = bytearray(1)
+        while header != b"#":
+            self._recv_exact(memoryview(header))
+        self._recv_exact(memoryview(header))
+        if not header.isdigit() or header == b"0":
+            raise ExpectedSessionException(
+                self.__class__.__name__,
+                f"Only definite length blocks are supported, got #{header.decode()}",
+            )
+        length_digits = bytearray(int(header))
+        self._recv_exact(memoryview(length_digits))
+        length = int(length_digits)
+        logger.debug(f"Reading binary block of {length} bytes")
+
+        if out is None:
+            data = bytearray(length)
+            self._recv_exact(memoryview(data))
+        elif hasattr(out, "write"):
+            data = None
+            chunk = memoryview(bytearray(min(length, self.BINARY_CHUNK_SIZE)))
+            left = length
+            while left:
+                size = min(left, len(chunk))
+                self._recv_exact(chunk[:size])
+                out.write(chunk[:size])
+                left -= size
+        else:
+            data = None
+            view = memoryview(out).cast("B")
+            if len(view) < length:
+                raise ExpectedSessionException(
+                    self.__class__.__name__,
+                    f"Buffer of {len(view)} bytes is too small for {length} bytes",
+                )
+            self._recv_exact(view[:length])
+
+        # the block is followed by the message terminator
+        if self._wait_readable(self.READ_POLL_TIMEOUT):
+            if self._handler.recv(1, socket.MSG_PEEK) == b"\n":
+                self._handler.recv(1)
+        if check_error:
+            self._check_status(
+                super().hardware_expect(
+                    _ERROR_QUERY,
+                    _STATUS_RE,
+                    logger,
+                    timeout=timeout,
+                    remove_command_from_output=False,
+                ),
+                logger,
+                timeout,
+            )
+        return length if data is None else data
+
+    def _recv_exact(self, view: memoryview) -> None:
+        """Fill the view with data from the socket."""
+        pos = 0
+        while pos < len(view):
+            try:
+                size = self._handler.recv_into(view[pos:])
+            except socket.timeout:
+                raise ExpectedSessionException(
+                    self.__class__.__name__, "Binary block read timeout"
+                )
+            if not size:
+                raise ExpectedSessionException(
+                    self.__class__.__name__, "Socket closed during binary block read"
+                )
+            pos += size
@@ -1,15 +1,22 @@
 from __future__ import annotations
 
+import re
 from abc import ABC, abstractmethod
 from typing import TYPE_CHECKING
 
+from cloudshell.cli.session.session_exceptions import ExpectedSessionException
+
 if TYPE_CHECKING:
     from logging import Logger
 
+    from cloudshell.cli.service.command_mode import CommandMode
     from cloudshell.cli.types import T_ACTION_MAP, T_ERROR_MAP, T_TIMEOUT
 
 
 class Session(ABC):
+    # command mode the session was returned to the pool in
+    last_command_mode: CommandMode | None = None
+
     @abstractmethod
     def connect(self, prompt: str, logger: Logger) -> None:
         pass
@@ -46,6 +53,62 @@ class Session(ABC):
     ) -> str:
         pass
 
+    def send_commands(
+        self,
+        commands: list[str],
+        expected_string: str,
+        logger: Logger,
+        action_map: T_ACTION_MAP | None = None,
+        error_map: T_ERROR_MAP | None = None,
+        **optional_args,
+    ) -> list[str]:
+        """Send commands one by one, return output of every command."""
+        optional_args.pop("window", None)
+        return [
+            self.hardware_expect(
+                command,
+                expected_string,
+                logger,
+                action_map=action_map,
+                error_map=error_map,
+                **optional_args,
+            )
+            for command in commands
+        ]
+
+    def send_burst(
+        self,
+        commands: list[str],
+        expected_string: str,
+        logger: Logger,
+        action_map: T_ACTION_MAP | None = None,
+        error_map: T_ERROR_MAP | None = None,
+        prompts_re: str | None = None,
+        **optional_args,
+    ) -> str:
+        """Send commands in one write, wait for the prompt after every command.
+
+        The output is split by the command echoes as in send_commands,
+        prompts_re has to match the prompts after all commands, by default
+        expected_string. The output of the last command has to match
+        expected_string.
+        """
+        outputs = self.send_commands(
+            commands,
+            prompts_re or expected_string,
+            logger,
+            action_map=action_map,
+            error_map=error_map,
+            window=len(commands),
+            **optional_args,
+        )
+        if not re.search(expected_string, outputs[-1], re.DOTALL):
+            raise ExpectedSessionException(
+                self.__class__.__name__,
+                f"Expected prompt {expected_string} not found after {commands[-1]}",
+            )
+        return "".join(outputs)
+
     @abstractmethod
     def probe_for_prompt(self, expected_string: str, logger: Logger) -> str:
         pass
@@ -67,3 +130,11 @@ class Session(ABC):
     @abstractmethod
     def set_active(self, state: bool) -> None:
         pass
+
+    def is_alive(self) -> bool:
+        """Check without a device round trip that the connection is not closed."""
+        return self.active()
+
+    def get_output_tail(self) -> str:
+        """End of the last received output, empty if it isn't kept."""
+        return ""
@@ -51,7 +51,14 @@ class SSHSession(ExpectSession, ConnectionParams):
 
         self._handler = None
         self._current_channel = None
-        self._buffer_size = self.BUFFER_SIZE
+
+    @property
+    def connection_key(self) -> tuple:
+        return super().connection_key + (
+            self.username,
+            self.password,
+            self.pkey_passphrase,
+        )
 
     def __eq__(self, other) -> bool:
         return (
@@ -106,11 +113,27 @@ class SSHSession(ExpectSession, ConnectionParams):
 
     def _send(self, command: str, logger: Logger) -> None:
         """Send message to device."""
-        self._current_channel.send(command)
+        self._current_channel.send(command.encode(self._encoding))
 
     def _set_timeout(self, timeout: T_TIMEOUT) -> None:
         self._current_channel.settimeout(timeout)
 
+    def _get_selectable(self) -> paramiko.Channel | None:
+        return self._current_channel
+
+    def is_alive(self) -> bool:
+        if not super().is_alive():
+            return False
+        transport = self._handler.get_transport()
+        channel = self._current_channel
+        return bool(
+            transport
+            and transport.is_active()
+            and channel
+            and not channel.closed
+            and not channel.eof_received
+        )
+
     def _read_byte_data(self) -> bytes:
         return self._current_channel.recv(self._buffer_size)
 
@@ -14,7 +14,6 @@ if TYPE_CHECKING:
 
 class TCPSession(ExpectSession, ConnectionParams):
     SESSION_TYPE = "TCP"
-    BUFFER_SIZE = 1024
 
     def __init__(
         self,
@@ -29,7 +28,6 @@ class TCPSession(ExpectSession, ConnectionParams):
         )
         ExpectSession.__init__(self, *args, **kwargs)
 
-        self._buffer_size = self.BUFFER_SIZE
         self._handler = None
 
     def _initialize_session(self, prompt: str, logger: Logger) -> None:
@@ -53,13 +51,16 @@ class TCPSession(ExpectSession, ConnectionParams):
 
     def _send(self, command: str, logger: Logger) -> None:
         """Send message to the session."""
-        self._handler.sendall(command)
+        self._handler.sendall(command.encode(self._encoding))
 
     def _set_timeout(self, timeout: T_TIMEOUT) -> None:
         self._handler.settimeout(timeout)
 
-    def _read_byte_data(self) -> None:
-        pass
+    def _get_selectable(self) -> socket.socket | None:
+        return self._handler
 
-    def _read_str_data(self) -> str:
+    def _read_byte_data(self) -> bytes:
         return self._handler.recv(self._buffer_size)
+
+    def _read_into(self, buffer: memoryview) -> int:
+        return self._handler.recv_into(buffer)
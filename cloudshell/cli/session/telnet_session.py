@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import socket
 import telnetlib
 from typing import TYPE_CHECKING
 
@@ -45,6 +46,10 @@ class TelnetSession(ExpectSession, ConnectionParams):
 
         self._handler = None
 
+    @property
+    def connection_key(self) -> tuple:
+        return super().connection_key + (self.username, self.password)
+
     def __eq__(self, other) -> bool:
         return (
             ConnectionParams.__eq__(self, other)
@@ -96,11 +101,23 @@ class TelnetSession(ExpectSession, ConnectionParams):
 
     def _send(self, command: str, logger: Logger) -> None:
         """Send message / command to device."""
-        byte_command = command.encode()
+        byte_command = command.encode(self._encoding)
         self._handler.write(byte_command)
 
     def _set_timeout(self, timeout: T_TIMEOUT) -> None:
         self._handler.get_socket().settimeout(timeout)
 
+    def _get_selectable(self) -> socket.socket | None:
+        if self._handler:
+            return self._handler.get_socket()
+
+    def is_alive(self) -> bool:
+        return super().is_alive() and not self._handler.eof
+
+    def _has_buffered_data(self) -> bool:
+        return bool(
+            self._handler.cookedq or len(self._handler.rawq) > self._handler.irawq
+        )
+
     def _read_byte_data(self) -> bytes:
         return self._handler.read_some()
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import queue
 import re
 import socket
+from collections import deque
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
+from threading import Event, RLock, Thread, current_thread
 from typing import TYPE_CHECKING
 
 from cloudshell.cli.session.connection_params import ConnectionParams
+from cloudshell.cli.session.session_exceptions import (
+    CommandExecutionException,
+    ExpectedSessionException,
+    SessionReadTimeout,
+)
 from cloudshell.cli.session.tcp_session import TCPSession
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
     from logging import Logger
 
     from cloudshell.cli.types import (
@@ -18,9 +30,19 @@ if TYPE_CHECKING:
     )
 
 
+# message ends with ";", continuation ">" or acknowledgment "<" outside of quotes,
+# quotes and escapes in quotes are tracked
+_TL1_SPECIAL_RE = re.compile(r'["\\;><]')
+_TL1_RESPONSE_RE = re.compile(r"^\s*M\s+(\S+)\s+([A-Z]+)", re.MULTILINE)
+# autonomous message header: alarm code (*C, **, *, A) and atag
+_TL1_AUTONOMOUS_RE = re.compile(r"^\s*(?:\*C|\*\*|\*|A)\s+\d+\s", re.MULTILINE)
+
+
 class TL1Session(TCPSession):
     SESSION_TYPE = "TL1"
     BUFFER_SIZE = 1024
+    """Max count of autonomous messages kept, the oldest ones are dropped"""
+    AUTONOMOUS_QUEUE_SIZE = 1000
 
     def __init__(
         self,
@@ -37,6 +59,26 @@ class TL1Session(TCPSession):
         self._password = password
         self.switch_name = "switch-name-not-initialized"
         self._tl1_counter = 0
+        self._tl1_futures: dict[str, Future] = {}
+        # futures of these ctags get the response with any status
+        self._tl1_unchecked: set[str] = set()
+        self._tl1_parts: dict[str, list[str]] = {}
+        self._tl1_buffer = ""
+        # the buffer is scanned till this offset, state of the scan
+        self._tl1_scan_pos = 0
+        self._tl1_in_quotes = False
+        self._tl1_escaped = False
+        self._tl1_lock = RLock()
+        self.autonomous_messages: queue.Queue[str] = queue.Queue(
+            self.AUTONOMOUS_QUEUE_SIZE
+        )
+        self._on_autonomous_message: Callable[[str], None] | None = None
+        self._reader: Thread | None = None
+        self._reader_stop = Event()
+
+    @property
+    def connection_key(self) -> tuple:
+        return super().connection_key + (self._username, self._password)
 
     def __eq__(self, other) -> bool:
         return (
@@ -48,6 +90,10 @@ class TL1Session(TCPSession):
     def probe_for_prompt(self, expected_string: str, logger: Logger) -> str:
         return "DUMMY_PROMPT"
 
+    def disconnect(self) -> None:
+        self.stop_reader()
+        super().disconnect()
+
     def _initialize_session(self, prompt: str, logger: Logger) -> None:
         self._handler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -92,10 +138,30 @@ class TL1Session(TCPSession):
         remove_command_from_output: bool = True,
         **optional_args,
     ) -> str:
-        self._tl1_counter += 1
-        command = command.replace("{counter}", str(self._tl1_counter))
-        command = command.replace("{name}", self.switch_name)
-        prompt = r"M\s+%d\s+([A-Z ]+)[^;]*;" % self._tl1_counter
+        if self.reader_active:
+            # the reader reads the stream, the response is matched by the ctag,
+            # so expected_string and action_map aren't used
+            future, ctag = self._submit(command, logger, check_status=False)
+            try:
+                rv = future.result(timeout or self._timeout)
+            except FutureTimeoutError:
+                with self._tl1_lock:
+                    self._tl1_futures.pop(ctag, None)
+                    self._tl1_parts.pop(ctag, None)
+                    self._tl1_unchecked.discard(ctag)
+                raise ExpectedSessionException(
+                    self.__class__.__name__, "TL1 response timeout"
+                )
+            for error_pattern, error in (error_map or {}).items():
+                if re.search(error_pattern, rv, re.DOTALL):
+                    self._raise_command_error(error)
+            status = _TL1_RESPONSE_RE.search(rv).group(2)
+            if status != "COMPLD":
+                raise Exception(f'Error: Status "{status}": {rv}')
+            return rv
+
+        command, ctag = self._prepare_command(command)
+        prompt = r"M\s+%s\s+([A-Z ]+)[^;]*;" % ctag
 
         rv = super().hardware_expect(
             command,
@@ -116,3 +182,235 @@ class TL1Session(TCPSession):
         if status != "COMPLD":
             raise Exception(f'Error: Status "{status}": {rv}')
         return rv
+
+    def _prepare_command(self, command: str) -> tuple[str, str]:
+        self._tl1_counter += 1
+        ctag = str(self._tl1_counter)
+        command = command.replace("{counter}", ctag)
+        command = command.replace("{name}", self.switch_name)
+        return command, ctag
+
+    def submit(self, command: str, logger: Logger) -> Future:
+        """Send the command without waiting for the response.
+
+        The command gets the next ctag as hardware_expect does, the future gets
+        the full response (all parts of a multi-part response) after collect.
+        Submitted commands have to be collected before hardware_expect is used.
+        """
+        return self._submit(command, logger)[0]
+
+    def _submit(
+        self, command: str, logger: Logger, check_status: bool = True
+    ) -> tuple[Future, str]:
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._tl1_lock:
+            command, ctag = self._prepare_command(command)
+            self._tl1_futures[ctag] = future
+            if not check_status:
+                self._tl1_unchecked.add(ctag)
+        logger.debug(f"Command: {command}")
+        self.send_line(command, logger)
+        return future, ctag
+
+    def collect(
+        self,
+        logger: Logger,
+        timeout: T_TIMEOUT | None = None,
+        wait_all: bool = True,
+    ) -> None:
+        """Read responses and complete futures of the submitted commands.
+
+        Responses are matched by ctag, so they can come in any order.
+        When the reader is active, only wait for the futures.
+
+        :param wait_all: wait for all submitted commands, otherwise return when
+            at least one command is completed
+        """
+        if self.reader_active:
+            with self._tl1_lock:
+                futures = list(self._tl1_futures.values())
+            done, not_done = wait(
+                futures,
+                timeout or self._timeout,
+                return_when=ALL_COMPLETED if wait_all else FIRST_COMPLETED,
+            )
+            if futures and (not_done if wait_all else not done):
+                raise ExpectedSessionException(
+                    self.__class__.__name__, "TL1 response timeout"
+                )
+            return
+
+        pending = len(self._tl1_futures)
+        while self._tl1_futures and (wait_all or len(self._tl1_futures) == pending):
+            try:
+                read_buffer = self._receive_all(timeout, logger)
+            except Exception as e:
+                self._fail_futures(e)
+                raise
+            self._feed(read_buffer, logger)
+
+    @property
+    def reader_active(self) -> bool:
+        return self._reader is not None and self._reader.is_alive()
+
+    def start_reader(
+        self,
+        logger: Logger,
+        on_autonomous_message: Callable[[str], None] | None = None,
+    ) -> None:
+        """Read the stream in a background thread.
+
+        Responses complete futures of the submitted commands, autonomous messages
+        are put to autonomous_messages and passed to on_autonomous_message that
+        is called from the reader thread.
+        """
+        if self.reader_active:
+            return
+        self._on_autonomous_message = on_autonomous_message
+        self._reader_stop.clear()
+        self._reader = Thread(
+            target=self._run_reader, args=(logger,), name="TL1Reader", daemon=True
+        )
+        self._reader.start()
+
+    def stop_reader(self) -> None:
+        self._reader_stop.set()
+        reader, self._reader = self._reader, None
+        if reader is not None and reader is not current_thread():
+            reader.join()
+
+    def _run_reader(self, logger: Logger) -> None:
+        while not self._reader_stop.is_set():
+            try:
+                if not self._wait_readable(self.READ_POLL_TIMEOUT):
+                    continue
+                read_buffer = self._receive(self.READ_POLL_TIMEOUT, logger)
+            except SessionReadTimeout:
+                continue
+            except Exception as e:
+                # the connection is closed
+                if not self._reader_stop.is_set():
+                    logger.debug(f"TL1 reader stopped: {e}")
+                self._fail_futures(e)
+                break
+            self._feed(read_buffer, logger)
+
+    def _fail_futures(self, error: Exception) -> None:
+        with self._tl1_lock:
+            for future in self._tl1_futures.values():
+                future.set_exception(error)
+            self._tl1_futures.clear()
+            self._tl1_parts.clear()
+            self._tl1_unchecked.clear()
+            self._tl1_buffer = ""
+            self._tl1_scan_pos = 0
+            self._tl1_in_quotes = False
+            self._tl1_escaped = False
+
+    def _feed(self, read_buffer: str, logger: Logger) -> None:
+        read_buffer = self._normalizer.normalize(read_buffer)
+        logger.debug(read_buffer)
+        with self._tl1_lock:
+            self._tl1_buffer += read_buffer
+            self._dispatch_messages(logger)
+
+    def _put_autonomous_message(self, message: str, logger: Logger) -> None:
+        while True:
+            try:
+                self.autonomous_messages.put_nowait(message)
+                break
+            except queue.Full:
+                try:
+                    self.autonomous_messages.get_nowait()
+                except queue.Empty:
+                    pass
+        if self._on_autonomous_message is not None:
+            try:
+                self._on_autonomous_message(message)
+            except Exception:
+                logger.exception("Autonomous message callback failed:")
+
+    def _split_messages(self) -> list[str]:
+        """Cut completed messages from the buffer.
+
+        Scanning resumes where the previous call stopped, so every character
+        is scanned once even if the message is received by many chunks.
+        """
+        buffer = self._tl1_buffer
+        pos = self._tl1_scan_pos
+        start = 0
+        messages = []
+        while pos < len(buffer):
+            if self._tl1_escaped:
+                self._tl1_escaped = False
+                pos += 1
+                continue
+            match = _TL1_SPECIAL_RE.search(buffer, pos)
+            if not match:
+                pos = len(buffer)
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._tl1_in_quotes = not self._tl1_in_quotes
+            elif char == "\\":
+                self._tl1_escaped = self._tl1_in_quotes
+            elif not self._tl1_in_quotes:
+                messages.append(buffer[start:pos])
+                start = pos
+        self._tl1_buffer = buffer[start:]
+        self._tl1_scan_pos = pos - start
+        return messages
+
+    def _dispatch_messages(self, logger: Logger) -> None:
+        for message in self._split_messages():
+            response = _TL1_RESPONSE_RE.search(message)
+            if not response:
+                if _TL1_AUTONOMOUS_RE.search(message):
+                    self._put_autonomous_message(message, logger)
+                # acknowledgment or command echo
+                continue
+            ctag, status = response.groups()
+            if ctag not in self._tl1_futures:
+                logger.debug(f"Response with unknown ctag {ctag}")
+                continue
+            parts = self._tl1_parts.setdefault(ctag, [])
+            parts.append(message)
+            if message.endswith(";"):
+                output = "".join(parts)
+                del self._tl1_parts[ctag]
+                future = self._tl1_futures.pop(ctag)
+                if status == "COMPLD" or ctag in self._tl1_unchecked:
+                    self._tl1_unchecked.discard(ctag)
+                    future.set_result(output)
+                else:
+                    future.set_exception(
+                        CommandExecutionException(f'Error: Status "{status}": {output}')
+                    )
+
+    def send_commands(
+        self,
+        commands: list[str],
+        expected_string: str | None,
+        logger: Logger,
+        *args,
+        timeout: T_TIMEOUT | None = None,
+        window: int = TCPSession.PIPELINE_WINDOW,
+        **kwargs,
+    ) -> list[str]:
+        """Send commands with up to window ctags in flight.
+
+        expected_string isn't used, responses are matched by ctag.
+        Raise the error of the first failed command after all sent commands
+        are completed.
+        """
+        pending = deque(commands)
+        futures = []
+        while pending or self._tl1_futures:
+            if any(future.done() and future.exception() for future in futures):
+                pending.clear()
+            while pending and len(self._tl1_futures) < max(window, 1):
+                futures.append(self.submit(pending.popleft(), logger))
+            self.collect(logger, timeout, wait_all=False)
+        return [future.result() for future in futures]
@@ -67,3 +67,15 @@ class TestConnectionParams(TestCase):
                 )
             )
         )
+
+    def test_connection_key(self):
+        instance = ConnectionParamsTestImpl(self._hostname, port=self._port)
+        self.assertEqual(
+            instance.connection_key,
+            ConnectionParamsTestImpl(self._hostname, port=self._port).connection_key,
+        )
+        self.assertNotEqual(
+            instance.connection_key,
+            ConnectionParamsTestImpl(self._hostname, port=23).connection_key,
+        )
+        hash(instance.connection_key)
@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+import pytest
+
+from cloudshell.cli.session.helper.expect_program import (
+    ExpectProgram,
+    compile_alternation,
+)
+from cloudshell.cli.session.helper.incremental_matcher import IncrementalMatcher
+
+
+def _program(prompt="#$", action_keys=(), error_keys=(), window=100):
+    return ExpectProgram(prompt, action_keys, error_keys, IncrementalMatcher(window))
+
+
+def test_compile_alternation():
+    pattern = compile_alternation(("a", "b"))
+    assert pattern.pattern == "(?P<_0>a)|(?P<_1>b)"
+    assert pattern.search("xb").lastgroup == "_1"
+
+
+def test_compile_alternation_not_combinable():
+    assert compile_alternation((r"(a)\1", "b")) is None
+    assert compile_alternation(("(?i)a", "b")) is None
+    assert compile_alternation(("(?P<x>a)", "(?P<x>b)")) is None
+
+
+@pytest.mark.parametrize("error_key", ["Invalid", r"Error:.*failed"])
+def test_scan_searches_once(error_key):
+    program = _program(
+        prompt=r"(?:(?!\)).)#\s*$",
+        action_keys=(r"\[yes/no\]", r"\[confirm\]"),
+        error_keys=(error_key, r"% Incomplete"),
+    )
+    with patch.object(
+        IncrementalMatcher, "search", autospec=True, return_value=None
+    ) as search:
+        assert program.scan("some output\n") == (False, None)
+    search.assert_called_once()
+
+
+def test_scan_nothing_matched():
+    program = _program(action_keys=("yes/no",), error_keys=("Invalid",))
+    assert program.scan("some output") == (False, None)
+    assert program.found_errors == []
+
+
+def test_scan_prompt():
+    program = _program(action_keys=("yes/no",))
+    assert program.scan("some output\nrouter#") == (True, None)
+
+
+def test_scan_from_start():
+    program = _program(action_keys=("yes/no",))
+    assert program.scan("yes/no", start=6) == (False, None)
+    assert program.scan("yes/no yes/no", start=6) == (False, "yes/no")
+
+
+def test_scan_action_priority():
+    # the first key in the action map wins, not the leftmost match
+    program = _program(action_keys=("second", "first"))
+    assert program.scan("first second") == (False, "second")
+
+
+def test_scan_errors_priority():
+    program = _program(error_keys=("Error", "Invalid"))
+    program.scan("Invalid input")
+    assert program.scan("Invalid input\nError\nrouter#") == (True, None)
+    assert program.found_errors == ["Error", "Invalid"]
+
+
+def test_reset_keep_errors():
+    program = _program(error_keys=("Invalid",))
+    program.scan("Invalid")
+    program.reset()
+    assert program.found_errors == ["Invalid"]
+
+
+def test_reset_forget_errors():
+    program = _program(error_keys=("Invalid",))
+    program.scan("Invalid")
+    program.reset(keep_errors=False)
+    assert program.found_errors == []
+    program.scan("router#")
+    assert program.found_errors == []
+
+
+def test_change_action_keys():
+    program = _program(action_keys=("a", ".*"))
+    assert program.scan("x") == (False, ".*")
+    program.action_keys = ("a",)
+    assert program.scan("x") == (False, None)
+
+
+def test_scan_full_context_pattern():
+    program = _program(prompt="^router#", window=1)
+    assert program.scan("rout") == (False, None)
+    assert program.scan("router#") == (True, None)
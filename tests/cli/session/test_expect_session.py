@@ -42,7 +42,7 @@ class ExpectSessionImpl(ExpectSession):
     "cloudshell.cli.session.expect_session.ActionLoopDetector.loops_detected",
     return_value=False,
 )
-@patch("cloudshell.cli.session.expect_session.normalize_buffer")
+@patch("cloudshell.cli.session.expect_session.BufferNormalizer.normalize")
 class TestExpectSession(TestCase):
     def setUp(self):
         self._logger = Mock()
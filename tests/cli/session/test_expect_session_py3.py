@@ -1,3 +1,16 @@
+import socket
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from cloudshell.cli.session.expect_session import ExpectSession
+from cloudshell.cli.session.session_exceptions import (
+    CommandExecutionException,
+    ExpectedSessionException,
+)
+
 from tests.cli.session.test_expect_session import ExpectSessionImpl  # noqa
 
 
@@ -10,4 +23,411 @@ def test_expect_session_read_wrong_utf8_symbol(logger):
 
     session = TestSession()
 
-    assert session._receive(1, logger) == "’hi’"
+    assert session._receive(1, logger) == "’hi"
+    assert session._receive(1, logger) == "’"
+
+
+def test_expect_session_read_encoding(logger):
+    class TestSession(ExpectSessionImpl):
+        data = [b"caf\xe9 \xff", b"\x80"]
+
+        def _read_byte_data(self):
+            return self.data.pop(0)
+
+    session = TestSession(encoding="latin-1")
+
+    assert session._receive(1, logger) == "café ÿ"
+    assert session._receive(1, logger) == "\x80"
+
+
+class SocketSession(ExpectSessionImpl):
+    def __init__(self, sock, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sock = sock
+
+    def _get_selectable(self):
+        return self.sock
+
+    def _set_timeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def _read_byte_data(self):
+        return self.sock.recv(1024)
+
+
+def test_receive_all_returns_available_data(logger):
+    local, remote = socket.socketpair()
+    session = SocketSession(local)
+    remote.sendall(b"data")
+    start = time.time()
+
+    assert session._receive_all(5, logger) == "data"
+    assert time.time() - start < session.READ_POLL_TIMEOUT
+
+
+def test_receive_all_waits_for_data(logger):
+    local, remote = socket.socketpair()
+    session = SocketSession(local)
+    threading.Timer(0.2, remote.sendall, args=(b"data",)).start()
+
+    assert session._receive_all(5, logger) == "data"
+
+
+def test_receive_all_timeout(logger):
+    local, remote = socket.socketpair()
+    session = SocketSession(local)
+
+    with pytest.raises(ExpectedSessionException):
+        session._receive_all(0.2, logger)
+
+
+def test_receive_sets_timeout_once(logger):
+    local, remote = socket.socketpair()
+    session = SocketSession(local)
+    session._set_timeout = Mock()
+    remote.sendall(b"data")
+    session._receive(1, logger)
+    remote.sendall(b"data")
+    session._receive(1, logger)
+
+    session._set_timeout.assert_called_once_with(1)
+
+
+def test_nonblocking_clear_buffer(logger):
+    local, remote = socket.socketpair()
+    session = SocketSession(local, nonblocking_clear_buffer=True)
+    remote.sendall(b"data")
+    start = time.time()
+
+    assert session._clear_buffer(1, logger) == "data"
+    assert time.time() - start < 1
+    assert session.clear_buffer_stats.calls == 1
+    assert session.clear_buffer_stats.time_saved > 0
+
+
+def test_hardware_expect_trust_prompt_is_last(logger):
+    local, remote = socket.socketpair()
+    session = SocketSession(
+        local, nonblocking_clear_buffer=True, trust_prompt_is_last=True
+    )
+    session._send = Mock(side_effect=lambda *_: remote.sendall(b"out\nprompt#"))
+    session._clear_buffer = Mock(wraps=session._clear_buffer)
+
+    assert session.hardware_expect("cmd", "#", logger) == "out\nprompt#"
+    session._clear_buffer.assert_called_once()
+    assert session.clear_buffer_stats.skipped == 1
+
+
+def test_is_alive():
+    local, remote = socket.socketpair()
+    session = SocketSession(local)
+    assert not session.is_alive()
+    session.set_active(True)
+    assert session.is_alive()
+    remote.close()
+    assert not session.is_alive()
+
+
+class PipelineSession(ExpectSessionImpl):
+    """Device that executes commands line by line."""
+
+    def __init__(self, responses, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.responses = responses
+        self.writes = []
+        self.out = ""
+        self.confirm = False
+
+    def _send(self, command, logger):
+        self.writes.append(command)
+        for line in command.split(self._new_line)[:-1]:
+            if self.confirm:
+                self.confirm = False
+                self.out += f"{line}\r\nDeleted\r\nrouter#"
+                continue
+            self.out += f"{line}\r\n{self.responses[line]}"
+            if self.responses[line].endswith("[confirm]"):
+                self.confirm = True
+            else:
+                self.out += "\r\nrouter#"
+
+    def _clear_buffer(self, timeout, logger):
+        return ""
+
+    def _receive_all(self, timeout, logger):
+        out, self.out = self.out, ""
+        return out
+
+
+def test_send_commands(logger):
+    session = PipelineSession({"show a": "out a", "show b": "out b", "show c": ""})
+
+    outputs = session.send_commands(["show a", "show b", "show c"], "#$", logger)
+
+    assert outputs == ["out a\nrouter#", "out b\nrouter#", "router#"]
+    assert session.writes == ["show a\rshow b\rshow c\r"]
+
+
+def test_send_commands_window(logger):
+    session = PipelineSession({"show a": "out a", "show b": "out b", "show c": ""})
+
+    outputs = session.send_commands(
+        ["show a", "show b", "show c"], "#$", logger, window=2
+    )
+
+    assert len(outputs) == 3
+    assert session.writes == ["show a\rshow b\r", "show c\r"]
+
+
+def test_send_commands_output_contains_next_command(logger):
+    session = PipelineSession({"show a": "show b", "show b": "out b"})
+
+    outputs = session.send_commands(["show a", "show b"], "#$", logger)
+
+    assert outputs == ["show b\nrouter#", "out b\nrouter#"]
+
+
+def test_send_commands_error(logger):
+    session = PipelineSession(
+        {"show a": "Invalid input", "show b": "out b", "show c": ""}
+    )
+
+    with pytest.raises(CommandExecutionException, match="Invalid"):
+        session.send_commands(
+            ["show a", "show b", "show c"],
+            "#$",
+            logger,
+            error_map={"Invalid": "Invalid input"},
+            window=2,
+        )
+
+    # the sent commands are completed, the rest are not sent
+    assert session.writes == ["show a\rshow b\r"]
+    assert session.out == ""
+
+
+def test_send_commands_action(logger):
+    session = PipelineSession({"show a": "out a", "delete": "Delete? [confirm]"})
+    action_map = {r"\[confirm\]": lambda s, _: s.send_line("y", logger)}
+
+    outputs = session.send_commands(
+        ["show a", "delete"], "#$", logger, action_map=action_map
+    )
+
+    assert outputs == [
+        "out a\nrouter#",
+        "Delete? [confirm]y\nDeleted\nrouter#",
+    ]
+
+
+def test_send_burst(logger):
+    session = PipelineSession({"configure": "", "interface 1": ""})
+
+    output = session.send_burst(["configure", "interface 1"], "#$", logger)
+
+    assert session.writes == ["configure\rinterface 1\r"]
+    assert output.endswith("router#")
+
+
+class ModeSession(PipelineSession):
+    """Device that sends the output of one command per read."""
+
+    def __init__(self, responses, *args, **kwargs):
+        super().__init__(responses, *args, **kwargs)
+        self.chunks = []
+
+    def _send(self, command, logger):
+        self.writes.append(command)
+        for line in command.split(self._new_line)[:-1]:
+            self.chunks.append(f"{line}\r\n{self.responses[line]}")
+
+    def _receive_all(self, timeout, logger):
+        return self.chunks.pop(0) if self.chunks else ""
+
+
+def test_send_burst_waits_prompt_after_every_command(logger):
+    session = ModeSession(
+        {"configure": "router(config)#", "interface 1": "router(config-if)#"}
+    )
+
+    output = session.send_burst(
+        ["configure", "interface 1"],
+        r"\(config.*\)#\s*$",
+        logger,
+        prompts_re=r"router#\s*$|\(config.*\)#\s*$",
+    )
+
+    assert output.endswith("router(config-if)#")
+    assert session.chunks == []
+
+
+def test_send_burst_last_prompt_not_found(logger):
+    session = ModeSession(
+        {"configure": "router(config)#", "interface 1": "router(config)#"}
+    )
+
+    with pytest.raises(ExpectedSessionException, match="not found"):
+        session.send_burst(
+            ["configure", "interface 1"],
+            r"\(config-if\)#\s*$",
+            logger,
+            prompts_re=r"router#\s*$|\(config.*\)#\s*$",
+        )
+
+
+class StreamSession(ExpectSessionImpl):
+    def __init__(self, data, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.data = list(data)
+        self.sent = []
+
+    def _send(self, command, logger):
+        self.sent.append(command)
+
+    def _clear_buffer(self, timeout, logger):
+        return ""
+
+    def _receive_all(self, timeout, logger):
+        return self.data.pop(0) if self.data else ""
+
+
+def test_hardware_expect_tl1_response_longer_than_match_window(logger):
+    lines = ['   "SLOT-1:CARD,ACT"\r\n'] * 250
+    session = StreamSession(["\r\nM  1 COMPLD\r\n", *lines, ";"])
+
+    output = session.hardware_expect(
+        "RTRV-EQPT:::1;", r"M\s+1\s+([A-Z ]+)[^;]*;", logger
+    )
+
+    assert len(output) > session.MATCH_WINDOW
+    assert output.endswith(";")
+
+
+def test_send_commands_prompt_split_by_chunks(logger):
+    session = StreamSession(["show a\r\nout", " a\r\nrou", "ter#"])
+
+    outputs = session.send_commands(["show a"], "router#", logger)
+
+    assert outputs == ["out a\nrouter#"]
+
+
+def test_hardware_expect_prompt_after_long_output(logger):
+    lines = ["interface GigabitEthernet0/1\r\n"] * 500
+    session = StreamSession(["show run\r\n", *lines, "router# "])
+
+    output = session.hardware_expect("show run", r"#\s*$", logger)
+
+    assert len(output) > session.MATCH_WINDOW
+    assert output.startswith("interface")
+    assert output.endswith("router# ")
+
+
+def test_stream_expect(logger):
+    session = StreamSession(["show tech\n", "a" * 50, "b" * 50, "\nrouter#"])
+
+    stream = session.stream_expect("show tech", "#$", logger, tail_window=20)
+    chunks = list(stream)
+
+    assert "".join(chunks) == "a" * 50 + "b" * 50 + "\nrouter#"
+    assert max(map(len, chunks)) <= 70
+
+
+def test_stream_expect_without_echo(logger):
+    session = StreamSession(["done\n", "router#"])
+
+    stream = session.stream_expect("copy running", "#$", logger, retries=3)
+
+    assert "".join(stream) == "done\nrouter#"
+
+
+def test_stream_expect_reads_on_demand(logger):
+    session = StreamSession(["a" * 50, "b" * 50, "router#"])
+
+    stream = session.stream_expect(None, "#$", logger, tail_window=10)
+
+    assert next(stream) == "a" * 40
+    assert session.data == ["b" * 50, "router#"]
+
+
+def test_stream_expect_action(logger):
+    session = StreamSession(["[confirm]", "done\nrouter#"])
+    action_map = {r"\[confirm\]": lambda s, _: s.send_line("y", logger)}
+
+    chunks = list(session.stream_expect(None, "#$", logger, action_map=action_map))
+
+    assert chunks == ["[confirm]", "done\nrouter#"]
+    assert session.sent == ["y\r"]
+
+
+def test_stream_expect_error_after_output(logger):
+    session = StreamSession(["Invalid input" + "x" * 50, "\nrouter#"])
+    stream = session.stream_expect(
+        None, "#$", logger, error_map={"Invalid": "error"}, tail_window=10
+    )
+
+    assert next(stream).startswith("Invalid input")
+    assert next(stream).endswith("router#")
+    with pytest.raises(CommandExecutionException):
+        next(stream)
+
+
+def test_output_tail(logger):
+    local, remote = socket.socketpair()
+    session = SocketSession(local)
+    session.OUTPUT_TAIL_SIZE = 16
+    remote.sendall(b"output\r\n")
+    session._receive(1, logger)
+    remote.sendall(b"\x1b[1mswitch#")
+    session._receive(1, logger)
+
+    assert session.get_output_tail() == "put\nswitch#"
+
+
+def test_connect_resets_last_command_mode(logger):
+    session = ExpectSessionImpl()
+    session.last_command_mode = Mock()
+
+    ExpectSession.connect(session, "#", logger)
+
+    assert session.last_command_mode is None
+
+
+class ReadIntoSession(SocketSession):
+    BUFFER_SIZE = 16
+    MAX_BUFFER_SIZE = 64
+    BUFFER_SHRINK_READS = 2
+
+    def _read_into(self, buffer):
+        return self.sock.recv_into(buffer)
+
+
+def test_read_into_adapts_buffer_size(logger):
+    local, remote = socket.socketpair()
+    session = ReadIntoSession(local)
+    data = "".join(chr(ord("a") + i % 26) for i in range(200))
+    remote.sendall(data.encode())
+
+    output = ""
+    while len(output) < len(data):
+        output += session._receive(1, logger)
+    assert output == data
+    assert session._buffer_size == 64
+
+    for _ in range(4):
+        remote.sendall(b"#")
+        assert session._receive(1, logger) == "#"
+    assert session._buffer_size == 16
+
+
+def test_read_into_is_used_if_overridden():
+    assert ReadIntoSession(Mock())._use_read_into
+    assert not SocketSession(Mock())._use_read_into
+
+
+def test_read_into_keeps_split_character(logger):
+    local, remote = socket.socketpair()
+    session = ReadIntoSession(local)
+    remote.sendall(("a" * 15 + "’").encode())
+
+    assert session._receive(1, logger) == "a" * 15
+    assert session._receive(1, logger) == "’"
@@ -0,0 +1,114 @@
+import re
+
+import pytest
+
+from cloudshell.cli.session.helper.incremental_matcher import IncrementalMatcher
+
+
+def test_search_finds_pattern_in_new_data():
+    matcher = IncrementalMatcher(window=10)
+    buffer = "x" * 100
+    assert matcher.search("#$", buffer) is None
+    buffer += "router#"
+    assert matcher.search("#$", buffer)
+
+
+def test_search_finds_match_started_in_old_data():
+    matcher = IncrementalMatcher(window=10)
+    buffer = "x" * 100 + "[conf"
+    assert matcher.search(r"\[confirm\]", buffer) is None
+    buffer += "irm]"
+    assert matcher.search(r"\[confirm\]", buffer)
+
+
+def test_search_skips_scanned_data():
+    matcher = IncrementalMatcher(window=5)
+    assert matcher.search("ab", "x" * 10) is None
+    # data out of the window is not scanned again
+    assert matcher.search("ab", "ab" + "x" * 10) is None
+    assert matcher.search("ab", "x" * 10 + "ab")
+
+
+@pytest.mark.parametrize("pattern", [r"^abc", r"\Aabc", r"(^abc)", r"(?s)^abc"])
+def test_anchored_pattern_uses_full_context(pattern):
+    matcher = IncrementalMatcher(window=1)
+    assert matcher.get_window(pattern) is None
+    buffer = "ab"
+    assert matcher.search(pattern, buffer) is None
+    assert matcher.search(pattern, buffer + "c")
+
+
+@pytest.mark.parametrize(
+    "pattern", [r"a.*b", r"a[^;]+;", r"a{2,}", r"(?:ab)*c", r"\[confirm\]"]
+)
+def test_unbounded_or_long_pattern_uses_full_context(pattern):
+    matcher = IncrementalMatcher(window=8)
+    assert matcher.get_window(pattern) is None
+
+
+def test_bounded_pattern_uses_window():
+    matcher = IncrementalMatcher(window=8)
+    assert matcher.get_window(r"[>#]\s?$") == 8
+
+
+@pytest.mark.parametrize(
+    "pattern", [r"#\s*$", r"(?:(?!\)).)#\s*$", r"\(config.*\)#\s*$", r"a$|b\Z"]
+)
+def test_tail_pattern_uses_window(pattern):
+    matcher = IncrementalMatcher(window=8)
+    assert matcher.get_window(pattern) == 8
+
+
+@pytest.mark.parametrize(
+    "pattern, flags",
+    [(r"a\s*$|b+", re.DOTALL), (r"(?m)#\s*$", 0), (r"#\s*$", re.MULTILINE)],
+)
+def test_not_tail_pattern_uses_full_context(pattern, flags):
+    matcher = IncrementalMatcher(window=8)
+    assert matcher.get_window(pattern, flags) is None
+
+
+def test_tail_pattern_searches_last_window():
+    matcher = IncrementalMatcher(window=8)
+    buffer = "router#" + "\n" * 100
+    assert matcher.search(r"#\s*$", buffer) is None
+    buffer = "x" * 100 + "router# "
+    assert matcher.search(r"#\s*$", buffer).start() == len(buffer) - 2
+
+
+def test_tl1_response_longer_than_window():
+    pattern = r"M\s+1\s+([A-Z ]+)[^;]*;"
+    matcher = IncrementalMatcher()
+    buffer = "\r\nM  1 COMPLD\r\n"
+    for _ in range(250):
+        buffer += '   "SLOT-1:CARD,ACT"\r\n'
+        assert matcher.search(pattern, buffer) is None
+    assert len(buffer) > IncrementalMatcher.MATCH_WINDOW
+    assert matcher.search(pattern, buffer + ";")
+
+
+def test_pattern_window():
+    matcher = IncrementalMatcher(window=1, pattern_windows={"a.*b": None})
+    buffer = "a" + "x" * 10
+    assert matcher.search("a.*b", buffer) is None
+    assert matcher.search("a.*b", buffer + "b")
+
+
+def test_search_keeps_positions_per_flags():
+    matcher = IncrementalMatcher(window=1)
+    buffer = "abc\ndef"
+    assert matcher.search("^def", buffer, re.MULTILINE)
+    assert matcher.search("abc", buffer)
+
+
+def test_search_start():
+    matcher = IncrementalMatcher()
+    assert matcher.search("abc", "abcabc", start=1).start() == 3
+
+
+def test_reset():
+    matcher = IncrementalMatcher(window=3)
+    assert matcher.search("abc", "xxxxx") is None
+    assert matcher.search("abc", "abcxxxxx") is None
+    matcher.reset()
+    assert matcher.search("abc", "abcxxxxx")
@@ -0,0 +1,51 @@
+import pytest
+
+from cloudshell.cli.session.helper.normalize_buffer import (
+    BufferNormalizer,
+    normalize_buffer,
+)
+
+
+@pytest.mark.parametrize(
+    ("data", "expected"),
+    (
+        ("line\r\nline\r\n", "line\nline\n"),
+        ("\x1b[0;32mgreen\x1b[0m text\x1b[1m", "green text"),
+        ("tab\tand\rcr\x00\x08\x7f\x9f", "tab\tand\rcr"),
+        ("non-ascii\xa0ü тест", "non-ascii\xa0ü тест"),
+        ("end\r\x1b[0m\n", "end\n"),
+        ("[12;34mno esc\x1b", "no esc"),
+        ("[1;2;3m", "[1;2;3m"),
+    ),
+)
+def test_normalize_buffer(data, expected):
+    assert normalize_buffer(data) == expected
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    (
+        ["line\r", "\nnext"],
+        ["line\r\x1b[0", "m\nnext"],
+        ["\x1b", "[0;32mline\r\nnext"],
+        ["\x1b[0;", "32mline\r", "\x1b", "[0m\nnext"],
+    ),
+)
+def test_buffer_normalizer_split_sequences(chunks):
+    normalizer = BufferNormalizer()
+    output = "".join(map(normalizer.normalize, chunks)) + normalizer.flush()
+    assert output == "line\nnext"
+
+
+def test_buffer_normalizer_flush():
+    normalizer = BufferNormalizer()
+    assert normalizer.normalize("prompt#\r") == "prompt#"
+    assert normalizer.flush() == "\r"
+    assert normalizer.normalize("\n") == "\n"
+
+
+def test_buffer_normalizer_reset():
+    normalizer = BufferNormalizer()
+    normalizer.normalize("old\x1b[1")
+    normalizer.reset()
+    assert normalizer.normalize("m") == "m"
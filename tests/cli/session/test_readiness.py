@@ -0,0 +1,39 @@
+import socket
+
+from cloudshell.cli.session.helper.readiness import ReadinessWaiter, is_socket_alive
+
+
+def test_wait_readable():
+    local, remote = socket.socketpair()
+    waiter = ReadinessWaiter()
+    assert not waiter.wait(local, 0)
+    remote.sendall(b"data")
+    assert waiter.wait(local, 1)
+
+
+def test_wait_new_object():
+    first, _ = socket.socketpair()
+    second, remote = socket.socketpair()
+    waiter = ReadinessWaiter()
+    assert not waiter.wait(first, 0)
+    remote.sendall(b"data")
+    assert waiter.wait(second, 1)
+
+
+def test_wait_closed_socket():
+    local, _ = socket.socketpair()
+    local.close()
+    assert ReadinessWaiter().wait(local, 1)
+
+
+def test_is_socket_alive():
+    local, remote = socket.socketpair()
+    assert is_socket_alive(local)
+    remote.sendall(b"data")
+    assert is_socket_alive(local)
+    # pending data is not read
+    assert local.recv(4) == b"data"
+    remote.close()
+    assert not is_socket_alive(local)
+    local.close()
+    assert not is_socket_alive(local)
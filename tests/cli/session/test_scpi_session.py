@@ -0,0 +1,132 @@
+import socket
+import threading
+
+import pytest
+
+from cloudshell.cli.session.scpi_session import SCPISession
+from cloudshell.cli.session.session_exceptions import ExpectedSessionException
+
+
+@pytest.fixture
+def instrument():
+    local, remote = socket.socketpair()
+    session = SCPISession("host", 5025)
+    session._handler = local
+    requests = []
+
+    def respond(*replies):
+        def run():
+            for reply in replies:
+                requests.append(remote.recv(4096).decode())
+                remote.sendall(reply if isinstance(reply, bytes) else reply.encode())
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return requests
+
+    yield session, respond
+    local.close()
+    remote.close()
+
+
+def test_hardware_expect(instrument, logger):
+    session, respond = instrument
+    requests = respond('+1.0E+00;0,"No error"\n')
+
+    output = session.hardware_expect("MEAS:VOLT?", None, logger)
+
+    assert output.startswith("+1.0E+00;")
+    assert requests == ["MEAS:VOLT?;:system:error?\r"]
+
+
+def test_hardware_expect_error(instrument, logger):
+    session, respond = instrument
+    respond('-113,"Undefined header"\n', '0,"No error"\n')
+
+    with pytest.raises(Exception, match="SCPI error: -113: Undefined header"):
+        session.hardware_expect("FOO", None, logger)
+
+
+def test_send_batch(instrument, logger):
+    session, respond = instrument
+    requests = respond('"KEYSIGHT,34461A";+1.0E+00;0,"No error"\n')
+
+    results = session.send_batch(["*IDN?", "CONF:VOLT", "READ?"], logger)
+
+    assert results == ['"KEYSIGHT,34461A"', None, "+1.0E+00"]
+    assert requests == ["*IDN?;:CONF:VOLT;:READ?;:system:error?\r"]
+
+
+def test_send_batch_checkpoint(instrument, logger):
+    session, respond = instrument
+    requests = respond('0,"No error"\n', '1;0,"No error"\n')
+
+    results = session.send_batch(["CONF:VOLT", ":INIT", "*OPC?"], logger, 2)
+
+    assert results == [None, None, "1"]
+    assert requests == [
+        ":CONF:VOLT;:INIT;:system:error?\r",
+        "*OPC?;:system:error?\r",
+    ]
+
+
+def test_send_batch_error(instrument, logger):
+    session, respond = instrument
+    respond('-222,"Data out of range"\n', '0,"No error"\n')
+
+    with pytest.raises(Exception, match="-222"):
+        session.send_batch(["VOLT 1000", "READ?"], logger)
+
+
+def test_send_batch_reads_all_errors(instrument, logger):
+    session, respond = instrument
+    requests = respond(
+        '-222,"Data out of range"\n',
+        '-113,"Undefined header"\n',
+        '0,"No error"\n',
+        '+1.0E+00;0,"No error"\n',
+    )
+
+    with pytest.raises(
+        Exception, match="-222: Data out of range; -113: Undefined header"
+    ):
+        session.send_batch(["VOLT 1000", "FOO"], logger)
+    assert session.send_batch(["READ?"], logger) == ["+1.0E+00"]
+    assert requests[1:3] == [":system:error?\r"] * 2
+
+
+def test_read_binary_block(instrument, logger):
+    session, respond = instrument
+    payload = bytes(range(256)) * 4
+    requests = respond(b"#41024" + payload + b"\n")
+
+    assert session.read_binary_block("CURV?", logger) == payload
+    assert requests == ["CURV?\r"]
+
+
+def test_read_binary_block_to_buffer(instrument, logger):
+    session, respond = instrument
+    respond(b"#15;\n\n#\xff\n")
+    out = bytearray(10)
+
+    assert session.read_binary_block("CURV?", logger, out) == 5
+    assert out[:5] == b";\n\n#\xff"
+
+
+def test_read_binary_block_to_file(instrument, logger, tmp_path):
+    session, respond = instrument
+    session.BINARY_CHUNK_SIZE = 3
+    respond(b"#210abcdefghij\n", b'0,"No error"\n')
+
+    with open(tmp_path / "data", "wb") as f:
+        assert session.read_binary_block("CURV?", logger, f, check_error=True) == 10
+
+    assert (tmp_path / "data").read_bytes() == b"abcdefghij"
+
+
+def test_read_binary_block_indefinite_length(instrument, logger):
+    session, respond = instrument
+    respond(b"#0abc\n")
+
+    with pytest.raises(ExpectedSessionException):
+        session.read_binary_block("CURV?", logger)
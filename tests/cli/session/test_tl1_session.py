@@ -0,0 +1,237 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from cloudshell.cli.session.session_exceptions import (
+    CommandExecutionException,
+    ExpectedSessionException,
+)
+from cloudshell.cli.session.tl1_session import TL1Session
+
+
+@pytest.fixture
+def sockets():
+    local, remote = socket.socketpair()
+    yield local, remote
+    local.close()
+    remote.close()
+
+
+@pytest.fixture
+def session(sockets):
+    session = TL1Session("host", "user", "password", 3083)
+    session._handler = sockets[0]
+    session.switch_name = "NODE"
+    return session
+
+
+def _response(ctag, status="COMPLD", data="", end=";"):
+    return f"\r\n\n   NODE 24-01-01 00:00:00\r\nM  {ctag} {status}\r\n{data}{end}"
+
+
+def test_submit_sends_command_with_ctag(session, sockets, logger):
+    session.submit("RTRV-HDR:{name}::{counter};", logger)
+    session.submit("RTRV-HDR:{name}::{counter};", logger)
+
+    assert sockets[1].recv(1024) == b"RTRV-HDR:NODE::1;\rRTRV-HDR:NODE::2;\r"
+
+
+def test_collect_out_of_order(session, sockets, logger):
+    first = session.submit("RTRV-EQPT::ALL:{counter};", logger)
+    second = session.submit("RTRV-EQPT::ALL:{counter};", logger)
+    sockets[1].sendall(
+        (_response(2, data='   "SLOT-2"\r\n') + _response(1) + "\r\n<").encode()
+    )
+
+    session.collect(logger, timeout=1)
+
+    assert '"SLOT-2"' in second.result()
+    assert "M  1 COMPLD" in first.result()
+    assert session._tl1_buffer == ""
+
+
+def test_collect_multipart_response(session, sockets, logger):
+    future = session.submit("RTRV-EQPT::ALL:{counter};", logger)
+    sockets[1].sendall(
+        (
+            "IP 1\r\n<"
+            + _response(1, data='   "SLOT-1"\r\n', end=">")
+            + '\r\n\n   A  5 REPT ALM EQPT\r\n   "SLOT-3:CR"\r\n;'
+            + _response(1, data='   "SLOT;2"\r\n')
+        ).encode()
+    )
+
+    session.collect(logger, timeout=1)
+
+    output = future.result()
+    assert '"SLOT-1"' in output
+    assert '"SLOT;2"' in output
+    assert "REPT ALM" not in output
+
+
+def test_collect_partial_message(session, sockets, logger):
+    future = session.submit("RTRV-HDR:::{counter};", logger)
+    message = _response(1)
+    sockets[1].sendall(message[:-5].encode())
+    with pytest.raises(ExpectedSessionException):
+        session.collect(logger, timeout=0.2)
+    # waiting commands are failed with the read error
+    assert isinstance(future.exception(), ExpectedSessionException)
+    assert session._tl1_futures == {}
+
+
+def test_feed_chunk_split_in_quoted_field(session, logger):
+    future = session.submit("RTRV-EQPT::ALL:{counter};", logger)
+    message = _response(1, data='   "AID-1:DESC=a;b\\"c>"\r\n')
+    split = message.index(";b")
+
+    session._feed(message[:split], logger)
+    session._feed(message[split : split + 4], logger)
+    assert not future.done()
+    session._feed(message[split + 4 :], logger)
+
+    assert future.result(timeout=1) == message.replace("\r\n", "\n")
+
+
+def test_feed_large_response_by_chunks(session, logger):
+    future = session.submit("RTRV-EQPT::ALL:{counter};", logger)
+    data = '   "SLOT-1:DESC=a;b"\r\n' * 1000
+    message = _response(1, data=data)
+    assert len(message) > 10 * 1024
+
+    start = time.time()
+    for pos in range(0, len(message), 512):
+        session._feed(message[pos : pos + 512], logger)
+
+    assert time.time() - start < 1
+    assert future.result(timeout=1) == message.replace("\r\n", "\n")
+
+
+def test_collect_error_status(session, sockets, logger):
+    future = session.submit("ENT-EQPT::SLOT-1:{counter};", logger)
+    sockets[1].sendall(_response(1, status="DENY", data="   IIAC\r\n").encode())
+
+    session.collect(logger, timeout=1)
+
+    with pytest.raises(CommandExecutionException, match="DENY"):
+        future.result()
+
+
+def test_send_commands(session, sockets, logger):
+    sockets[1].sendall((_response(2) + _response(1)).encode())
+
+    outputs = session.send_commands(
+        ["RTRV-HDR:::{counter};", "RTRV-HDR:::{counter};"], None, logger, timeout=1
+    )
+
+    assert "M  1 COMPLD" in outputs[0]
+    assert "M  2 COMPLD" in outputs[1]
+
+
+def _autonomous(atag=5):
+    return (
+        f"\r\n\n   NODE 24-01-01 00:00:00\r\n"
+        f'*C {atag} REPT ALM EQPT\r\n   "SLOT-3:CR"\r\n;'
+    )
+
+
+def test_collect_autonomous_messages(session, sockets, logger):
+    future = session.submit("RTRV-HDR:::{counter};", logger)
+    sockets[1].sendall((_autonomous(5) + _response(1) + _autonomous(6)).encode())
+
+    session.collect(logger, timeout=1)
+
+    assert "REPT ALM" not in future.result()
+    assert "*C 5 REPT" in session.autonomous_messages.get_nowait()
+    assert "*C 6 REPT" in session.autonomous_messages.get_nowait()
+
+
+def test_autonomous_messages_queue_is_bounded(session, sockets, logger):
+    session.autonomous_messages.maxsize = 2
+    callback_messages = []
+    session._on_autonomous_message = callback_messages.append
+    session._feed(_autonomous(1) + _autonomous(2) + _autonomous(3), logger)
+
+    assert session.autonomous_messages.qsize() == 2
+    assert "*C 2 REPT" in session.autonomous_messages.get_nowait()
+    assert len(callback_messages) == 3
+
+
+def test_reader(session, sockets, logger):
+    messages = []
+    session.start_reader(logger, messages.append)
+    try:
+        sockets[1].sendall(_autonomous(1).encode())
+        future = session.submit("RTRV-HDR:::{counter};", logger)
+        sockets[1].sendall((_response(1, data='   "HDR"\r\n')).encode())
+
+        session.collect(logger, timeout=1)
+
+        assert '"HDR"' in future.result()
+        assert "*C 1 REPT" in session.autonomous_messages.get(timeout=1)
+        assert len(messages) == 1
+    finally:
+        session.stop_reader()
+    assert not session.reader_active
+
+
+def test_reader_hardware_expect(session, sockets, logger):
+    session.start_reader(logger)
+    try:
+
+        def respond():
+            # respond after the command is sent, the ctag is registered by then
+            sockets[1].recv(1024)
+            sockets[1].sendall((_autonomous(1) + _response(1)).encode())
+
+        responder = threading.Thread(target=respond, daemon=True)
+        responder.start()
+        output = session.hardware_expect("RTRV-HDR:::{counter};", None, logger)
+        assert "M  1 COMPLD" in output
+        assert "REPT" not in output
+        with pytest.raises(ExpectedSessionException):
+            session.hardware_expect("RTRV-HDR:::{counter};", None, logger, timeout=0.1)
+        assert session._tl1_futures == {}
+    finally:
+        session.stop_reader()
+
+
+@pytest.mark.parametrize(
+    ("error_map", "error_type", "match"),
+    [
+        (None, Exception, 'Status "DENY"'),
+        ({"IIAC": "Invalid AID"}, CommandExecutionException, "Invalid AID"),
+    ],
+)
+def test_reader_hardware_expect_error(
+    session, sockets, logger, error_map, error_type, match
+):
+    session.start_reader(logger)
+    try:
+
+        def respond():
+            sockets[1].recv(1024)
+            sockets[1].sendall(_response(1, status="DENY", data="   IIAC\r\n").encode())
+
+        responder = threading.Thread(target=respond, daemon=True)
+        responder.start()
+        with pytest.raises(Exception, match=match) as exc_info:
+            session.hardware_expect(
+                "ENT-EQPT::SLOT-1:{counter};", None, logger, error_map=error_map
+            )
+        assert type(exc_info.value) is error_type
+        assert session._tl1_unchecked == set()
+    finally:
+        session.stop_reader()
+
+
+def test_reader_connection_closed(session, sockets, logger):
+    session.start_reader(logger)
+    future = session.submit("RTRV-HDR:::{counter};", logger)
+    sockets[1].close()
+
+    assert future.exception(timeout=1)
+    session._reader.join(1)
+    assert not session.reader_active
@@ -0,0 +1,65 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from cloudshell.cli.service.cli import CLI
+from cloudshell.cli.service.session_pool_manager import SessionPoolManager
+
+
+@pytest.fixture
+def session_manager():
+    session_manager = Mock()
+    session_manager.new_session.side_effect = lambda sessions, *_: sessions[0]
+    return session_manager
+
+
+@pytest.fixture
+def cli(session_manager):
+    return CLI(SessionPoolManager(session_manager, max_pool_size=2))
+
+
+def _sessions_factory():
+    session = Mock()
+    session.connection_key = "a"
+    return [session]
+
+
+@patch("cloudshell.cli.service.cli.CommandModeGraph")
+@patch("cloudshell.cli.service.cli.CliServiceImpl")
+def test_warm_up(cli_service_class, command_mode_graph, cli, logger):
+    command_mode = Mock()
+    assert cli.warm_up(_sessions_factory, command_mode, 3, logger) == 2
+    assert cli_service_class.call_count == 2
+    assert sum(map(len, cli._session_pool._idle_sessions.values())) == 2
+
+
+@patch("cloudshell.cli.service.cli.CommandModeGraph")
+@patch("cloudshell.cli.service.cli.CliServiceImpl")
+def test_warm_up_without_mode(cli_service_class, command_mode_graph, cli, logger):
+    assert cli.warm_up(_sessions_factory, Mock(), 1, logger, enter_mode=False) == 1
+    cli_service_class.assert_not_called()
+
+
+@patch("cloudshell.cli.service.cli.CommandModeGraph")
+@patch("cloudshell.cli.service.cli.CliServiceImpl")
+def test_warm_up_enter_mode_failed(
+    cli_service_class, command_mode_graph, cli, session_manager, logger
+):
+    cli_service_class.side_effect = Exception
+    assert cli.warm_up(_sessions_factory, Mock(), 1, logger) == 0
+    session_manager.remove_session.assert_called_once()
+    assert cli._session_pool._idle_sessions == {}
+
+
+@patch("cloudshell.cli.service.cli.CommandModeGraph")
+def test_warm_up_connect_failed(command_mode_graph, cli, session_manager, logger):
+    session_manager.new_session.side_effect = Exception
+    assert cli.warm_up(_sessions_factory, Mock(), 2, logger) == 0
+    assert cli._session_pool._sessions_count == {}
+
+
+@pytest.mark.parametrize("count", [0, -1])
+@patch("cloudshell.cli.service.cli.CommandModeGraph")
+def test_warm_up_nothing(command_mode_graph, cli, session_manager, logger, count):
+    assert cli.warm_up(_sessions_factory, Mock(), count, logger) == 0
+    session_manager.new_session.assert_not_called()
@@ -1,6 +1,6 @@
 from logging import Logger
 from unittest import TestCase
-from unittest.mock import MagicMock, Mock, create_autospec, patch
+from unittest.mock import ANY, MagicMock, Mock, create_autospec, patch
 
 from cloudshell.cli.service.cli_service_impl import (
     CliServiceImpl,
@@ -8,6 +8,9 @@ from cloudshell.cli.service.cli_service_impl import (
     EnterDetachCommandModeContextManager,
 )
 from cloudshell.cli.service.command_mode import CommandMode
+from cloudshell.cli.service.prompt_cache import PromptCache
+
+from tests.cli.session.test_expect_session_py3 import StreamSession
 
 
 class TestEnterCommandModeContextManager(TestCase):
@@ -42,10 +45,10 @@ class TestEnterCommandModeContextManager(TestCase):
         self._cli_service._change_mode.assert_called_once_with(self._command_mode)
         self.assertEqual(cli_service, self._cli_service)
 
-    def test_exit_call_change_mode(self):
+    def test_exit_call_leave_mode(self):
         self._instance.__exit__(None, None, None)
-        self._cli_service._change_mode.assert_called_once_with(
-            self._cli_service.command_mode
+        self._cli_service._leave_mode.assert_called_once_with(
+            self._cli_service.active_command_mode
         )
 
     def test_exit_dont_handle_error_if_catch(self):
@@ -54,6 +57,7 @@ class TestEnterCommandModeContextManager(TestCase):
                 1 / 0
         except ZeroDivisionError:
             self._cli_service._change_mode.assert_called_once()  # in enter command
+            self._cli_service._leave_mode.assert_not_called()
         else:
             self.fail("context manager handle an error")
 
@@ -89,6 +93,7 @@ class TestEnterDetachCommandModeContextManager(TestCase):
 
     def test_enter_call_step_up(self):
         cli_service = self._instance.__enter__()
+        self._cli_service._settle_mode.assert_called_once_with()
         self._command_mode.step_up(self._cli_service, self._logger)
         self.assertEqual(cli_service, self._cli_service)
 
@@ -153,6 +158,21 @@ class TestCliOperationsImpl(TestCase):
     def test_init_change_mod_call(self):
         self._change_mode_func.assert_called_once_with(self._command_mode)
 
+    @patch(
+        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
+        ".get_last_command_mode"
+    )
+    def test_init_last_command_mode_skips_probe(self, get_last_command_mode):
+        last_mode = Mock()
+        get_last_command_mode.return_value = last_mode
+        self._determine_current_mode_func.reset_mock()
+        instance = self._create_instance()
+
+        self.assertIs(instance.command_mode, last_mode)
+        self._determine_current_mode_func.assert_not_called()
+        last_mode.enter_actions.assert_not_called()
+        last_mode.prompt_actions.assert_called_once_with(instance, self._logger)
+
     @patch("cloudshell.cli.service.cli_service_impl.EnterCommandModeContextManager")
     def test_enter_mode(self, command_mode_context_manager):
         command_mode_context_manager_instance = Mock()
@@ -201,6 +221,71 @@ class TestCliOperationsImpl(TestCase):
             logger=self._logger,
         )
 
+    def test_send_commands_session_call(self):
+        commands = ["a", "b"]
+        self._instance.send_commands(commands, logger=self._logger, window=2)
+        self._session.send_commands.assert_called_once_with(
+            commands,
+            expected_string=self._determined_command_mode.prompt,
+            action_map=None,
+            error_map=None,
+            logger=self._logger,
+            window=2,
+        )
+
+    def test_send_command_stream_lines(self):
+        self._session.stream_expect.return_value = iter(["a\nb", "c\n", "d"])
+        lines = self._instance.send_command_stream(
+            "cmd", logger=self._logger, lines=True
+        )
+        self.assertEqual(list(lines), ["a\n", "bc\n", "d"])
+        self._session.stream_expect.assert_called_once_with(
+            "cmd",
+            expected_string=self._determined_command_mode.prompt,
+            action_map=None,
+            error_map=None,
+            logger=self._logger,
+        )
+
+    def test_send_command_spool_threshold(self):
+        self._session.stream_expect.return_value = iter(["line 1\n", "line 2\n"])
+        with self._instance.send_command(
+            "cmd", logger=self._logger, spool_threshold=4
+        ) as output:
+            self.assertTrue(output.spilled)
+            self.assertEqual(str(output), "line 1\nline 2\n")
+        self._session.hardware_expect.assert_not_called()
+
+    def test_send_command_spool_threshold_without_echo(self):
+        session = StreamSession(["done\n", "router#"])
+        self._session.stream_expect.side_effect = session.stream_expect
+        with self._instance.send_command(
+            "copy running", "#$", logger=self._logger, spool_threshold=4, retries=3
+        ) as output:
+            self.assertEqual(str(output), "done\nrouter#")
+
+    def test_send_command_spool_threshold_optional_args(self):
+        session = StreamSession(["done\n", "router#"])
+        self._session.stream_expect.side_effect = session.stream_expect
+        with self._instance.send_command(
+            "copy running",
+            "#$",
+            logger=self._logger,
+            spool_threshold=4,
+            retries=3,
+            optional_arg=True,
+        ) as output:
+            self.assertEqual(str(output), "done\nrouter#")
+
+    def test_send_command_spool_threshold_unsupported_arguments(self):
+        with self.assertRaises(ValueError):
+            self._instance.send_command("cmd", remove_prompt=True, spool_threshold=4)
+        with self.assertRaises(ValueError):
+            self._instance.send_command(
+                "cmd", None, None, None, None, False, 1, spool_threshold=4
+            )
+        self._session.stream_expect.assert_not_called()
+
     @patch(
         "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
         ".calculate_route_steps"
@@ -212,101 +297,229 @@ class TestCliOperationsImpl(TestCase):
             self._determined_command_mode, command_mode
         )
 
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
+    @patch("cloudshell.cli.service.cli_service_impl.CommandModeGraph")
     @patch(
         "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
         ".determine_current_mode"
     )
     @patch("cloudshell.cli.service.cli_service_impl.CliServiceImpl._change_mode")
     def test_reconnect_get_prompts(
-        self, change_mode, determine_current_mode, defined_modes_by_prompt
+        self, change_mode, determine_current_mode, command_mode_graph
     ):
         prompt = "test"
-        command_mode = Mock()
-        defined_modes_by_prompt.return_value = {prompt: command_mode}
+        command_mode_graph.get.return_value.prompts_re = prompt
         self._instance.reconnect()
-        defined_modes_by_prompt.assert_called_once_with(self._determined_command_mode)
+        command_mode_graph.get.assert_called_once_with(self._determined_command_mode)
 
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
+    @patch("cloudshell.cli.service.cli_service_impl.CommandModeGraph")
     @patch(
         "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
         ".determine_current_mode"
     )
     @patch("cloudshell.cli.service.cli_service_impl.CliServiceImpl._change_mode")
     def test_reconnect_session_call(
-        self, change_mode, determine_current_mode, defined_modes_by_prompt
+        self, change_mode, determine_current_mode, command_mode_graph
     ):
         prompt = "test"
-        command_mode = Mock()
         timeout = Mock()
-        defined_modes_by_prompt.return_value = {prompt: command_mode}
+        command_mode_graph.get.return_value.prompts_re = prompt
         self._instance.reconnect(timeout)
         self._session.reconnect.assert_called_once_with(prompt, self._logger, timeout)
 
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
+    @patch("cloudshell.cli.service.cli_service_impl.CommandModeGraph")
     @patch(
         "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
         ".determine_current_mode"
     )
     @patch("cloudshell.cli.service.cli_service_impl.CliServiceImpl._change_mode")
     def test_reconnect_determine_current_mode_call(
-        self, change_mode, determine_current_mode, defined_modes_by_prompt
+        self, change_mode, determine_current_mode, command_mode_graph
     ):
         prompt = "test"
         command_mode = Mock()
         timeout = Mock()
-        defined_modes_by_prompt.return_value = {prompt: command_mode}
+        command_mode_graph.get.return_value.prompts_re = prompt
         determine_current_mode.return_value = command_mode
         self._instance.reconnect(timeout)
         determine_current_mode.assert_called_once_with(
             self._session, self._determined_command_mode, self._logger
         )
 
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
+    @patch("cloudshell.cli.service.cli_service_impl.CommandModeGraph")
     @patch(
         "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
         ".determine_current_mode"
     )
     @patch("cloudshell.cli.service.cli_service_impl.CliServiceImpl._change_mode")
     def test_reconnect_command_mode_enter_action_call(
-        self, change_mode, determine_current_mode, defined_modes_by_prompt
+        self, change_mode, determine_current_mode, command_mode_graph
     ):
         prompt = "test"
         command_mode = Mock()
         timeout = Mock()
-        defined_modes_by_prompt.return_value = {prompt: command_mode}
+        command_mode_graph.get.return_value.prompts_re = prompt
         determine_current_mode.return_value = command_mode
         self._instance.reconnect(timeout)
         command_mode.enter_actions.assert_called_once_with(self._instance)
 
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
+    @patch("cloudshell.cli.service.cli_service_impl.CommandModeGraph")
     @patch(
         "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
         ".determine_current_mode"
     )
     @patch("cloudshell.cli.service.cli_service_impl.CliServiceImpl._change_mode")
     def test_reconnect_change_mode(
-        self, change_mode, determine_current_mode, defined_modes_by_prompt
+        self, change_mode, determine_current_mode, command_mode_graph
     ):
         prompt = "test"
         command_mode = Mock()
         timeout = Mock()
-        defined_modes_by_prompt.return_value = {prompt: command_mode}
+        command_mode_graph.get.return_value.prompts_re = prompt
         determine_current_mode.return_value = command_mode
         self._instance.reconnect(timeout)
         change_mode.assert_called_once_with(self._determined_command_mode)
+
+
+class ModeTreeTestCase(TestCase):
+    def setUp(self):
+        self._enable = CommandMode("enable#")
+        self._config = CommandMode(
+            "config#", "configure", "end", parent_mode=self._enable
+        )
+        self._interface = CommandMode(
+            "if#", "interface 1", "exit", parent_mode=self._config
+        )
+        self._session = Mock()
+        self._session.hardware_expect.return_value = ""
+        attached_patcher = patch.object(
+            CommandMode, "is_attached_command_mode", return_value=True
+        )
+        attached_patcher.start()
+        self.addCleanup(attached_patcher.stop)
+
+    @patch(
+        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
+        ".determine_current_mode"
+    )
+    def _create_instance(self, determine_current_mode, **kwargs):
+        determine_current_mode.return_value = self._enable
+        return CliServiceImpl(self._session, self._enable, Mock(), **kwargs)
+
+    def _sent_commands(self):
+        return [args[0] for args, _ in self._session.hardware_expect.call_args_list]
+
+
+class TestLazyModeChange(ModeTreeTestCase):
+    def _create_instance(self, lazy_mode_change=True):
+        return super()._create_instance(lazy_mode_change=lazy_mode_change)
+
+    def test_exit_and_enter_are_coalesced(self):
+        cli_service = self._create_instance()
+        for command in ("a", "b"):
+            with cli_service.enter_mode(self._config):
+                cli_service.send_command(command)
+        self.assertEqual(self._sent_commands(), ["configure", "a", "b"])
+        self.assertIs(cli_service.command_mode, self._config)
+        self.assertIs(cli_service.active_command_mode, self._enable)
+
+    def test_command_settles_deferred_mode(self):
+        cli_service = self._create_instance()
+        with cli_service.enter_mode(self._config):
+            with cli_service.enter_mode(self._interface):
+                cli_service.send_command("a")
+        cli_service.send_command("b")
+        self.assertEqual(
+            self._sent_commands(), ["configure", "interface 1", "a", "exit", "end", "b"]
+        )
+        self.assertIs(cli_service.command_mode, self._enable)
+        self._session.hardware_expect.assert_called_with(
+            "b",
+            expected_string="enable#",
+            action_map=None,
+            error_map=None,
+            logger=ANY,
+        )
+
+    def test_enter_mode_from_deferred_mode(self):
+        cli_service = self._create_instance()
+        with cli_service.enter_mode(self._interface):
+            cli_service.send_command("a")
+        with cli_service.enter_mode(self._config):
+            cli_service.send_command("b")
+        cli_service.send_command("c")
+        self.assertEqual(
+            self._sent_commands(),
+            ["configure", "interface 1", "a", "exit", "b", "end", "c"],
+        )
+
+    def test_not_lazy_by_default(self):
+        cli_service = self._create_instance(lazy_mode_change=False)
+        with cli_service.enter_mode(self._config):
+            cli_service.send_command("a")
+        self.assertEqual(self._sent_commands(), ["configure", "a", "end"])
+        self.assertIs(cli_service.command_mode, self._enable)
+
+
+class TestBatchModeChange(ModeTreeTestCase):
+    def test_route_is_sent_in_one_write(self):
+        cli_service = self._create_instance(batch_mode_change=True)
+        with cli_service.enter_mode(self._interface):
+            self._session.send_burst.assert_called_once_with(
+                ["configure", "interface 1"],
+                expected_string="if#",
+                logger=ANY,
+                error_map={},
+                prompts_re=ANY,
+            )
+            self.assertIs(cli_service.command_mode, self._interface)
+        self._session.send_burst.assert_called_with(
+            ["exit", "end"],
+            expected_string="enable#",
+            logger=ANY,
+            error_map={},
+            prompts_re=ANY,
+        )
+        self.assertIs(cli_service.command_mode, self._enable)
+        self._session.hardware_expect.assert_not_called()
+
+    def test_not_batched_by_default(self):
+        cli_service = self._create_instance()
+        with cli_service.enter_mode(self._interface):
+            pass
+        self._session.send_burst.assert_not_called()
+        self.assertEqual(
+            self._sent_commands(), ["configure", "interface 1", "exit", "end"]
+        )
+
+
+class TestPromptCache(ModeTreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self._session.host = "10.0.0.1"
+        self._session.session_type = "SSH"
+        self._session.last_command_mode = None
+        self._session.get_output_tail.return_value = "switch if#"
+        self._prompt_cache = PromptCache()
+
+    @patch(
+        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
+        ".determine_current_mode"
+    )
+    def test_new_session_in_cached_mode(self, determine_current_mode):
+        self._prompt_cache.remember(self._session, self._interface)
+        enter_actions = Mock()
+        self._interface._enter_actions = enter_actions
+
+        cli_service = CliServiceImpl(
+            self._session, self._interface, Mock(), prompt_cache=self._prompt_cache
+        )
+
+        determine_current_mode.assert_not_called()
+        enter_actions.assert_called_once_with(cli_service)
+        self.assertIs(cli_service.command_mode, self._interface)
+
+    def test_cache_is_updated(self):
+        self._create_instance(prompt_cache=self._prompt_cache)
+        device = self._prompt_cache.get(self._session)
+        self.assertEqual(device.last_mode, "enable#")
+        self.assertEqual(device.session_type, "SSH")
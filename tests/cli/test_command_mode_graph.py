@@ -0,0 +1,84 @@
+from unittest import TestCase
+
+from cloudshell.cli.service.command_mode import CommandMode
+from cloudshell.cli.service.command_mode_graph import CommandModeGraph, match_mode
+
+
+class TestCommandModeGraph(TestCase):
+    def setUp(self):
+        self._root = CommandMode("root>")
+        self._enable = CommandMode("enable#", parent_mode=self._root)
+        self._config = CommandMode("config#", parent_mode=self._enable)
+        self._shell = CommandMode("shell$", parent_mode=self._root)
+
+    def test_modes_by_prompt(self):
+        graph = CommandModeGraph.get(self._config)
+        self.assertEqual(
+            list(graph.modes_by_prompt.items()),
+            [
+                ("root>", self._root),
+                ("enable#", self._enable),
+                ("shell$", self._shell),
+                ("config#", self._config),
+            ],
+        )
+        self.assertEqual(graph.prompts_re, "root>|enable#|shell$|config#")
+
+    def test_get_returns_cached_graph(self):
+        graph = CommandModeGraph.get(self._config)
+        self.assertIs(CommandModeGraph.get(self._shell), graph)
+
+    def test_get_rebuilds_graph_on_new_node(self):
+        graph = CommandModeGraph.get(self._root)
+        interface = CommandMode("if#", parent_mode=self._config)
+        new_graph = CommandModeGraph.get(self._root)
+        self.assertIsNot(new_graph, graph)
+        self.assertIs(new_graph.modes_by_prompt["if#"], interface)
+
+    def test_get_keeps_graph_on_new_node_in_other_tree(self):
+        graph = CommandModeGraph.get(self._root)
+        other_root = CommandMode("other>")
+        CommandMode("other#", parent_mode=other_root)
+        self.assertIs(CommandModeGraph.get(self._root), graph)
+
+    def test_get_rebuilds_graph_on_prompt_change(self):
+        graph = CommandModeGraph.get(self._root)
+        self._enable.prompt = "switch#"
+        new_graph = CommandModeGraph.get(self._root)
+        self.assertIsNot(new_graph, graph)
+        self.assertIs(new_graph.modes_by_prompt["switch#"], self._enable)
+
+    def test_route_steps(self):
+        graph = CommandModeGraph.get(self._root)
+        steps = graph.route_steps(self._config, self._shell)
+        self.assertEqual(
+            steps,
+            [self._config.step_down, self._enable.step_down, self._shell.step_up],
+        )
+        self.assertEqual(graph.route_steps(self._config, self._shell), steps)
+        self.assertEqual(graph.route_steps(self._shell, self._shell), [])
+
+    def test_route_steps_detached_mode(self):
+        detached = CommandMode("detached#")
+        detached.parent_node = self._enable
+        graph = CommandModeGraph.get(detached)
+        self.assertEqual(
+            graph.route_steps(self._root, detached),
+            [self._enable.step_up, detached.step_up],
+        )
+
+
+class TestMatchMode(TestCase):
+    def test_first_prompt_in_order_wins(self):
+        modes = {r"b\S*": "mode b", r"a\S*": "mode a"}
+        self.assertEqual(match_mode(modes, "a1\nb2"), ("mode b", "b2"))
+        self.assertEqual(match_mode(modes, "a1"), ("mode a", "a1"))
+        self.assertIsNone(match_mode(modes, "c"))
+
+    def test_prompts_with_same_group_names(self):
+        modes = {r"(?P<host>\w+)>": "default", r"(?P<host>\w+)#": "enable"}
+        self.assertEqual(match_mode(modes, "switch#"), ("enable", "switch#"))
+
+    def test_prompts_with_backreferences(self):
+        modes = {r"(\w+)>": "default", r"(\w+)@\1#": "enable"}
+        self.assertEqual(match_mode(modes, "admin@admin#"), ("enable", "admin@admin#"))
@@ -1,7 +1,8 @@
 from unittest import TestCase
-from unittest.mock import Mock, patch
+from unittest.mock import ANY, Mock, patch
 
-from cloudshell.cli.service.command_mode import CommandModeException
+from cloudshell.cli.service.command_mode import CommandMode, CommandModeException
+from cloudshell.cli.service.command_mode_graph import CommandModeGraph
 from cloudshell.cli.service.command_mode_helper import CommandModeHelper
 
 
@@ -11,45 +12,42 @@ class TestCommandModeHelper(TestCase):
         self._command_mode = Mock()
         self._logger = Mock()
 
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
-    def test_determine_current_mode_call_defined_modes(self, defined_modes_by_prompt):
+    @patch("cloudshell.cli.service.command_mode_helper.CommandModeGraph")
+    def test_determine_current_mode_call_defined_modes(self, command_mode_graph):
         prompt = "test"
-        defined_modes_by_prompt.return_value = {prompt: self._command_mode}
+        command_mode_graph.get.return_value.modes_by_prompt = {
+            prompt: self._command_mode
+        }
+        command_mode_graph.get.return_value.prompts_re = prompt
         self._session.probe_for_prompt.return_value = prompt
         CommandModeHelper.determine_current_mode(
             self._session, self._command_mode, self._logger
         )
-        defined_modes_by_prompt.assert_called_once_with(self._command_mode)
-
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
-    def test_determine_current_mode_call_probe_for_prompt(
-        self, defined_modes_by_prompt
-    ):
+        command_mode_graph.get.assert_called_once_with(self._command_mode)
+
+    @patch("cloudshell.cli.service.command_mode_helper.CommandModeGraph")
+    def test_determine_current_mode_call_probe_for_prompt(self, command_mode_graph):
         prompt = "test"
-        defined_modes = {prompt: self._command_mode}
-        defined_modes_by_prompt.return_value = defined_modes
+        prompts_re = "test|other"
+        command_mode_graph.get.return_value.modes_by_prompt = {
+            prompt: self._command_mode
+        }
+        command_mode_graph.get.return_value.prompts_re = prompts_re
         self._session.probe_for_prompt.return_value = prompt
         CommandModeHelper.determine_current_mode(
             self._session, self._command_mode, self._logger
         )
-        prompts_re = r"|".join(defined_modes.keys())
         self._session.probe_for_prompt.assert_called_once_with(
             expected_string=prompts_re, logger=self._logger
         )
 
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
-    def test_determine_current_mode_raise_exception(self, defined_modes_by_prompt):
+    @patch("cloudshell.cli.service.command_mode_helper.CommandModeGraph")
+    def test_determine_current_mode_raise_exception(self, command_mode_graph):
         prompt = "test"
-        defined_modes_by_prompt.return_value = {prompt: self._command_mode}
+        command_mode_graph.get.return_value.modes_by_prompt = {
+            prompt: self._command_mode
+        }
+        command_mode_graph.get.return_value.prompts_re = prompt
         self._session.probe_for_prompt = Mock(side_effect=Exception())
         exception = CommandModeException
         with self.assertRaises(exception):
@@ -57,15 +55,151 @@ class TestCommandModeHelper(TestCase):
                 self._session, self._command_mode, self._logger
             )
 
-    @patch(
-        "cloudshell.cli.service.command_mode_helper.CommandModeHelper"
-        ".defined_modes_by_prompt"
-    )
-    def test_determine_current_mode_return_mode(self, defined_modes_by_prompt):
+    @patch("cloudshell.cli.service.command_mode_helper.CommandModeGraph")
+    def test_determine_current_mode_return_mode(self, command_mode_graph):
         prompt = "test"
-        defined_modes_by_prompt.return_value = {prompt: self._command_mode}
+        command_mode_graph.get.return_value.modes_by_prompt = {
+            prompt: self._command_mode
+        }
+        command_mode_graph.get.return_value.prompts_re = prompt
         self._session.probe_for_prompt.return_value = prompt
         mode = CommandModeHelper.determine_current_mode(
             self._session, self._command_mode, self._logger
         )
         self.assertTrue(mode == self._command_mode)
+
+
+class TestProbeCurrentMode(TestCase):
+    def test_probe_current_mode(self):
+        default_mode = CommandMode(r">\s*$")
+        enable_mode = CommandMode(r"#\s*$", parent_mode=default_mode)
+        session = Mock()
+        session.probe_for_prompt.return_value = "\nswitch# "
+
+        self.assertEqual(
+            CommandModeHelper.probe_current_mode(session, default_mode, Mock()),
+            (enable_mode, "# "),
+        )
+        session.probe_for_prompt.assert_called_once_with(
+            expected_string=r">\s*$|#\s*$", logger=ANY
+        )
+
+
+class DefaultMode(CommandMode):
+    def __init__(self):
+        super().__init__(r">\s*$")
+
+
+class EnableMode(CommandMode):
+    def __init__(self):
+        super().__init__(r"#\s*$")
+
+
+class TestGetLastCommandMode(TestCase):
+    def setUp(self):
+        self._default_mode = DefaultMode()
+        self._enable_mode = EnableMode()
+        self._enable_mode.add_parent_mode(self._default_mode)
+        self._session = Mock()
+        self._logger = Mock()
+
+    def _get(self, tail):
+        self._session.get_output_tail.return_value = tail
+        return CommandModeHelper.get_last_command_mode(
+            self._session, self._enable_mode, self._logger
+        )
+
+    def test_last_mode_matches_tail(self):
+        self._session.last_command_mode = self._enable_mode
+        self.assertIs(self._get("show ver\nswitch# "), self._enable_mode)
+
+    def test_last_mode_from_other_modes_tree(self):
+        self._session.last_command_mode = DefaultMode()
+        self.assertIs(self._get("switch>"), self._default_mode)
+        self.assertIsNone(self._get("switch#"))
+
+    def test_last_mode_mismatch(self):
+        self._session.last_command_mode = self._enable_mode
+        self.assertIsNone(self._get("switch>"))
+        self.assertIsNone(self._get("switch#\n"))
+
+    def test_without_last_mode(self):
+        self._session.last_command_mode = None
+        self.assertIsNone(self._get("switch#"))
+        self._session.get_output_tail.assert_not_called()
+
+
+class TestBatchRouteSteps(TestCase):
+    def setUp(self):
+        self._default = CommandMode("switch>")
+        self._enable = CommandMode(
+            "switch#",
+            "enable",
+            "disable",
+            enter_action_map={"[Pp]assword": lambda session, logger: None},
+            parent_mode=self._default,
+        )
+        self._config = CommandMode(
+            r"\(config\)#",
+            "configure terminal",
+            "end",
+            enter_error_map={"Invalid": "Invalid command"},
+            parent_mode=self._enable,
+        )
+        self._interface = CommandMode(
+            r"\(config-if\)#",
+            ["interface 1", "no shutdown"],
+            "exit",
+            parent_mode=self._config,
+        )
+
+    def _batch(self, source, dest):
+        return CommandModeHelper.batch_route_steps(
+            CommandModeHelper.calculate_route_steps(source, dest)
+        )
+
+    def test_steps_with_action_map_are_not_batched(self):
+        steps = self._batch(self._default, self._interface)
+        self.assertEqual(steps[0], self._enable.step_up)
+        self.assertEqual(len(steps), 2)
+        self.assertEqual(
+            steps[1].commands, ["configure terminal", "interface 1", "no shutdown"]
+        )
+        self.assertEqual(steps[1].error_map, {"Invalid": "Invalid command"})
+
+    def test_single_command_is_not_batched(self):
+        self.assertEqual(
+            self._batch(self._enable, self._config), [self._config.step_up]
+        )
+
+    def test_list_enter_command_is_batched(self):
+        (step,) = self._batch(self._config, self._interface)
+        self.assertEqual(step.commands, ["interface 1", "no shutdown"])
+
+    def test_step_down_route(self):
+        steps = self._batch(self._interface, self._default)
+        self.assertEqual(len(steps), 1)
+        self.assertEqual(steps[0].commands, ["exit", "end", "disable"])
+
+    def test_overridden_step_is_not_batched(self):
+        class ShellMode(CommandMode):
+            def step_up(self, cli_service, logger):
+                pass
+
+        shell = ShellMode("shell$", "shell", "exit", parent_mode=self._config)
+        steps = self._batch(self._enable, shell)
+        self.assertEqual(steps, [self._config.step_up, shell.step_up])
+
+    def test_burst_call(self):
+        cli_service = Mock()
+        logger = Mock()
+        (burst,) = self._batch(self._enable, self._interface)
+        burst(cli_service, logger)
+        cli_service.session.send_burst.assert_called_once_with(
+            ["configure terminal", "interface 1", "no shutdown"],
+            expected_string=r"\(config-if\)#",
+            logger=logger,
+            error_map={"Invalid": "Invalid command"},
+            prompts_re=CommandModeGraph.get(self._interface).prompts_re,
+        )
+        self.assertIs(cli_service.command_mode, self._interface)
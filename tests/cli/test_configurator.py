@@ -51,3 +51,23 @@ def test_get_supported_sessions_console(registered_sessions, logger):
     )
 
     assert cli_configurator._supported_sessions == (registered_sessions[2],)
+
+
+def test_warm_up(registered_sessions, logger):
+    cli = Mock()
+    cli_configurator = CLIServiceConfigurator(
+        "SSH", "host", logger, cli=cli, registered_sessions=registered_sessions
+    )
+    command_mode = Mock()
+
+    assert cli_configurator.warm_up(command_mode, 2) == cli.warm_up.return_value
+    cli.warm_up.assert_called_once_with(
+        cli_configurator._defined_sessions, command_mode, 2, logger, True
+    )
+
+
+def test_host_port(logger):
+    cli_configurator = CLIServiceConfigurator("SSH", "host", logger, port=22)
+
+    assert cli_configurator.host == "host"
+    assert cli_configurator.port == 22
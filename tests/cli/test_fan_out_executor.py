@@ -0,0 +1,108 @@
+import threading
+import time
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from cloudshell.cli.service.fan_out_executor import FanOutExecutor
+
+
+class RunningCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, cli_service):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self._lock:
+            self.running -= 1
+        return cli_service.send_command("show version")
+
+
+def _configurator(host, port=22):
+    configurator = Mock(host=host, port=port)
+    configurator.get_cli_service.return_value = MagicMock()
+    return configurator
+
+
+def test_run_yields_all_results():
+    configurators = [_configurator(f"host{i}") for i in range(5)]
+    command_modes = {}
+
+    def command_mode_factory(configurator):
+        return command_modes.setdefault(configurator.host, Mock())
+
+    results = list(
+        FanOutExecutor(max_workers=2).run_command(
+            configurators, command_mode_factory, "cmd"
+        )
+    )
+
+    assert sorted(result.index for result in results) == list(range(5))
+    for result in results:
+        assert result.success
+        assert result.configurator is configurators[result.index]
+        assert result.duration >= 0
+        result.configurator.get_cli_service.assert_called_once_with(
+            command_modes[result.configurator.host]
+        )
+        cli_service = result.configurator.get_cli_service.return_value.__enter__()
+        cli_service.send_command.assert_called_once_with("cmd")
+        assert result.output is cli_service.send_command.return_value
+
+
+@pytest.mark.parametrize(
+    ("max_workers", "max_per_device", "hosts", "expected"),
+    [
+        (2, 1, ["a", "b", "c", "d"], 2),
+        (10, 1, ["a", "a", "a"], 1),
+        (10, 2, ["a", "a", "a", "a"], 2),
+    ],
+)
+def test_run_concurrency_limits(max_workers, max_per_device, hosts, expected):
+    counter = RunningCounter()
+    executor = FanOutExecutor(max_workers=max_workers, max_per_device=max_per_device)
+
+    results = list(executor.run(map(_configurator, hosts), Mock(), counter))
+
+    assert len(results) == len(hosts)
+    assert counter.max_running == expected
+
+
+def test_run_returns_errors():
+    configurator = _configurator("a")
+    error = Exception("failed")
+    configurator.get_cli_service.side_effect = error
+
+    (result,) = FanOutExecutor().run_command([configurator], Mock(), "cmd")
+
+    assert not result.success
+    assert result.error is error
+
+
+def test_run_template():
+    configurator = _configurator("a")
+    command_template = Mock(action_map={}, error_map={})
+
+    (result,) = FanOutExecutor().run_template(
+        [configurator], Mock(), command_template, name="value"
+    )
+
+    command_template.prepare_command.assert_called_once_with(name="value")
+    cli_service = configurator.get_cli_service.return_value.__enter__()
+    assert result.output is cli_service.send_command.return_value
+
+
+def test_run_command_mode_factory_error():
+    error = Exception("failed")
+    command_mode_factory = Mock(side_effect=error)
+
+    (result,) = FanOutExecutor().run_command(
+        [_configurator("a")], command_mode_factory, "cmd"
+    )
+
+    assert result.error is error
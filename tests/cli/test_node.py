@@ -32,6 +32,13 @@ class TestNode(TestCase):
         self._node.add_child_node(child_node)
         self.assertTrue(child_node.parent_node == self._node)
 
+    def test_add_child_node_increments_root_tree_version(self):
+        child_node = NodeImplementation()
+        self._node.add_child_node(child_node)
+        child_node.add_child_node(NodeImplementation())
+        self.assertEqual(self._node.tree_version, 2)
+        self.assertEqual(child_node.tree_version, 0)
+
 
 class TestNodeOperations(TestCase):
     def setUp(self):
@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from cloudshell.cli.service.command_mode import CommandMode
+from cloudshell.cli.service.prompt_cache import PromptCache
+
+
+def _session(host="10.0.0.1", session_type="SSH", tail="sw1#", port=22):
+    session = Mock()
+    session.host = host
+    session.port = port
+    session.session_type = session_type
+    session.password = "secret"
+    session.get_output_tail.return_value = tail
+    return session
+
+
+def _modes():
+    default = CommandMode(r"[\w-]+>")
+    enable = CommandMode(r"[\w-]+#", parent_mode=default, use_exact_prompt=True)
+    config = CommandMode(
+        r"[\w-]+\(config\)#", parent_mode=enable, use_exact_prompt=True
+    )
+    return default, enable, config
+
+
+class TestPromptCache(TestCase):
+    def setUp(self):
+        self._default, self._enable, self._config = _modes()
+        self._enable.exact_prompt = "sw1\\#"
+        self._cache = PromptCache()
+
+    def test_get_key(self):
+        self.assertEqual(PromptCache.get_key(_session()), "10.0.0.1")
+        self.assertEqual(
+            PromptCache.get_key(_session(session_type="CONSOLE_SSH", port=2001)),
+            "10.0.0.1:2001",
+        )
+        self.assertIsNone(PromptCache.get_key(_session(host="")))
+
+    def test_get_hostname(self):
+        self.assertEqual(PromptCache.get_hostname("sw1(config)#"), "sw1")
+        self.assertEqual(PromptCache.get_hostname("admin@router> "), "router")
+        self.assertIsNone(PromptCache.get_hostname(""))
+
+    def test_remember(self):
+        self._cache.remember(_session(), self._enable)
+        device = self._cache.get(_session())
+        self.assertEqual(device.exact_prompts, {r"[\w-]+#": "sw1\\#"})
+        self.assertEqual(device.hostname, "sw1")
+        self.assertEqual(device.session_type, "SSH")
+        self.assertEqual(device.last_mode, r"[\w-]+#")
+
+    def test_restore_to_other_modes_tree(self):
+        self._cache.remember(_session(), self._enable)
+        default, enable, config = _modes()
+        self.assertIs(self._cache.restore(_session(), config), enable)
+        self.assertEqual(enable.prompt, "sw1\\#")
+        self.assertEqual(config.prompt, r"[\w-]+\(config\)#")
+        self.assertEqual(default.prompt, r"[\w-]+>")
+
+    def test_restore_other_hostname(self):
+        self._cache.remember(_session(), self._enable)
+        default, enable, config = _modes()
+        self.assertIsNone(self._cache.restore(_session(tail="sw2#"), config))
+        self.assertIsNone(enable.exact_prompt)
+
+    def test_restore_unknown_device(self):
+        self.assertIsNone(self._cache.restore(_session(), self._enable))
+
+    def test_order_sessions(self):
+        ssh = _session()
+        telnet = _session(session_type="TELNET", port=23)
+        self.assertEqual(self._cache.order_sessions([ssh, telnet]), [ssh, telnet])
+        self._cache.remember(telnet, self._enable)
+        self.assertEqual(self._cache.order_sessions([ssh, telnet]), [telnet, ssh])
+
+
+class TestPromptCacheFile(TestCase):
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self._path = os.path.join(self._dir.name, "prompts.json")
+        self._default, self._enable, self._config = _modes()
+
+    def test_persistence(self):
+        cache = PromptCache(self._path)
+        cache.remember(_session(), self._enable)
+        cache.flush()
+        with open(self._path) as file:
+            content = file.read()
+        self.assertNotIn("secret", content)
+        self.assertEqual(json.loads(content)["10.0.0.1"]["hostname"], "sw1")
+
+        device = PromptCache(self._path).get(_session())
+        self.assertEqual(device.last_mode, r"[\w-]+#")
+
+    def test_save_merges_devices_of_other_processes(self):
+        first, second = PromptCache(self._path), PromptCache(self._path)
+        first.remember(_session(), self._enable)
+        first.flush()
+        second.remember(_session(host="10.0.0.2", tail="sw2#"), self._enable)
+        second.flush()
+        first.remember(_session(session_type="TELNET"), self._enable)
+        first.flush()
+
+        cache = PromptCache(self._path)
+        self.assertEqual(cache.get(_session()).session_type, "TELNET")
+        self.assertEqual(cache.get(_session(host="10.0.0.2")).hostname, "sw2")
+        self.assertEqual(first.get(_session(host="10.0.0.2")).hostname, "sw2")
+
+    def test_save_keeps_newer_devices_of_other_processes(self):
+        first = PromptCache(self._path)
+        first.remember(_session(), self._enable)
+        first.flush()
+        second = PromptCache(self._path)
+        second.remember(_session(session_type="TELNET"), self._enable)
+        second.flush()
+        first.remember(_session(host="10.0.0.2", tail="sw2#"), self._enable)
+        first.flush()
+
+        cache = PromptCache(self._path)
+        self.assertEqual(cache.get(_session()).session_type, "TELNET")
+
+    def test_not_changed_device_is_not_saved(self):
+        cache = PromptCache(self._path, save_delay=None)
+        cache.remember(_session(), self._enable)
+        with patch.object(PromptCache, "save") as save:
+            cache.remember(_session(), self._enable)
+        save.assert_not_called()
+
+    def test_saves_are_delayed(self):
+        cache = PromptCache(self._path, save_delay=60)
+        with patch.object(PromptCache, "save") as save:
+            cache.remember(_session(), self._enable)
+            cache.remember(_session(host="10.0.0.2", tail="sw2#"), self._enable)
+        save.assert_not_called()
+        cache.flush()
+        saved = PromptCache(self._path)
+        self.assertEqual(saved.get(_session()).hostname, "sw1")
+        self.assertEqual(saved.get(_session(host="10.0.0.2")).hostname, "sw2")
+
+    def test_delayed_save_in_background(self):
+        cache = PromptCache(self._path, save_delay=0.01)
+        cache.remember(_session(), self._enable)
+        cache._save_timer.join(1)
+        self.assertEqual(PromptCache(self._path).get(_session()).hostname, "sw1")
+
+    def test_load_broken_file(self):
+        with open(self._path, "w") as file:
+            file.write("{")
+        cache = PromptCache(self._path)
+        self.assertIsNone(cache.get(_session()))
+
+    def test_clear(self):
+        cache = PromptCache(self._path)
+        cache.remember(_session(), self._enable)
+        cache.clear()
+        self.assertIsNone(PromptCache(self._path).get(_session()))
@@ -1,4 +1,5 @@
 from unittest import TestCase
+from unittest.mock import ANY
 from unittest.mock import MagicMock as Mock
 from unittest.mock import call, patch
 
@@ -28,7 +29,12 @@ class TestSessionPoolContextManager(TestCase):
         prompt = Mock()
         self._instance._initialize_cli_service(session, prompt)
         cli_service_class.assert_called_once_with(
-            session, self._command_mode, self._logger
+            session,
+            self._command_mode,
+            self._logger,
+            lazy_mode_change=False,
+            batch_mode_change=False,
+            prompt_cache=None,
         )
 
     @patch("cloudshell.cli.service.session_pool_context_manager.CliService")
@@ -40,25 +46,29 @@ class TestSessionPoolContextManager(TestCase):
         self.assertIs(
             self._instance._initialize_cli_service(session, prompt), cli_service
         )
-        cli_service_calls = [call(session, self._command_mode, self._logger)] * 2
+        cli_service_calls = [
+            call(
+                session,
+                self._command_mode,
+                self._logger,
+                lazy_mode_change=False,
+                batch_mode_change=False,
+                prompt_cache=None,
+            )
+        ] * 2
         cli_service_class.assert_has_calls(cli_service_calls)
         session.reconnect.assert_called_once_with(prompt, self._logger)
 
-    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeHelper")
-    def test_enter_without_exception(self, command_mode_helper):
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_enter_without_exception(self, command_mode_graph):
         self._instance._initialize_cli_service = Mock()
         prompts = ["1"]
-        command_mode_helper.defined_modes_by_prompt.return_value = Mock()
-        command_mode_helper.defined_modes_by_prompt.return_value.keys.return_value = (
-            prompts
-        )
+        command_mode_graph.get.return_value.prompts_re = "|".join(prompts)
         session = Mock()
         self._session_pool_manager.get_session.return_value = session
         with self._instance:
             pass
-        command_mode_helper.defined_modes_by_prompt.assert_called_once_with(
-            self._command_mode
-        )
+        command_mode_graph.get.assert_called_once_with(self._command_mode)
         self._session_pool_manager.get_session.assert_called_once_with(
             self._new_sessions, "|".join(prompts), self._logger
         )
@@ -66,22 +76,17 @@ class TestSessionPoolContextManager(TestCase):
             session, "|".join(prompts)
         )
 
-    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeHelper")
-    def test_enter_with_exception(self, command_mode_helper):
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_enter_with_exception(self, command_mode_graph):
         self._instance._initialize_cli_service = Mock(side_effect=[Exception()])
         prompts = ["1"]
-        command_mode_helper.defined_modes_by_prompt.return_value = Mock()
-        command_mode_helper.defined_modes_by_prompt.return_value.keys.return_value = (
-            prompts
-        )
+        command_mode_graph.get.return_value.prompts_re = "|".join(prompts)
         session = Mock()
         self._session_pool_manager.get_session.return_value = session
         with self.assertRaises(Exception):
             with self._instance:
                 pass
-        command_mode_helper.defined_modes_by_prompt.assert_called_once_with(
-            self._command_mode
-        )
+        command_mode_graph.get.assert_called_once_with(self._command_mode)
         self._session_pool_manager.get_session.assert_called_once_with(
             self._new_sessions, "|".join(prompts), self._logger
         )
@@ -90,8 +95,8 @@ class TestSessionPoolContextManager(TestCase):
         )
         self._session_pool_manager.remove_session(session, self._logger)
 
-    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeHelper")
-    def test_exit_return_session(self, command_mode_helper):
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_exit_return_session(self, command_mode_graph):
         self._instance._initialize_cli_service = Mock()
         session_value = Mock()
         self._session_pool_manager.get_session.return_value = session_value
@@ -101,9 +106,49 @@ class TestSessionPoolContextManager(TestCase):
         self._session_pool_manager.return_session.assert_called_once_with(
             session_value, self._logger
         )
+        self.assertIs(
+            session_value.last_command_mode,
+            self._instance._initialize_cli_service.return_value.command_mode,
+        )
+
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_exit_settle_mode_before_return(self, command_mode_graph):
+        cli_service = Mock()
+        self._instance._initialize_cli_service = Mock(return_value=cli_service)
+        session_value = Mock()
+        self._session_pool_manager.get_session.return_value = session_value
+
+        def settle_mode():
+            self._session_pool_manager.return_session.assert_not_called()
+            cli_service.command_mode = self._command_mode
+
+        cli_service._settle_mode.side_effect = settle_mode
+        with self._instance:
+            pass
+
+        cli_service._settle_mode.assert_called_once_with()
+        self._session_pool_manager.return_session.assert_called_once_with(
+            session_value, self._logger
+        )
+        self.assertIs(session_value.last_command_mode, self._command_mode)
+
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_exit_remove_session_on_settle_mode_error(self, command_mode_graph):
+        cli_service = Mock()
+        cli_service._settle_mode.side_effect = Exception("test")
+        self._instance._initialize_cli_service = Mock(return_value=cli_service)
+        session_value = Mock()
+        self._session_pool_manager.get_session.return_value = session_value
+        with self._instance:
+            pass
+
+        self._session_pool_manager.remove_session.assert_called_once_with(
+            session_value, self._logger
+        )
+        self._session_pool_manager.return_session.assert_not_called()
 
-    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeHelper")
-    def test_exit_remove_session_on_exception(self, command_mode_helper):
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_exit_remove_session_on_exception(self, command_mode_graph):
         self._instance._initialize_cli_service = Mock()
         session_value = Mock()
         self._session_pool_manager.get_session.return_value = session_value
@@ -115,8 +160,8 @@ class TestSessionPoolContextManager(TestCase):
             session_value, self._logger
         )
 
-    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeHelper")
-    def test_exit_return_session_on_ignored_exception(self, command_mode_helper):
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_exit_return_session_on_ignored_exception(self, command_mode_graph):
         self._instance._initialize_cli_service = Mock()
         session_value = Mock()
         self._session_pool_manager.get_session.return_value = session_value
@@ -128,8 +173,8 @@ class TestSessionPoolContextManager(TestCase):
             session_value, self._logger
         )
 
-    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeHelper")
-    def test_exit_remove_session_on_inactive(self, command_mode_helper):
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_exit_remove_session_on_inactive(self, command_mode_graph):
         self._instance._initialize_cli_service = Mock()
         session_value = Mock()
         session_value.active.return_value = False
@@ -139,3 +184,28 @@ class TestSessionPoolContextManager(TestCase):
         self._session_pool_manager.remove_session.assert_called_once_with(
             session_value, self._logger
         )
+
+    @patch("cloudshell.cli.service.session_pool_context_manager.CommandModeGraph")
+    def test_prompt_cache(self, command_mode_graph):
+        prompt_cache = Mock()
+        self._instance = SessionPoolContextManager(
+            self._session_pool_manager,
+            self._new_sessions,
+            self._command_mode,
+            self._logger,
+            prompt_cache=prompt_cache,
+        )
+        self._instance._initialize_cli_service = Mock()
+        session_value = Mock()
+        self._session_pool_manager.get_session.return_value = session_value
+        with self._instance:
+            pass
+
+        prompt_cache.order_sessions.assert_called_once_with(self._new_sessions)
+        self._session_pool_manager.get_session.assert_called_once_with(
+            prompt_cache.order_sessions.return_value, ANY, self._logger
+        )
+        prompt_cache.remember.assert_called_once_with(
+            session_value,
+            self._instance._initialize_cli_service.return_value.command_mode,
+        )
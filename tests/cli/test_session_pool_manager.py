@@ -1,3 +1,6 @@
+import threading
+import time
+from collections import deque
 from unittest import TestCase
 from unittest.mock import MagicMock, Mock
 
@@ -7,177 +10,326 @@ from cloudshell.cli.service.session_pool_manager import (
 )
 
 
+def _session(key):
+    session = Mock()
+    session.connection_key = key
+    return session
+
+
 class TestSessionPoolManager(TestCase):
     def setUp(self):
         self._session_manager = Mock()
-        self._pool = Mock()
-        self._condition = MagicMock()
+        self._session_manager.new_session.side_effect = lambda sessions, *_: sessions[0]
+        self._session_manager.is_compatible.return_value = True
         self._session_pool_manager = SessionPoolManager(
-            session_manager=self._session_manager, pool=self._pool
+            session_manager=self._session_manager, max_pool_size=2
         )
-        self._session_pool_manager._session_condition = self._condition
         self._logger = Mock()
-        self._new_sessions = Mock()
-        self._command_mode = Mock()
         self._prompt = Mock()
 
-    def test_get_session_with_condition_enter(self):
-        self._pool.empty.return_value = True
-        self._pool.maxsize = 4
-        self._session_manager.existing_sessions_count.return_value = 0
-        self._session_pool_manager._new_session = Mock()
-        self._session_pool_manager.get_session(
-            self._new_sessions, self._prompt, self._logger
+    def _get(self, *sessions):
+        return self._session_pool_manager.get_session(
+            list(sessions), self._prompt, self._logger
         )
-        self._condition.__enter__.assert_called_once()
 
-    def test_get_session_get_from_pool(self):
-        self._pool.empty.return_value = False
-        self._session_pool_manager._get_from_pool = Mock()
-        self._pool.maxsize = 4
-        self._session_manager.existing_sessions_count.return_value = 0
-        self._session_pool_manager._new_session = Mock()
-        self._session_pool_manager.get_session(
-            self._new_sessions, self._prompt, self._logger
-        )
-        self._session_pool_manager._get_from_pool.assert_called_once_with(
-            self._new_sessions, self._prompt, self._logger
-        )
+    def test_get_session_with_condition(self):
+        condition = MagicMock()
+        self._session_pool_manager._session_condition = condition
+        self._get(_session("a"))
+        condition.__enter__.assert_called()
+        self.assertEqual(condition.__enter__.call_count, condition.__exit__.call_count)
 
     def test_get_session_create_new(self):
-        self._pool.empty.return_value = True
-        self._pool.maxsize = 2
-        self._session_manager.existing_sessions_count.return_value = 1
-        self._session_pool_manager._new_session = Mock()
-        self._session_pool_manager.get_session(
-            self._new_sessions, self._prompt, self._logger
+        session = _session("a")
+        self.assertIs(self._get(session), session)
+        self._session_manager.new_session.assert_called_once_with(
+            [session], self._prompt, self._logger
         )
-        self._session_pool_manager._new_session.assert_called_once_with(
-            self._new_sessions, self._prompt, self._logger
+        self.assertTrue(session.new_session)
+
+    def test_get_session_get_from_pool(self):
+        session = self._get(_session("a"))
+        self._session_pool_manager.return_session(session, self._logger)
+        self.assertIs(self._get(_session("a")), session)
+        self._session_manager.new_session.assert_called_once()
+        self.assertFalse(session.new_session)
+
+    def test_get_session_keeps_other_keys(self):
+        session_a = self._get(_session("a"))
+        self._session_pool_manager.return_session(session_a, self._logger)
+        session_b = self._get(_session("b"))
+        self.assertIsNot(session_b, session_a)
+        self._session_manager.remove_session.assert_not_called()
+        session_a.disconnect.assert_not_called()
+
+    def test_get_session_max_pool_size_per_key(self):
+        self._session_pool_manager._pool_timeout = 0
+        self._get(_session("a"))
+        self._get(_session("a"))
+        self._get(_session("b"))
+        with self.assertRaises(SessionPoolException):
+            self._get(_session("a"))
+
+    def test_get_session_max_total_size_evicts_idle_session(self):
+        self._session_pool_manager._max_total_size = 2
+        session_a1 = self._get(_session("a"))
+        session_a2 = self._get(_session("a"))
+        self._session_pool_manager.return_session(session_a1, self._logger)
+        self._session_pool_manager.return_session(session_a2, self._logger)
+        self._get(_session("b"))
+        # the least recently returned session is evicted
+        session_a1.disconnect.assert_called_once()
+        session_a2.disconnect.assert_not_called()
+        self._session_manager.remove_session.assert_called_once_with(
+            session_a1, self._logger
         )
 
-    def test_get_session_condition_wait_raises(self):
-        self._pool.empty.return_value = True
-        self._pool.maxsize = 1
-        self._session_manager.existing_sessions_count.return_value = 1
-        self._session_pool_manager._new_session = Mock()
-        pool_timeout = 1
-        self._session_pool_manager._pool_timeout = pool_timeout
-
-        exception = SessionPoolException
-        with self.assertRaises(exception):
-            self._session_pool_manager.get_session(
-                self._new_sessions, self._prompt, self._logger
-            )
-            self._condition.wait.assert_called_once_with(pool_timeout)
-
-    def test_get_session_with_condition_exit(self):
-        prompt = Mock()
-        self._pool.maxsize = 4
-        self._session_manager.existing_sessions_count.return_value = 0
-        self._session_pool_manager._new_session = Mock()
-        self._session_pool_manager.get_session(self._new_sessions, prompt, self._logger)
-        self._condition.__exit__.assert_called_once()
-
-    def test_remove_session_with_condition_enter(self):
-        session = Mock()
-        self._session_pool_manager.remove_session(session, self._logger)
-        self._condition.__enter__.assert_called_once()
+    def test_get_session_max_total_size_raises(self):
+        self._session_pool_manager._max_total_size = 1
+        self._session_pool_manager._pool_timeout = 0
+        self._get(_session("a"))
+        with self.assertRaises(SessionPoolException):
+            self._get(_session("b"))
 
-    def test_remove_session_call(self):
-        session = Mock()
-        self._session_pool_manager.remove_session(session, self._logger)
+    def test_get_session_new_session_failed(self):
+        self._session_pool_manager._max_total_size = 1
+        self._session_manager.new_session.side_effect = Exception
+        with self.assertRaises(Exception):
+            self._get(_session("a"))
+        self._session_manager.new_session.side_effect = None
+        self._session_manager.new_session.return_value = _session("a")
+        self._get(_session("a"))
+
+    def test_get_session_incompatible_removed(self):
+        session = self._get(_session("a"))
+        self._session_pool_manager.return_session(session, self._logger)
+        self._session_manager.is_compatible.return_value = False
+        new_session = _session("a")
+        self.assertIs(self._get(new_session), new_session)
+        self._session_manager.is_compatible.assert_called_once_with(
+            session, [new_session], self._logger
+        )
         self._session_manager.remove_session.assert_called_once_with(
             session, self._logger
         )
 
-    def test_remove_session_condition_notify(self):
-        session = Mock()
-        self._session_pool_manager.remove_session(session, self._logger)
-        self._condition.notify.assert_called_once()
+    def test_get_session_created_for_other_key(self):
+        self._session_pool_manager._pool_timeout = 0
+        session_b = _session("b")
+        self._session_manager.new_session.side_effect = lambda *_: session_b
+        self._get(_session("a"), session_b)
+        self._session_pool_manager.remove_session(session_b, self._logger)
+        self._get(_session("a"), session_b)
+        self._get(_session("a"), session_b)
+        with self.assertRaises(SessionPoolException):
+            self._get(_session("a"), session_b)
+
+    def test_get_session_waiters_of_different_keys(self):
+        self._session_pool_manager._max_pool_size = 1
+        self._session_pool_manager._pool_timeout = 3
+        sessions = {key: self._get(_session(key)) for key in "AB"}
+        results = {}
+
+        def wait_session(key):
+            start = time.time()
+            try:
+                self._get(_session(key))
+            except SessionPoolException:
+                results[key] = ("fail", time.time() - start)
+            else:
+                results[key] = ("ok", time.time() - start)
 
-    def test_remove_session_with_condition_exit(self):
-        session = Mock()
+        threads = [threading.Thread(target=wait_session, args=(key,)) for key in "AB"]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.1)
+        # the session of B wakes the waiter of A first
+        for key in "BA":
+            self._session_pool_manager.return_session(sessions[key], self._logger)
+            time.sleep(0.1)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results["A"][0], "ok")
+        self.assertEqual(results["B"][0], "ok")
+        self.assertLess(max(duration for _, duration in results.values()), 2)
+
+    def test_get_session_checks_pool_after_timeout(self):
+        self._session_pool_manager._pool_timeout = 0.2
+        self._session_pool_manager._max_pool_size = 1
+        session = self._get(_session("a"))
+        condition = self._session_pool_manager._session_condition
+        wait = condition.wait
+
+        def return_on_wait(timeout):
+            # the session is returned when the time is out
+            wait(timeout)
+            self._session_pool_manager._idle_sessions["a"] = deque(
+                [(time.time(), session)]
+            )
+
+        condition.wait = return_on_wait
+        self.assertIs(self._get(_session("a")), session)
+
+    def test_remove_session(self):
+        self._session_pool_manager._pool_timeout = 0
+        session = self._get(_session("a"))
+        self._get(_session("a"))
+        condition = MagicMock()
+        self._session_pool_manager._session_condition = condition
         self._session_pool_manager.remove_session(session, self._logger)
-        self._condition.__exit__.assert_called_once()
+        self._session_manager.remove_session.assert_called_once_with(
+            session, self._logger
+        )
+        condition.notify_all.assert_called_once()
+        self._get(_session("a"))
 
-    def test_return_session_with_condition_enter(self):
-        session = Mock()
+    def test_return_session(self):
+        session = _session("a")
+        condition = MagicMock()
+        self._session_pool_manager._session_condition = condition
         self._session_pool_manager.return_session(session, self._logger)
-        self._condition.__enter__.assert_called_once()
+        condition.__enter__.assert_called_once()
+        condition.notify_all.assert_called_once()
+        self.assertFalse(session.new_session)
 
-    def test_return_session_call(self):
-        session = Mock()
-        self._session_pool_manager.return_session(session, self._logger)
-        self._pool.put.assert_called_once_with(session)
+    def test_get_key_without_connection_key(self):
+        session = object()
+        self.assertIs(SessionPoolManager.get_key(session), object)
 
-    def test_return_session_condition_notify(self):
-        session = Mock()
+    def _get_idle(self, key="a"):
+        session = self._get(_session(key))
         self._session_pool_manager.return_session(session, self._logger)
-        self._condition.notify.assert_called_once()
+        return session
 
-    def test_return_session_with_condition_exit(self):
-        session = Mock()
-        self._session_pool_manager.return_session(session, self._logger)
-        self._condition.__exit__.assert_called_once()
+    def test_get_session_idle_timeout(self):
+        self._session_pool_manager._idle_timeout = 0
+        session = self._get_idle()
+        self.assertIsNot(self._get(_session("a")), session)
+        session.disconnect.assert_called_once()
 
-    def test__new_session_called(self):
-        prompt = Mock()
-        self._session_pool_manager._new_session(
-            self._new_sessions, prompt, self._logger
-        )
-        self._session_manager.new_session.assert_called_once_with(
-            self._new_sessions, prompt, self._logger
-        )
+    def test_get_session_max_lifetime(self):
+        self._session_pool_manager._max_lifetime = 0
+        session = self._get_idle()
+        self.assertIsNot(self._get(_session("a")), session)
+        session.disconnect.assert_called_once()
 
-    def test__new_session_has_attr_new_session_true(self):
-        prompt = Mock()
-        session = self._session_pool_manager._new_session(
-            self._new_sessions, prompt, self._logger
+    def test_get_session_not_alive(self):
+        session = self._get_idle()
+        session.is_alive.return_value = False
+        self.assertIsNot(self._get(_session("a")), session)
+        session.disconnect.assert_called_once()
+        self._session_manager.remove_session.assert_called_once_with(
+            session, self._logger
         )
-        self.assertTrue(hasattr(session, "new_session") and session.new_session)
 
-    def test__get_from_pool_called_get(self):
-        prompt = Mock()
-        self._session_pool_manager._get_from_pool(
-            self._new_sessions, prompt, self._logger
-        )
-        self._pool.get.assert_called_once_with(False)
-
-    def test__get_from_pool_is_compatible_called(self):
-        prompt = Mock()
-        session = Mock()
-        self._pool.get.return_value = session
-        self._session_pool_manager._get_from_pool(
-            self._new_sessions, prompt, self._logger
-        )
-        self._session_manager.is_compatible.assert_called_once_with(
-            session, self._new_sessions, self._logger
-        )
+    def test_reap_idle_timeout(self):
+        session = self._get_idle()
+        self._session_pool_manager._idle_timeout = 0
+        self._session_pool_manager._reap()
+        session.disconnect.assert_called_once()
+        self.assertEqual(self._session_pool_manager._idle_sessions, {})
+        self.assertEqual(self._session_pool_manager._sessions_count, {})
 
-    def test__get_from_pool_remove_called(self):
-        prompt = Mock()
-        self._session_manager.is_compatible.return_value = False
-        self._session_pool_manager.remove_session = Mock()
-        session = Mock()
-        self._pool.get.return_value = session
-        self._session_pool_manager._get_from_pool(
-            self._new_sessions, prompt, self._logger
-        )
-        self._session_pool_manager.remove_session.assert_called_once_with(
-            session, self._logger
+    def test_reap_reconnects_dead_session(self):
+        session = self._get_idle()
+        session.is_alive.return_value = False
+        session.reconnect.side_effect = lambda *_: session.is_alive.configure_mock(
+            return_value=True
         )
+        self._session_pool_manager._reap()
+        session.reconnect.assert_called_once_with(self._prompt, self._logger)
+        self.assertTrue(session.new_session)
+        self.assertIs(self._get(_session("a")), session)
 
-    def test__get_from_pool_new_session_called(self):
-        prompt = Mock()
-        self._session_manager.is_compatible.return_value = False
-        self._session_pool_manager.remove_session = Mock()
-        self._session_pool_manager._new_session = Mock()
-        session = Mock()
-        self._pool.get.return_value = session
-        self._session_pool_manager._get_from_pool(
-            self._new_sessions, prompt, self._logger
+    def test_reap_reconnect_failed(self):
+        self._session_pool_manager._max_lifetime = 0
+        session = self._get_idle()
+        session.reconnect.side_effect = Exception
+        self._session_pool_manager._reap()
+        session.disconnect.assert_called_once()
+        self.assertEqual(self._session_pool_manager._sessions_count, {})
+
+    def test_reaper_thread(self):
+        self._session_pool_manager._reaper_interval = 0.01
+        self._session_pool_manager._idle_timeout = 0
+        session = self._get_idle()
+        end_time = time.time() + 1
+        while not session.disconnect.called and time.time() < end_time:
+            time.sleep(0.01)
+        session.disconnect.assert_called_once()
+        self._session_pool_manager.close()
+        self.assertFalse(self._session_pool_manager._reaper.is_alive())
+
+    def test_close(self):
+        session = self._get_idle()
+        self._session_pool_manager.close()
+        session.disconnect.assert_called_once()
+        self.assertEqual(self._session_pool_manager._idle_sessions, {})
+
+    def _check_lock_on_disconnect(self, session):
+        """Record if the pool lock is free when the session is disconnected."""
+        lock_free = []
+        condition = self._session_pool_manager._session_condition
+
+        def try_acquire():
+            acquired = condition.acquire(timeout=0.1)
+            if acquired:
+                condition.release()
+            lock_free.append(acquired)
+
+        def disconnect():
+            # the lock is reentrant, so it's acquired from another thread
+            thread = threading.Thread(target=try_acquire)
+            thread.start()
+            thread.join()
+
+        session.disconnect.side_effect = disconnect
+        return lock_free
+
+    def test_get_session_disconnects_without_lock(self):
+        self._session_pool_manager._idle_timeout = 0
+        session = self._get_idle()
+        lock_free = self._check_lock_on_disconnect(session)
+        self._get(_session("a"))
+        self.assertEqual(lock_free, [True])
+
+    def test_evict_disconnects_without_lock(self):
+        self._session_pool_manager._max_total_size = 1
+        session = self._get_idle("a")
+        lock_free = self._check_lock_on_disconnect(session)
+        self._get(_session("b"))
+        self.assertEqual(lock_free, [True])
+
+    def test_reap_disconnects_without_lock(self):
+        session = self._get_idle()
+        self._session_pool_manager._idle_timeout = 0
+        lock_free = self._check_lock_on_disconnect(session)
+        self._session_pool_manager._reap()
+        self.assertEqual(lock_free, [True])
+
+    def test_close_disconnects_without_lock(self):
+        session = self._get_idle()
+        lock_free = self._check_lock_on_disconnect(session)
+        self._session_pool_manager.close()
+        self.assertEqual(lock_free, [True])
+
+    def test_new_session(self):
+        session = _session("a")
+        self.assertIs(
+            self._session_pool_manager.new_session(
+                [session], self._prompt, self._logger
+            ),
+            session,
         )
-        self._session_pool_manager._new_session.assert_called_once_with(
-            self._new_sessions, prompt, self._logger
+        self.assertTrue(session.new_session)
+
+    def test_new_session_pool_is_full(self):
+        for session in (self._get(_session("a")), self._get(_session("a"))):
+            self._session_pool_manager.return_session(session, self._logger)
+        self.assertIsNone(
+            self._session_pool_manager.new_session(
+                [_session("a")], self._prompt, self._logger
+            )
         )
+        self._session_manager.remove_session.assert_not_called()
@@ -0,0 +1,59 @@
+import pytest
+
+from cloudshell.cli.service.cli import CLI
+from cloudshell.cli.service.session_pool_manager import SessionPoolException
+from cloudshell.cli.service.session_pool_registry import (
+    DEFAULT_POOL_NAME,
+    LEGACY_POOL_NAME,
+    SessionPoolConfig,
+    SessionPoolRegistry,
+    session_pool_registry,
+)
+
+
+def test_get_pool_same_name():
+    registry = SessionPoolRegistry()
+    assert registry.get_pool("a") is registry.get_pool("a")
+    assert registry.get_pool("a") is not registry.get_pool("b")
+    assert registry.get_pool("a")._session_manager is not (
+        registry.get_pool("b")._session_manager
+    )
+
+
+def test_get_pool_default_config():
+    registry = SessionPoolRegistry(SessionPoolConfig(3, 10, 5))
+    pool = registry.get_pool()
+    assert pool._max_pool_size == 3
+    assert pool._max_total_size == 10
+    assert pool._pool_timeout == 5
+
+
+def test_legacy_pool():
+    pool = SessionPoolRegistry().get_pool(LEGACY_POOL_NAME)
+    assert pool._max_pool_size == 1
+    assert pool._max_total_size == 1
+
+
+def test_configure():
+    registry = SessionPoolRegistry()
+    registry.configure("a", SessionPoolConfig(max_pool_size=2))
+    assert registry.get_pool("a")._max_pool_size == 2
+    with pytest.raises(SessionPoolException):
+        registry.configure("a", SessionPoolConfig())
+
+
+def test_cli_uses_registry():
+    assert CLI()._session_pool is session_pool_registry.get_pool(DEFAULT_POOL_NAME)
+    assert CLI(pool_name=LEGACY_POOL_NAME)._session_pool is (
+        session_pool_registry.get_pool(LEGACY_POOL_NAME)
+    )
+
+
+def test_get_pool_idle_settings():
+    registry = SessionPoolRegistry()
+    registry.configure("a", SessionPoolConfig(idle_timeout=1, max_lifetime=2))
+    pool = registry.get_pool("a")
+    assert pool._idle_timeout == 1
+    assert pool._max_lifetime == 2
+    assert pool._reaper_interval == SessionPoolConfig().reaper_interval
+    assert registry.get_pool(LEGACY_POOL_NAME)._reaper_interval is None
@@ -0,0 +1,59 @@
+import re
+
+import pytest
+
+from cloudshell.cli.service.spooled_output import SpooledOutput
+
+CHUNKS = ["interface Gi0/1\n desc up", "link\ninterface Gi0/2\n", " desc ü\n", "end"]
+TEXT = "".join(CHUNKS)
+
+
+@pytest.fixture(params=[0, 1024], ids=["spilled", "in_memory"])
+def output(request):
+    with SpooledOutput.from_chunks(CHUNKS, request.param) as output:
+        yield output
+
+
+def test_spilled():
+    with SpooledOutput.from_chunks(CHUNKS, 10) as output:
+        assert output.spilled
+    with SpooledOutput.from_chunks(CHUNKS, len(TEXT.encode())) as output:
+        assert not output.spilled
+
+
+def test_str(output):
+    assert str(output) == TEXT
+    assert len(output) == len(TEXT.encode())
+
+
+def test_iter_lines(output):
+    assert list(output.iter_lines()) == TEXT.splitlines(keepends=True)
+    assert list(output) == TEXT.splitlines(keepends=True)
+
+
+def test_search(output):
+    assert "desc uplink" in output
+    assert "desc down" not in output
+    match = output.search(r"interface (\S+)\n desc ü")
+    assert match.group(1) == b"Gi0/2"
+    assert output.findall(r"^interface \S+", re.MULTILINE) == [
+        "interface Gi0/1",
+        "interface Gi0/2",
+    ]
+    assert output.search("missing") is None
+
+
+def test_close():
+    output = SpooledOutput.from_chunks(CHUNKS, 0)
+    output.close()
+    assert len(output) == 0
+    assert str(output) == ""
+
+
+def test_from_chunks_error_closes_output():
+    def chunks():
+        yield "data"
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        SpooledOutput.from_chunks(chunks(), 0)